@@ -0,0 +1,215 @@
+"""
+Vectorized Analytics
+Rolling averages, spending forecasts, per-category anomaly flags and
+projected month-end budget burn, computed with NumPy over columnar arrays.
+
+The database does the per-row work: one $group pass collapses the history
+window to daily (day, category, type) sums, which are read in a single
+cursor pass into NumPy columns. Everything after that is array arithmetic,
+so cost grows with days x categories rather than with transaction count.
+"""
+
+from datetime import datetime, date
+import calendar
+import numpy as np
+
+from categories import CATEGORIES
+from money import to_decimal
+
+TYPES = ['income', 'expense']
+ROLLING_WINDOWS = (3, 6, 12)
+FORECAST_MONTHS = 3
+ANOMALY_Z = 2.0
+MIN_HISTORY_MONTHS = 2  # the current month and the last complete one
+
+
+class DailyColumns:
+    """Column arrays of daily sums: day ordinal, month index, category code, type code, amount"""
+
+    def __init__(self, day, month, category, type_, amount):
+        self.day = np.asarray(day, dtype=np.int64)
+        # Months since year 0 (year * 12 + month - 1), so month arithmetic is integer math
+        self.month = np.asarray(month, dtype=np.int64)
+        self.category = np.asarray(category, dtype=np.int64)
+        self.type = np.asarray(type_, dtype=np.int8)
+        self.amount = np.asarray(amount, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.amount)
+
+
+def daily_pipeline(since):
+    """Collapse transactions since `since` into daily (category, type) sums"""
+    return [
+        {'$match': {'date': {'$gte': since}}},
+        {'$group': {
+            '_id': {
+                'y': {'$year': '$date'},
+                'm': {'$month': '$date'},
+                'd': {'$dayOfMonth': '$date'},
+                'c': '$category',
+                't': '$type'
+            },
+            'total': {'$sum': '$amount'}
+        }}
+    ]
+
+
+def columns_from_rows(rows):
+    """Read daily-sum rows into DailyColumns in one pass"""
+    category_codes = {name: code for code, name in enumerate(CATEGORIES)}
+    type_codes = {name: code for code, name in enumerate(TYPES)}
+    day, month, category, type_, amount = [], [], [], [], []
+    for row in rows:
+        key = row['_id']
+        code = category_codes.get(key['c'])
+        kind = type_codes.get(key['t'])
+        if code is None or kind is None:
+            continue
+        day.append(date(key['y'], key['m'], key['d']).toordinal())
+        month.append(key['y'] * 12 + key['m'] - 1)
+        category.append(code)
+        type_.append(kind)
+        # Exact Decimal sums from the database; the array math below is float
+        amount.append(float(to_decimal(row['total'])))
+    return DailyColumns(day, month, category, type_, amount)
+
+
+def load_columns(store, since, batch_size=10000):
+    """Run the daily aggregation of a tenant store and load it as columns"""
+    return columns_from_rows(store.daily_sums(since, batch_size))
+
+
+def month_start(now, months_back):
+    """First day of the month `months_back` months before `now`"""
+    index = now.year * 12 + now.month - 1 - months_back
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+# Series
+def monthly_matrix(cols, first_month, n_months, type_code):
+    """(n_months, n_categories) sums of one transaction type"""
+    n_categories = len(CATEGORIES)
+    mask = (cols.type == type_code) & (cols.month >= first_month) & (cols.month < first_month + n_months)
+    index = (cols.month[mask] - first_month) * n_categories + cols.category[mask]
+    sums = np.bincount(index, weights=cols.amount[mask], minlength=n_months * n_categories)
+    return sums.reshape(n_months, n_categories)
+
+
+def rolling_mean(series, window):
+    """Trailing mean; NaN until `window` points are available"""
+    out = np.full(len(series), np.nan)
+    if len(series) >= window:
+        cumulative = np.cumsum(np.insert(series, 0, 0.0))
+        out[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+    return out
+
+
+def linear_forecast(series, periods):
+    """Least-squares trend extrapolated `periods` steps ahead (floored at 0)"""
+    if len(series) < 2:
+        return np.full(periods, series[-1] if len(series) else 0.0)
+    x = np.arange(len(series))
+    slope, intercept = np.polyfit(x, series, 1)
+    future = np.arange(len(series), len(series) + periods)
+    return np.maximum(slope * future + intercept, 0.0)
+
+
+def category_zscores(matrix):
+    """z-score of the last row of each column against the rows before it"""
+    history, latest = matrix[:-1], matrix[-1]
+    if not len(history):
+        return np.zeros_like(latest), latest.copy()
+    mean = history.mean(axis=0)
+    std = history.std(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(std > 0, (latest - mean) / std, 0.0)
+    return z, mean
+
+
+def _clean(values):
+    """NumPy array -> JSON-friendly list (NaN -> None, 2 decimals)"""
+    return [None if np.isnan(v) else round(float(v), 2) for v in values]
+
+
+# Report
+def build_analytics(cols, budgets=None, now=None, history_months=24, scheduled=None):
+    """
+    Compute every analytics series from DailyColumns.
+
+    `budgets` maps category -> monthly budget for the current month.
+    `scheduled` maps (year, month) -> {'income', 'expense'} totals of the
+    recurring occurrences still to come (recurring.scheduled_totals).
+    """
+    if history_months < MIN_HISTORY_MONTHS:
+        raise ValueError(f'history_months must be at least {MIN_HISTORY_MONTHS}, got {history_months}')
+    now = now or datetime.now()
+    current_month = now.year * 12 + now.month - 1
+    first_month = current_month - history_months + 1
+    expense_code, income_code = TYPES.index('expense'), TYPES.index('income')
+
+    expenses = monthly_matrix(cols, first_month, history_months, expense_code)
+    income = monthly_matrix(cols, first_month, history_months, income_code)
+    expense_totals = expenses.sum(axis=1)
+    income_totals = income.sum(axis=1)
+
+    labels = [month_start(now, history_months - 1 - i).strftime('%b %Y') for i in range(history_months)]
+
+    # Forecast from complete months only; the current month is still filling up
+    complete = expense_totals[:-1][-12:]
+    forecast = linear_forecast(complete, FORECAST_MONTHS)
+    forecast_months = [month_start(now, -i) for i in range(1, FORECAST_MONTHS + 1)]
+    scheduled = scheduled or {}
+
+    # Anomalies: last complete month per category vs the 12 months before it
+    z, mean = category_zscores(expenses[:-1][-13:])
+    last_complete = expenses[-2]
+    anomalies = [
+        {
+            'category': CATEGORIES[code],
+            'month': labels[-2],
+            'spent': round(float(last_complete[code]), 2),
+            'average': round(float(mean[code]), 2),
+            'zscore': round(float(z[code]), 2),
+            'direction': 'high' if z[code] > 0 else 'low'
+        }
+        for code in np.flatnonzero(np.abs(z) >= ANOMALY_Z)
+    ]
+
+    # Month-end projection from the month-to-date daily run rate
+    days_in_month = calendar.monthrange(now.year, now.month)[1]
+    days_elapsed = now.day
+    month_to_date = expenses[-1]
+    projected = month_to_date / days_elapsed * days_in_month
+    budget_burn = []
+    for category, amount in (budgets or {}).items():
+        if category not in CATEGORIES or not amount:
+            continue
+        code = CATEGORIES.index(category)
+        amount = float(to_decimal(amount))
+        budget_burn.append({
+            'category': category,
+            'budget': amount,
+            'spent': round(float(month_to_date[code]), 2),
+            'projected': round(float(projected[code]), 2),
+            'projected_percentage': round(float(projected[code] / amount * 100), 1),
+            'status': ('exceeded' if projected[code] >= amount
+                       else 'warning' if projected[code] >= amount * 0.8 else 'safe')
+        })
+
+    return {
+        'months': labels,
+        'income': _clean(income_totals),
+        'expenses': _clean(expense_totals),
+        'rolling': {str(window): _clean(rolling_mean(expense_totals, window)) for window in ROLLING_WINDOWS},
+        'forecast': [
+            {'month': month.strftime('%b %Y'), 'expenses': round(float(value), 2),
+             'scheduled': round(float(scheduled.get((month.year, month.month), {}).get('expense', 0)), 2)}
+            for month, value in zip(forecast_months, forecast)
+        ],
+        'anomalies': anomalies,
+        'budget_burn': sorted(budget_burn, key=lambda item: -item['projected_percentage']),
+        'days_elapsed': days_elapsed,
+        'days_in_month': days_in_month,
+        'rows': len(cols)
+    }
@@ -1,35 +1,374 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
-from pymongo import MongoClient, DESCENDING
-from bson.objectid import ObjectId
+from flask import Flask, Response, render_template, stream_template, request, redirect, url_for, jsonify, flash, abort, \
+    g, session, has_app_context
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from flask.json.provider import DefaultJSONProvider
 import os
+import io
+import inspect
+import time
 from collections import defaultdict
+from pagination import KeysetPage
+from rollups import month_keys, monthly_series, period_totals, category_totals
+from categories import CATEGORIES
+from importer import PARSERS, detect_format, import_transactions
+from exporter import (FORMATS as EXPORT_FORMATS, TRANSACTION_FIELDS, MONTHLY_FIELDS,
+                      iter_transactions, export_stream)
+from budget_engine import (PERIODS, period_start, previous_start, period_label, normalize_budget,
+                           evaluate, period_spending, status_events)
+from analytics import FORECAST_MONTHS, MIN_HISTORY_MONTHS, load_columns, month_start, build_analytics
+from search import search_words, text_filter, date_range, amount_range, search_args
+from cache import create_cache
+from tenancy import validate_tenant
+from storage import create_storage, Preparation
+from recurring import RecurringScheduler, new_rule, project, scheduled_totals
+from instrumentation import QueryListener, PoolListener
+from money import ExchangeRates, parse_amount, format_money, currency_format, json_default
+from live import LiveUpdates, POLL_SECONDS, dashboard_snapshot, transaction_delta
+from http_cache import (COMPRESSIBLE, STATIC_MAX_AGE, StaticManifest, make_etag, encoded_etag, matching_etag,
+                        release_id, negotiate_encoding, compress)
+
+# Process start, for the startup time metrics (import through create_app)
+STARTED = time.perf_counter()
 
 # Load environment variables
 load_dotenv()
 
+class MoneyJSONProvider(DefaultJSONProvider):
+    """JSON responses with amounts (Decimal, or Decimal128 read from MongoDB) as numbers"""
+
+    @staticmethod
+    def default(value):
+        return json_default(value, DefaultJSONProvider.default)
+
 app = Flask(__name__)
+app.json = MoneyJSONProvider(app)
 app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key')
 
+# Storage Configuration (STORAGE_BACKEND: mongo or sqlite)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'expense_tracker.db')
+
 # MongoDB Configuration
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 DATABASE_NAME = os.getenv('DATABASE_NAME', 'expense_tracker_db')
+ENSURE_INDEXES = os.getenv('ENSURE_INDEXES', 'true').lower() == 'true'
+
+def optional_int(name):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+# Connection Configuration (each process opens its own pool on first use)
+# MONGO_READ_PREFERENCE applies to every read; reports and analytics use
+# MONGO_ANALYTICS_READ_PREFERENCE, so they can be served by secondaries. It is
+# primary by default: a lagging secondary's totals would be cached and ETagged
+# under the data version that was already bumped past them
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 100))
+MONGO_CLIENT_OPTIONS = {name: value for name, value in {
+    'maxPoolSize': MONGO_MAX_POOL_SIZE,
+    'minPoolSize': int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+    'maxIdleTimeMS': optional_int('MONGO_MAX_IDLE_TIME_MS'),
+    'waitQueueTimeoutMS': optional_int('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+    'connectTimeoutMS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+    'socketTimeoutMS': optional_int('MONGO_SOCKET_TIMEOUT_MS'),
+    'serverSelectionTimeoutMS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+    'readPreference': os.getenv('MONGO_READ_PREFERENCE', 'primary'),
+}.items() if value is not None}
+MONGO_ANALYTICS_READ_PREFERENCE = os.getenv('MONGO_ANALYTICS_READ_PREFERENCE', 'primary')
+
+# Startup Configuration
+# PREPARE_ON_START makes create_app() connect and migrate before serving;
+# otherwise that happens on the first request. While the database is down,
+# requests get a 503 and a new attempt is made every STORAGE_RETRY_SECONDS.
+PREPARE_ON_START = os.getenv('PREPARE_ON_START', 'false').lower() == 'true'
+STORAGE_RETRY_SECONDS = int(os.getenv('STORAGE_RETRY_SECONDS', 5))
+
+# Tenant Configuration
+# TENANT_HEADER is set by the authenticating proxy in front of the app;
+# requests without it belong to DEFAULT_TENANT (single-user installs)
+DEFAULT_TENANT = os.getenv('DEFAULT_TENANT', 'default')
+TENANT_HEADER = os.getenv('TENANT_HEADER', 'X-User-Id')
+DEDICATED_TENANTS = [t.strip() for t in os.getenv('DEDICATED_TENANTS', '').split(',') if t.strip()]
+
+def current_tenant_id():
+    """Tenant of the current request or scheduler callback (None outside of one)"""
+    store = g.get('store') if has_app_context() else None
+    return store.user_id if store else None
+
+def current_data_version():
+    """Data version of the current tenant, read once per request (None outside of one)"""
+    if current_tenant_id() is None:
+        return None
+    if 'data_version' not in g:
+        g.data_version = g.store.data_version()
+    return g.data_version
+
+# Currency Configuration
+# Amounts are converted to REPORTING_CURRENCY as they are written, at the rate
+# for their date from EXCHANGE_RATES_FILE (a CSV of per-day rates quoted per
+# one EXCHANGE_RATES_BASE, see money.py). Without a file every amount is in
+# the reporting currency.
+REPORTING_CURRENCY = os.getenv('REPORTING_CURRENCY', 'USD').upper()
+EXCHANGE_RATES_FILE = os.getenv('EXCHANGE_RATES_FILE')
+EXCHANGE_RATES_BASE = os.getenv('EXCHANGE_RATES_BASE', 'EUR').upper()
+rates = ExchangeRates.load(EXCHANGE_RATES_FILE, REPORTING_CURRENCY, EXCHANGE_RATES_BASE)
+
+# Pagination Configuration
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 500))
+
+# Import Configuration
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+
+# Export Configuration
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+
+# Recurring Transaction Configuration
+# Every worker runs a scheduler thread; a database lease lets one of them work at a time
+RECURRING_SCHEDULER = os.getenv('RECURRING_SCHEDULER', 'true').lower() == 'true'
+RECURRING_INTERVAL = int(os.getenv('RECURRING_INTERVAL', 60))
+RECURRING_BATCH_SIZE = int(os.getenv('RECURRING_BATCH_SIZE', 1000))
+RECURRING_UPCOMING_DAYS = int(os.getenv('RECURRING_UPCOMING_DAYS', 30))
+
+# Analytics Configuration (months of history behind trends, forecasts and anomalies)
+# At least 2: anomalies compare the last complete month, not the current one
+ANALYTICS_MONTHS = int(os.getenv('ANALYTICS_MONTHS', 24))
+if ANALYTICS_MONTHS < MIN_HISTORY_MONTHS:
+    raise ValueError(f'ANALYTICS_MONTHS must be at least {MIN_HISTORY_MONTHS}, got {ANALYTICS_MONTHS}')
+
+# Cache Configuration (CACHE_TTL=0 disables caching)
+# Keys include the tenant's data version, so a per-process cache never serves
+# aggregates older than the version every worker reads (and puts in ETags)
+cache = create_cache(backend=os.getenv('CACHE_BACKEND', 'memory'),
+                     ttl=int(os.getenv('CACHE_TTL', 60)),
+                     max_entries=int(os.getenv('CACHE_MAX_ENTRIES', 256)),
+                     directory=os.getenv('CACHE_DIR'),
+                     scope=current_tenant_id,
+                     version=current_data_version)
+
+# Live Update Configuration (LIVE_UPDATES: auto, changestream, local or off)
+# Each open stream holds a thread: serve with threaded or gevent workers, and
+# keep LIVE_MAX_STREAMS below the threads per process (dashboards beyond it poll)
+live = LiveUpdates(mode=os.getenv('LIVE_UPDATES', 'auto'),
+                   heartbeat=int(os.getenv('LIVE_HEARTBEAT', 15)),
+                   max_pending=int(os.getenv('LIVE_MAX_PENDING', 100)),
+                   max_deltas=int(os.getenv('LIVE_MAX_DELTAS', 50)),
+                   max_streams=int(os.getenv('LIVE_MAX_STREAMS', 32)))
+
+# HTTP Caching Configuration (ETags, compression and fingerprinted static URLs)
+HTTP_CACHE = os.getenv('HTTP_CACHE', 'true').lower() == 'true'
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 500))
+# GET endpoints that are never answered with 304 (live, operational or with side effects)
+UNCACHED_ENDPOINTS = {'events', 'metrics', 'cache_stats', 'delete_transaction', 'delete_recurring',
+                      'healthz', 'readyz'}
+RELEASE = release_id(os.path.join(app.root_path, app.template_folder), app.static_folder)
+static_manifest = StaticManifest(app.static_folder)
+
+# Instrumentation Configuration
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'true').lower() == 'true'
+QUERY_DEBUG = os.getenv('QUERY_DEBUG', 'false').lower() == 'true'
+query_listener = QueryListener(slow_query_ms=SLOW_QUERY_MS, explain_slow=SLOW_QUERY_EXPLAIN)
+pool_listener = PoolListener(max_pool_size=MONGO_MAX_POOL_SIZE)
+
+# Initialize storage (nothing connects until a process first uses it)
+storage = create_storage(STORAGE_BACKEND, uri=MONGODB_URI, database_name=DATABASE_NAME,
+                         dedicated=DEDICATED_TENANTS, event_listeners=[query_listener, pool_listener],
+                         client_options=MONGO_CLIENT_OPTIONS,
+                         analytics_read_preference=MONGO_ANALYTICS_READ_PREFERENCE, path=SQLITE_PATH,
+                         rates=rates)
+query_listener.client = lambda: storage.client
+live.check(storage.name)
+preparation = Preparation(storage, DEFAULT_TENANT, ENSURE_INDEXES, STORAGE_RETRY_SECONDS)
+# Endpoints that answer without the database
+STORAGE_EXEMPT_ENDPOINTS = {'static', 'healthz', 'readyz', 'metrics', 'cache_stats'}
+startup = {'import_seconds': None, 'factory_seconds': None}
+
+def recurring_materialized(user_id, transactions):
+    """Scheduler callback: the same invalidation a write route does, for the tenant that got `transactions`"""
+    with app.app_context():
+        g.store = storage.tenant(user_id)
+        cache.invalidate('transactions')
+        bump_data_version()
+        if len(transactions) > live.max_deltas:
+            live.resync(user_id)
+        else:
+            for transaction in transactions:
+                live.transaction(user_id, transaction)
+
+scheduler = RecurringScheduler(storage, interval=RECURRING_INTERVAL, batch_size=RECURRING_BATCH_SIZE,
+                               insert_batch_size=IMPORT_BATCH_SIZE, on_materialized=recurring_materialized)
+
+def create_app():
+    """
+    Application factory for WSGI servers: gunicorn 'app:create_app()'.
+
+    Routes are registered on the module's app at import, which opens no
+    connection, so a pre-fork server can import once and fork its workers:
+    each worker creates its own client on first use.
+    """
+    if PREPARE_ON_START and preparation.ensure() and RECURRING_SCHEDULER:
+        scheduler.start()
+    startup['factory_seconds'] = time.perf_counter() - STARTED
+    return app
+
+def storage_unavailable(error=None):
+    """503 while the database is unreachable (a readiness probe takes the instance out of rotation)"""
+    if request.path.startswith('/api/'):
+        response = jsonify({'error': 'database unavailable'})
+    else:
+        response = Response('The database is unavailable, please retry in a few seconds.\n', mimetype='text/plain')
+    response.status_code = 503
+    response.headers['Retry-After'] = str(STORAGE_RETRY_SECONDS)
+    return response
+
+def storage_error(error):
+    """503 for an unavailable database; other errors of the same class are bugs and propagate"""
+    if not storage.is_unavailable(error):
+        raise error
+    return storage_unavailable(error)
+
+for error_class in storage.unavailable_errors:
+    app.register_error_handler(error_class, storage_error)
+
+# Request Instrumentation
+@app.before_request
+def start_query_stats():
+    query_listener.begin(request.endpoint)
+
+@app.before_request
+def load_tenant():
+    """Resolve the request's tenant; every route reads and writes through g.store"""
+    if request.endpoint in STORAGE_EXEMPT_ENDPOINTS:
+        return
+    try:
+        user_id = validate_tenant(request.headers.get(TENANT_HEADER) or DEFAULT_TENANT)
+    except ValueError:
+        abort(400)
+    g.store = storage.tenant(user_id)
+
+@app.before_request
+def ensure_storage():
+    """Connect and migrate on the first request of a process; fail fast while the database is down"""
+    if request.endpoint not in STORAGE_EXEMPT_ENDPOINTS:
+        if not preparation.ensure():
+            return storage_unavailable()
+        if RECURRING_SCHEDULER:
+            scheduler.start()
+    return None
+
+# HTTP Caching
+@app.url_defaults
+def fingerprint_static(endpoint, values):
+    """Add a content hash to static URLs so they can be cached for a year"""
+    if endpoint == 'static' and HTTP_CACHE and 'v' not in values:
+        version = static_manifest.version(values.get('filename', ''))
+        if version:
+            values['v'] = version
 
-# Initialize MongoDB connection
-try:
-    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
-    client.server_info()  # Test connection
-    db = client[DATABASE_NAME]
-    transactions_collection = db.transactions
-    budgets_collection = db.budgets
-    print("✓ MongoDB connected successfully!")
-except Exception as e:
-    print(f"✗ MongoDB connection failed: {e}")
-    print("Please ensure MongoDB is running or check your connection string in .env file")
-
-# Categories
-CATEGORIES = ['Food', 'Transport', 'Entertainment', 'Healthcare', 'Utilities', 'Shopping', 'Salary', 'Other']
+def request_etag():
+    """ETag of the current GET request (before compression), or None"""
+    if request.endpoint == 'static':
+        return static_manifest.version(request.view_args.get('filename', ''))
+    # Pending flash messages are shown by the next page rendered, so it must be rendered
+    if request.endpoint in UNCACHED_ENDPOINTS or session.get('_flashes'):
+        return None
+    return make_etag(RELEASE, g.store.user_id, current_data_version(), datetime.now().date(), request.full_path)
+
+def bump_data_version():
+    """Change the ETag and cache keys of every page of the current tenant (call on every write)"""
+    g.data_version = g.store.bump_data_version()
+
+@app.before_request
+def check_etag():
+    """Answer a matching If-None-Match with 304 before the view runs any query"""
+    g.etag = None
+    if not HTTP_CACHE or request.method not in ('GET', 'HEAD'):
+        return None
+    g.etag = request_etag()
+    tag = g.etag and matching_etag(request.headers.get('If-None-Match'), g.etag)
+    if tag:
+        response = Response(status=304)
+        response.headers['ETag'] = tag
+        return response
+    return None
+
+def compress_response(response, encoding):
+    """Compress a finished response body in place; False if it was left as is"""
+    static = request.endpoint == 'static'
+    if response.is_streamed and not static:
+        return False
+    source = response.response
+    response.direct_passthrough = False
+    data = response.get_data()
+    if hasattr(source, 'close'):
+        source.close()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return False
+    if static:
+        body = static_manifest.compressed(request.view_args['filename'], g.etag, data, encoding)
+    else:
+        body = compress(data, encoding)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return True
+
+@app.after_request
+def add_cache_headers(response):
+    """Compression, ETag, Cache-Control and Vary for cacheable responses"""
+    if not HTTP_CACHE:
+        return response
+    etag = g.get('etag')
+    static = request.endpoint == 'static'
+    if response.mimetype in COMPRESSIBLE or response.status_code == 304:
+        response.vary.add('Accept-Encoding')
+    if not static:
+        response.vary.add(TENANT_HEADER)
+
+    if response.status_code == 200 and response.mimetype in COMPRESSIBLE \
+            and 'Content-Encoding' not in response.headers:
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        if not (encoding and compress_response(response, encoding)):
+            encoding = None
+        if etag:
+            response.headers['ETag'] = encoded_etag(etag, encoding)
+
+    if static:
+        fingerprinted = etag and request.args.get('v') == etag
+        response.headers['Cache-Control'] = (f'public, max-age={STATIC_MAX_AGE}, immutable'
+                                             if fingerprinted else 'no-cache')
+    elif etag and response.status_code in (200, 304):
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def queries_observed():
+    """
+    Whether the command listener sees the current request's queries: only
+    sync pymongo commands are attributed to a request (not SQLite statements,
+    nor Motor commands running on executor threads)
+    """
+    view = app.view_functions.get(request.endpoint)
+    return storage.name == 'mongo' and not inspect.iscoroutinefunction(view)
+
+@app.after_request
+def add_server_timing(response):
+    stats = query_listener.end()
+    if stats is not None:
+        response.headers['Server-Timing'] = query_listener.server_timing(stats, db=queries_observed())
+    return response
+
+@app.context_processor
+def inject_query_stats():
+    """Per-request DB stats for the debug footer (hidden where they would read 0 queries)"""
+    show = (QUERY_DEBUG or app.debug) and queries_observed()
+    return {'query_stats': query_listener.current if show else None}
+
+@app.context_processor
+def inject_currencies():
+    """Reporting currency (what every total is in) and the currencies amounts may be entered in"""
+    return {'reporting_currency': rates.reporting,
+            'currency_symbol': currency_format(rates.reporting)[0].strip(),
+            'currencies': rates.currencies}
 
 # Helper Functions
 def get_date_filter(filter_type='all'):
@@ -48,112 +387,194 @@ def get_date_filter(filter_type='all'):
         return {'date': {'$gte': start}}
     return {}
 
-def calculate_statistics(filter_type='all'):
-    """Calculate income, expenses, and balance"""
+def period_boundary(filter_type='all', *args, **kwargs):
+    """Cache key part: the day the period starts on (None for all time).
+    Day-aligned periods match exactly; the rolling 'week' window is bounded by the TTL."""
     date_filter = get_date_filter(filter_type)
+    return date_filter['date']['$gte'].date() if date_filter else None
+
+def today(*args, **kwargs):
+    """Cache key part for helpers whose periods are derived from the current date"""
+    return datetime.now().date()
+
+@cache.cached('transactions')
+def get_search_vocabulary():
+    """Every search term of the tenant, sorted (what search words are expanded against)"""
+    return g.store.search_terms()
+
+def build_transaction_query(args):
+    """Mongo filter for the period/category/type and search query parameters"""
+    # An explicit from/to range replaces the period preset
+    query = date_range(args) or get_date_filter(args.get('filter', 'all'))
     
-    income_pipeline = [
-        {'$match': {**date_filter, 'type': 'income'}},
-        {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}
-    ]
-    expense_pipeline = [
-        {'$match': {**date_filter, 'type': 'expense'}},
-        {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}
-    ]
-    
-    income_result = list(transactions_collection.aggregate(income_pipeline))
-    expense_result = list(transactions_collection.aggregate(expense_pipeline))
+    category_filter = args.get('category', 'all')
+    if category_filter != 'all':
+        query['category'] = category_filter
     
-    total_income = income_result[0]['total'] if income_result else 0
-    total_expenses = expense_result[0]['total'] if expense_result else 0
-    balance = total_income - total_expenses
+    type_filter = args.get('type', 'all')
+    if type_filter != 'all':
+        query['type'] = type_filter
     
-    return {
-        'income': total_income,
-        'expenses': total_expenses,
-        'balance': balance
-    }
+    query.update(amount_range(args))
+    words = search_words(args.get('q'))
+    if words:
+        query.update(text_filter(words, get_search_vocabulary(), fuzzy=args.get('fuzzy') == '1'))
+    return query
 
+def page_size_arg(args):
+    try:
+        return min(max(int(args.get('page_size', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return PAGE_SIZE
+
+@cache.cached('transactions', key=period_boundary)
+def calculate_statistics(filter_type='all'):
+    """Calculate income, expenses, and balance"""
+    result = g.store.stats(periods={filter_type: get_date_filter(filter_type)})
+    return result['periods'][filter_type]
+
+@cache.cached('transactions', key=period_boundary)
 def get_category_breakdown(filter_type='month'):
     """Get expense breakdown by category"""
-    date_filter = get_date_filter(filter_type)
-    
-    pipeline = [
-        {'$match': {**date_filter, 'type': 'expense'}},
-        {'$group': {
-            '_id': '$category',
-            'total': {'$sum': '$amount'}
-        }},
-        {'$sort': {'total': -1}}
-    ]
-    
-    results = list(transactions_collection.aggregate(pipeline))
-    return {item['_id']: item['total'] for item in results}
+    result = g.store.stats(breakdown=get_date_filter(filter_type))
+    return result['breakdown']
+
+@cache.cached('transactions', key=today)
+def get_dashboard_stats():
+    """All-time and month totals, month breakdown and recent transactions in one round trip"""
+    month_filter = get_date_filter('month')
+    return g.store.stats(periods={'all': get_date_filter('all'), 'month': month_filter},
+                         breakdown=month_filter,
+                         recent_limit=5)
+
+@cache.cached('transactions', key=today)
+def get_monthly_series(label_format='%B %Y', count=6):
+    """Income/expenses for the past `count` months from the rollups, oldest first"""
+    keys = month_keys(count)
+    docs = g.store.monthly_rollups(keys[0])
+    return monthly_series(docs, keys, label_format)
+
+def report_window(now=None):
+    """Month keys shown on the reports page and the first rollup month they need"""
+    now = now or datetime.now()
+    keys = month_keys(6, now)
+    return keys, min(keys[0], (now.year, 1))
+
+def build_report_data(docs, keys, now=None):
+    """Monthly series, period statistics and category breakdown from rollup documents"""
+    now = now or datetime.now()
+    this_month = (now.year, now.month)
+    this_year = (now.year, 1)
+    return {
+        'monthly_data': monthly_series(docs, keys),
+        'month_stats': period_totals(docs, this_month),
+        'year_stats': period_totals(docs, this_year),
+        'category_data': category_totals(docs, this_month)
+    }
+
+@cache.cached('transactions', key=today)
+def get_report_data():
+    """Report data from one rollup read"""
+    keys, since = report_window()
+    return build_report_data(g.store.monthly_rollups(since), keys)
+
+@cache.cached('budgets')
+def get_budgets(day):
+    """Budgets of the periods containing `day` and of the periods before them"""
+    return [normalize_budget(b) for b in g.store.budgets(day)]
+
+@cache.cached('transactions')
+def get_spend_counters(day):
+    """Spend counters of the periods containing `day` and of the periods before them"""
+    return g.store.spend_counters(day)
+
+def get_budget_status(day=None):
+    """Every budget of the periods containing `day` evaluated against its counter"""
+    day = day or datetime.now().date()
+    return evaluate(get_budgets(day), get_spend_counters(day), day)
+
+def record_budget_events(events):
+    """Store threshold events and flash them to the user"""
+    if not events:
+        return
+    g.store.record_events(events)
+    live.budget_events(g.store.user_id, events)
+    for event in events:
+        flash(f'{event["category"]} budget for {event["label"]} reached {event["threshold"]}% '
+              f'({format_money(event["spent"], rates.reporting)} of {format_money(event["budget"], rates.reporting)})',
+              'warning')
+
+@cache.cached('transactions', key=today)
+def compute_analytics(budget_items=()):
+    """Rolling averages, forecast, anomalies and budget burn from one columnar load"""
+    now = datetime.now()
+    cols = load_columns(g.store, month_start(now, ANALYTICS_MONTHS - 1))
+    # Occurrences the recurring rules will add before the end of the forecast
+    scheduled = scheduled_totals(g.store.recurring_rules(), now, month_start(now, -FORECAST_MONTHS - 1) - timedelta(microseconds=1),
+                                 rates)
+    return build_analytics(cols, dict(budget_items), now, ANALYTICS_MONTHS, scheduled)
+
+def get_analytics():
+    """Analytics for this month's budgets (budget edits change the cache key)"""
+    budgets = [item for item in get_budget_status() if item['period'] == 'month']
+    return compute_analytics(tuple(sorted((item['category'], item['budget']) for item in budgets)))
+
+def entered_currency():
+    """Currency picked on a form (the reporting one by default); ValueError without exchange rates for it"""
+    currency = (request.form.get('currency') or rates.reporting).upper()
+    if currency not in rates.currencies:
+        raise ValueError(f'no exchange rates for {currency}')
+    return currency
+
+def build_budget_alerts(budget_status):
+    """Budgets at or above the warning threshold"""
+    return [item for item in budget_status if item['status'] != 'safe']
 
 # Routes
 @app.route('/')
 def index():
     """Dashboard page with summary statistics"""
-    stats = calculate_statistics('all')
-    month_stats = calculate_statistics('month')
-    
-    # Get recent transactions
-    recent_transactions = list(transactions_collection.find().sort('date', DESCENDING).limit(5))
-    
-    # Get category breakdown for charts
-    category_data = get_category_breakdown('month')
+    # Totals, category breakdown and recent transactions in one round trip
+    result = get_dashboard_stats()
+    stats = result['periods']['all']
+    month_stats = result['periods']['month']
+    recent_transactions = result['recent']
+    category_data = result['breakdown']
     
-    # Get budget alerts
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    budgets = list(budgets_collection.find({'month': current_month, 'year': current_year}))
-    
-    budget_alerts = []
-    for budget in budgets:
-        category = budget['category']
-        budget_amount = budget['amount']
-        spent = category_data.get(category, 0)
-        percentage = (spent / budget_amount * 100) if budget_amount > 0 else 0
-        
-        if percentage >= 100:
-            budget_alerts.append({
-                'category': category,
-                'budget': budget_amount,
-                'spent': spent,
-                'percentage': percentage,
-                'status': 'exceeded'
-            })
-        elif percentage >= 80:
-            budget_alerts.append({
-                'category': category,
-                'budget': budget_amount,
-                'spent': spent,
-                'percentage': percentage,
-                'status': 'warning'
-            })
+    # Budget alerts from the precomputed spend counters
+    budget_status = get_budget_status()
+    budget_alerts = build_budget_alerts(budget_status)
     
     return render_template('index.html', 
                          stats=stats,
                          month_stats=month_stats,
                          recent_transactions=recent_transactions,
                          category_data=category_data,
-                         budget_alerts=budget_alerts)
+                         budget_alerts=budget_alerts,
+                         live_updates=live.enabled,
+                         live_state=dashboard_snapshot(result, budget_status, datetime.now()))
 
 @app.route('/add', methods=['GET', 'POST'])
 def add_transaction():
     """Add new income or expense"""
     if request.method == 'POST':
         try:
+            currency = entered_currency()
             transaction = {
                 'type': request.form.get('type'),
-                'amount': float(request.form.get('amount')),
+                'amount': parse_amount(request.form.get('amount', ''), currency),
+                'currency': currency,
                 'category': request.form.get('category'),
                 'description': request.form.get('description', ''),
                 'date': datetime.strptime(request.form.get('date'), '%Y-%m-%d'),
                 'created_at': datetime.now()
             }
             
-            transactions_collection.insert_one(transaction)
+            events = g.store.add_transaction(transaction, budgets=get_budget_status(transaction['date']))
+            cache.invalidate('transactions')
+            bump_data_version()
+            live.transaction(g.store.user_id, transaction)
+            record_budget_events(events)
             flash(f'{transaction["type"].capitalize()} added successfully!', 'success')
             return redirect(url_for('index'))
         except Exception as e:
@@ -161,6 +582,36 @@ def add_transaction():
     
     return render_template('add_transaction.html', categories=CATEGORIES)
 
+@app.route('/import', methods=['GET', 'POST'])
+def import_statement():
+    """Bulk import transactions from a CSV or OFX statement"""
+    summary = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a file to import', 'error')
+        else:
+            try:
+                # Parse the upload as a stream; rows are validated and inserted batch by batch
+                lines = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+                rows = PARSERS[detect_format(upload.filename)](lines)
+                before = get_budget_status()
+                
+                def on_batch(inserted):
+                    cache.invalidate('transactions')
+                    bump_data_version()
+                
+                summary = import_transactions(rows, g.store, batch_size=IMPORT_BATCH_SIZE, on_batch=on_batch)
+                if summary['inserted']:
+                    live.resync(g.store.user_id)
+                flash(f'Imported {summary["inserted"]} transaction(s) '
+                      f'({summary["duplicates"]} duplicate(s), {summary["invalid"]} invalid)', 'success')
+                record_budget_events(status_events(before, get_budget_status()))
+            except Exception as e:
+                flash(f'Error importing statement: {str(e)}', 'error')
+    
+    return render_template('import.html', summary=summary, categories=CATEGORIES)
+
 @app.route('/transactions')
 def view_transactions():
     """View all transactions with filtering"""
@@ -169,156 +620,220 @@ def view_transactions():
     type_filter = request.args.get('type', 'all')
     
     # Build query
-    query = get_date_filter(filter_type)
+    query = build_transaction_query(request.args)
     
-    if category_filter != 'all':
-        query['category'] = category_filter
+    # Page size and keyset cursor
+    page_size = page_size_arg(request.args)
+    cursor = request.args.get('after')
+    stream = request.args.get('stream') == '1'
     
-    if type_filter != 'all':
-        query['type'] = type_filter
+    # Totals and category/type facet counts over the whole filter, in one query
+    facets = g.store.facets(query)
+    totals = facets['totals']
     
-    # Get transactions
-    transactions = list(transactions_collection.find(query).sort('date', DESCENDING))
+    # Rows are fetched lazily while the template renders
+    page = KeysetPage(g.store, query, page_size, cursor)
     
-    # Calculate totals
-    total_income = sum(t['amount'] for t in transactions if t['type'] == 'income')
-    total_expenses = sum(t['amount'] for t in transactions if t['type'] == 'expense')
-    
-    return render_template('view_transactions.html',
-                         transactions=transactions,
-                         categories=CATEGORIES,
-                         current_filter=filter_type,
-                         current_category=category_filter,
-                         current_type=type_filter,
-                         total_income=total_income,
-                         total_expenses=total_expenses)
+    render = stream_template if stream else render_template
+    return render('view_transactions.html',
+                  page=page,
+                  page_size=page_size,
+                  stream=stream,
+                  categories=CATEGORIES,
+                  current_filter=filter_type,
+                  current_category=category_filter,
+                  current_type=type_filter,
+                  search=search_args(request.args),
+                  facets=facets,
+                  total_income=totals['income'],
+                  total_expenses=totals['expenses'],
+                  total_count=totals['count'])
+
+@app.route('/api/search')
+def search_transactions():
+    """One page of matching transactions with totals and category/type facet counts"""
+    query = build_transaction_query(request.args)
+    page = KeysetPage(g.store, query, page_size_arg(request.args), request.args.get('after'))
+    results = [transaction_delta(transaction) for transaction in page]
+    facets = g.store.facets(query)
+    return jsonify({
+        'results': results,
+        'next_cursor': page.next_cursor,
+        'totals': facets['totals'],
+        'facets': {'type': facets['type'], 'category': facets['category']}
+    })
+
+def export_response(rows, fields, fmt, filename):
+    """Stream rows as a downloadable CSV/JSONL (optionally gzipped) file"""
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    body, mimetype, extension = export_stream(rows, fields, fmt, gzip=request.args.get('gzip') == '1')
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}.{extension}'
+    })
+
+@app.route('/export/transactions.<fmt>')
+def export_transactions(fmt):
+    """Export transactions matching the /transactions filters"""
+    rows = iter_transactions(g.store, build_transaction_query(request.args),
+                             batch_size=EXPORT_BATCH_SIZE)
+    return export_response(rows, TRANSACTION_FIELDS, fmt, 'transactions')
+
+@app.route('/export/monthly.<fmt>')
+def export_monthly(fmt):
+    """Export the monthly income/expense series"""
+    try:
+        months = min(max(int(request.args.get('months', 12)), 1), 120)
+    except ValueError:
+        months = 12
+    keys = month_keys(months)
+    rows = monthly_series(g.store.monthly_rollups(keys[0]), keys, '%Y-%m')
+    return export_response(rows, MONTHLY_FIELDS, fmt, 'monthly_report')
 
 @app.route('/delete/<transaction_id>')
 def delete_transaction(transaction_id):
     """Delete a transaction"""
     try:
-        transactions_collection.delete_one({'_id': ObjectId(transaction_id)})
+        transaction = g.store.delete_transaction(transaction_id)
+        if transaction:
+            cache.invalidate('transactions')
+            bump_data_version()
+            live.transaction(g.store.user_id, transaction, sign=-1)
         flash('Transaction deleted successfully!', 'success')
     except Exception as e:
         flash(f'Error deleting transaction: {str(e)}', 'error')
     
     return redirect(url_for('view_transactions'))
 
+@app.route('/recurring', methods=['GET', 'POST'])
+def recurring():
+    """Create and list recurring transaction rules with their upcoming occurrences"""
+    if request.method == 'POST':
+        try:
+            currency = entered_currency()
+            template = {
+                'type': request.form.get('type'),
+                'amount': parse_amount(request.form.get('amount', ''), currency),
+                'currency': currency,
+                'category': request.form.get('category'),
+                'description': request.form.get('description', ''),
+            }
+            start = datetime.strptime(request.form.get('start'), '%Y-%m-%d')
+            # The end date is inclusive
+            until = request.form.get('until')
+            until = datetime.strptime(until, '%Y-%m-%d') + timedelta(days=1, microseconds=-1) if until else None
+            g.store.add_rule(new_rule(template, request.form.get('schedule', ''), start, until, rates=rates))
+            # Forecasts include the rule's occurrences
+            cache.invalidate('transactions')
+            bump_data_version()
+            flash(f'Recurring {template["type"]} added successfully!', 'success')
+            return redirect(url_for('recurring'))
+        except Exception as e:
+            flash(f'Error adding recurring transaction: {str(e)}', 'error')
+
+    now = datetime.now()
+    rules = g.store.recurring_rules()
+    upcoming = project(rules, now, now + timedelta(days=RECURRING_UPCOMING_DAYS))
+    return render_template('recurring.html',
+                         rules=rules,
+                         upcoming=upcoming,
+                         upcoming_days=RECURRING_UPCOMING_DAYS,
+                         categories=CATEGORIES,
+                         today=now.strftime('%Y-%m-%d'))
+
+@app.route('/recurring/delete/<rule_id>')
+def delete_recurring(rule_id):
+    """Delete a recurring rule (transactions it already added are kept)"""
+    try:
+        if g.store.delete_rule(rule_id):
+            cache.invalidate('transactions')
+            bump_data_version()
+        flash('Recurring transaction deleted successfully!', 'success')
+    except Exception as e:
+        flash(f'Error deleting recurring transaction: {str(e)}', 'error')
+
+    return redirect(url_for('recurring'))
+
+@app.route('/api/recurring/upcoming')
+def api_recurring_upcoming():
+    """Projected recurring occurrences for the next ?days= days (default RECURRING_UPCOMING_DAYS)"""
+    days = min(max(request.args.get('days', RECURRING_UPCOMING_DAYS, type=int), 1), 366)
+    now = datetime.now()
+    upcoming = project(g.store.recurring_rules(), now, now + timedelta(days=days))
+    return jsonify([{**item, 'date': item['date'].isoformat()} for item in upcoming])
+
 @app.route('/budget', methods=['GET', 'POST'])
 def budget():
-    """Set and view budgets by category"""
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    current_month_name = datetime.now().strftime('%B %Y')
+    """Set and view weekly, monthly and yearly budgets by category"""
+    # ?month=YYYY-MM browses other months; the current month is evaluated as of today
+    today_date = datetime.now().date()
+    try:
+        selected = datetime.strptime(request.values.get('month', ''), '%Y-%m').date()
+    except ValueError:
+        selected = today_date.replace(day=1)
+    next_month = (selected.replace(day=28) + timedelta(days=4)).replace(day=1)
+    if (selected.year, selected.month) == (today_date.year, today_date.month):
+        day = today_date
+    else:
+        day = next_month - timedelta(days=1)
+    month_key = selected.strftime('%Y-%m')
     
     if request.method == 'POST':
         try:
             category = request.form.get('category')
-            amount = float(request.form.get('amount'))
+            # Budgets are in the reporting currency, like the spend they are compared with
+            amount = parse_amount(request.form.get('amount', ''), rates.reporting)
+            period = request.form.get('period', 'month')
+            if period not in PERIODS:
+                raise ValueError(f'unknown budget period {period!r}')
+            start = period_start(period, day)
             
             # Update or insert budget
-            budgets_collection.update_one(
-                {
-                    'category': category,
-                    'month': current_month,
-                    'year': current_year
-                },
-                {
-                    '$set': {
-                        'category': category,
-                        'amount': amount,
-                        'month': current_month,
-                        'year': current_year,
-                        'updated_at': datetime.now()
-                    }
-                },
-                upsert=True
-            )
-            flash(f'Budget for {category} set successfully!', 'success')
-            return redirect(url_for('budget'))
+            g.store.upsert_budget(category, period, start, amount, rollover=request.form.get('rollover') == 'on')
+            cache.invalidate('budgets')
+            bump_data_version()
+            flash(f'{period.capitalize()}ly budget for {category} set successfully!', 'success')
+            return redirect(url_for('budget', month=month_key))
         except Exception as e:
             flash(f'Error setting budget: {str(e)}', 'error')
     
-    # Get current budgets
-    budgets = list(budgets_collection.find({'month': current_month, 'year': current_year}))
+    # Every budget evaluated against its spend counter in one pass
+    budget_status = get_budget_status(day)
+    monthly = {item['category']: item for item in budget_status if item['period'] == 'month'}
+    spending = period_spending(get_spend_counters(day), 'month', period_start('month', day))
     
-    # Get actual spending
-    category_spending = get_category_breakdown('month')
-    
-    # Combine budget and actual data
+    # Monthly budgets for every category (unbudgeted ones show their spend only)
     budget_data = []
     for category in CATEGORIES:
         if category != 'Salary':  # Exclude Salary from budgets
-            budget_item = next((b for b in budgets if b['category'] == category), None)
-            budget_amount = budget_item['amount'] if budget_item else 0
-            spent = category_spending.get(category, 0)
-            percentage = (spent / budget_amount * 100) if budget_amount > 0 else 0
-            
-            status = 'safe'
-            if percentage >= 100:
-                status = 'exceeded'
-            elif percentage >= 80:
-                status = 'warning'
-            
-            budget_data.append({
-                'category': category,
-                'budget': budget_amount,
-                'spent': spent,
-                'remaining': budget_amount - spent,
-                'percentage': min(percentage, 100),
-                'status': status
-            })
+            item = monthly.get(category)
+            if item is None:
+                spent = spending.get(category, 0)
+                item = {'category': category, 'budget': 0, 'spent': spent, 'remaining': -spent,
+                        'percentage': 0, 'status': 'safe', 'rollover': False, 'carry': 0}
+            budget_data.append({**item, 'percentage': min(item['percentage'], 100)})
+    
+    other_budgets = [{**item, 'percentage': min(item['percentage'], 100)}
+                     for item in budget_status if item['period'] != 'month']
+    events = g.store.recent_events(10)
     
     return render_template('budget.html', 
                          budget_data=budget_data,
+                         other_budgets=other_budgets,
+                         events=events,
+                         periods=PERIODS,
                          categories=[c for c in CATEGORIES if c != 'Salary'],
-                         current_month_name=current_month_name)
+                         current_month_name=period_label('month', period_start('month', day)),
+                         month_key=month_key,
+                         previous_month=previous_start('month', period_start('month', day)).strftime('%Y-%m'),
+                         next_month=next_month.strftime('%Y-%m'))
 
 @app.route('/reports')
 def reports():
     """Monthly and yearly reports with charts"""
-    # Get monthly data for the past 6 months
-    monthly_data = []
-    for i in range(6):
-        date = datetime.now() - timedelta(days=30*i)
-        month_start = date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        if i > 0:
-            next_month = month_start + timedelta(days=32)
-            month_end = next_month.replace(day=1)
-        else:
-            month_end = datetime.now()
-        
-        income = list(transactions_collection.aggregate([
-            {'$match': {'type': 'income', 'date': {'$gte': month_start, '$lt': month_end}}},
-            {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}
-        ]))
-        
-        expenses = list(transactions_collection.aggregate([
-            {'$match': {'type': 'expense', 'date': {'$gte': month_start, '$lt': month_end}}},
-            {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}
-        ]))
-        
-        monthly_data.append({
-            'month': month_start.strftime('%B %Y'),
-            'income': income[0]['total'] if income else 0,
-            'expenses': expenses[0]['total'] if expenses else 0
-        })
-    
-    monthly_data.reverse()
+    report = get_report_data()
     
-    # Get current month statistics
-    month_stats = calculate_statistics('month')
-    year_stats = calculate_statistics('year')
-    
-    # Category breakdown
-    category_data = get_category_breakdown('month')
-    
-    return render_template('reports.html',
-                         monthly_data=monthly_data,
-                         month_stats=month_stats,
-                         year_stats=year_stats,
-                         category_data=category_data)
+    return render_template('reports.html', analytics=get_analytics(), **report)
 
 @app.route('/api/chart-data')
 def chart_data():
@@ -330,43 +845,103 @@ def chart_data():
         return jsonify(data)
     
     elif chart_type == 'monthly':
-        monthly_data = []
-        for i in range(6):
-            date = datetime.now() - timedelta(days=30*i)
-            month_start = date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            
-            if i > 0:
-                next_month = month_start + timedelta(days=32)
-                month_end = next_month.replace(day=1)
-            else:
-                month_end = datetime.now()
-            
-            income = list(transactions_collection.aggregate([
-                {'$match': {'type': 'income', 'date': {'$gte': month_start, '$lt': month_end}}},
-                {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}
-            ]))
-            
-            expenses = list(transactions_collection.aggregate([
-                {'$match': {'type': 'expense', 'date': {'$gte': month_start, '$lt': month_end}}},
-                {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}
-            ]))
-            
-            monthly_data.append({
-                'month': month_start.strftime('%b %Y'),
-                'income': income[0]['total'] if income else 0,
-                'expenses': expenses[0]['total'] if expenses else 0
-            })
-        
-        monthly_data.reverse()
-        return jsonify(monthly_data)
+        return jsonify(get_monthly_series('%b %Y'))
     
     return jsonify({})
 
+@app.route('/api/analytics')
+def analytics():
+    """Trends, forecast, anomalies and projected budget burn as JSON"""
+    return jsonify(get_analytics())
+
+@app.route('/api/dashboard')
+def dashboard_data():
+    """Dashboard state as JSON (what live dashboards reload on a resync)"""
+    return jsonify(dashboard_snapshot(get_dashboard_stats(), get_budget_status(), datetime.now()))
+
+@app.route('/events')
+def events():
+    """Server-sent event stream of dashboard deltas for the request's tenant"""
+    if not live.enabled:
+        abort(404)
+    live.start(storage.db)
+    user_id = g.store.user_id
+    subscription = live.subscribe(user_id)
+    if subscription is None:
+        # Every stream holds a thread; past the cap the dashboard polls /api/dashboard
+        response = Response('Too many live update streams, please retry later.\n', status=503,
+                            mimetype='text/plain')
+        response.headers['Retry-After'] = str(POLL_SECONDS)
+        return response
+    response = Response(live.stream(user_id, subscription), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Also release the slot when the client goes away before the stream starts
+    response.call_on_close(lambda: live.unsubscribe(user_id, subscription))
+    return response
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is serving (never touches the database)"""
+    return jsonify({'status': 'ok', 'pid': os.getpid(), 'uptime_seconds': round(time.perf_counter() - STARTED, 3)})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: storage prepared and answering a ping"""
+    try:
+        ready = preparation.ensure()
+        if ready:
+            storage.ping()
+    except storage.unavailable_errors as e:
+        if not storage.is_unavailable(e):
+            raise
+        ready, preparation.error = False, str(e)
+    body = {'status': 'ready' if ready else 'unavailable', 'backend': storage.name,
+            'prepare_attempts': preparation.attempts,
+            'prepare_seconds': preparation.seconds, **startup}
+    if not ready:
+        body['error'] = preparation.error
+    response = jsonify(body)
+    if not ready:
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STORAGE_RETRY_SECONDS)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for DB commands and pool, requests, startup, caches, live streams and the scheduler"""
+    cache_counters = cache.stats()
+    recurring_stats = scheduler.stats()
+    body = query_listener.prometheus({
+        **(pool_listener.metrics() if storage.name == 'mongo' else {}),
+        'expense_tracker_startup_import_seconds': ('gauge', 'Time to import the app', startup['import_seconds']),
+        'expense_tracker_storage_ready': ('gauge', 'Whether storage is prepared', int(preparation.ready)),
+        'expense_tracker_storage_prepare_seconds': ('gauge', 'Time the startup migrations took',
+                                                    preparation.seconds or 0),
+        'expense_tracker_cache_hits_total': ('counter', 'Aggregate cache hits', cache_counters['hits']),
+        'expense_tracker_cache_misses_total': ('counter', 'Aggregate cache misses', cache_counters['misses']),
+        'expense_tracker_cache_evictions_total': ('counter', 'Aggregate cache evictions', cache_counters['evictions']),
+        'expense_tracker_live_subscribers': ('gauge', 'Open live update streams', live.broker.subscriber_count()),
+        'expense_tracker_recurring_passes_total': ('counter', 'Recurring scheduler passes in this process',
+                                                   recurring_stats['passes']),
+        'expense_tracker_recurring_materialized_total': ('counter', 'Recurring transactions added by this process',
+                                                         recurring_stats['materialized']),
+        'expense_tracker_recurring_pass_seconds': ('gauge', 'Duration of the last recurring scheduler pass',
+                                                   recurring_stats['last_pass_seconds'] or 0),
+    })
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache-stats')
+def cache_stats():
+    """Hit/miss/eviction counters for the aggregate cache"""
+    return jsonify(cache.stats())
+
 # Template filters
 @app.template_filter('currency')
-def currency_filter(value):
-    """Format number as currency"""
-    return f"${value:,.2f}"
+def currency_filter(value, currency=None):
+    """Format an amount in `currency` (the reporting currency by default)"""
+    return format_money(value, currency or rates.reporting)
+
+startup['import_seconds'] = time.perf_counter() - STARTED
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    create_app().run(debug=True, port=5000)
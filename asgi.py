@@ -0,0 +1,20 @@
+"""
+ASGI Entry Point
+Serves the app through an ASGI server with the Motor-backed async views.
+
+Usage:
+    uvicorn asgi:application --workers 4
+
+WsgiToAsgi runs each request in a worker thread and Flask hands async views
+back to the server's event loop, so every async view in a process shares
+one Motor connection pool (sized by MONGO_MAX_POOL_SIZE).
+"""
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+import async_views
+
+async_views.install(app)
+
+application = WsgiToAsgi(app)
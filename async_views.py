@@ -0,0 +1,201 @@
+"""
+Async Views
+Motor-backed coroutine versions of the read-heavy routes. Independent
+queries are issued concurrently with asyncio.gather, so a page costs one
+round trip of latency instead of the sum of its queries.
+
+These replace the sync views when the app is served through asgi.py with
+the MongoDB backend (other backends keep the sync views).
+"""
+
+from flask import render_template, request, jsonify, g
+from motor.motor_asyncio import AsyncIOMotorClient
+from datetime import datetime, timedelta
+import asyncio
+
+import app as sync_app
+from app import cache, today, period_boundary, get_date_filter, build_budget_alerts, \
+    report_window, build_report_data
+from budget_engine import budget_window, normalize_budget, evaluate
+from live import dashboard_snapshot
+from analytics import FORECAST_MONTHS, daily_pipeline, columns_from_rows, month_start, build_analytics
+from recurring import scheduled_totals
+from tenancy import TENANT_KEY
+from stats_engine import build_stats_pipeline, parse_stats
+from rollups import month_keys, rollups_since, monthly_series
+
+# Motor clients are bound to the event loop they were created on
+_clients = {}
+
+
+def get_client():
+    """Motor client for the running event loop, created on first use (same options as the sync client)"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncIOMotorClient(sync_app.MONGODB_URI,
+                                    event_listeners=[sync_app.query_listener, sync_app.pool_listener],
+                                    **sync_app.MONGO_CLIENT_OPTIONS)
+        _clients[loop] = client
+    return client
+
+
+def get_db():
+    return get_client()[sync_app.DATABASE_NAME]
+
+
+def tenant_db():
+    """The request tenant's Motor collections, scoped like g.store"""
+    return sync_app.storage.router.route(get_db(), g.store.user_id)
+
+
+def analytics_db():
+    """The request tenant's collections for reports and analytics (MONGO_ANALYTICS_READ_PREFERENCE)"""
+    db = get_client().get_database(sync_app.DATABASE_NAME,
+                                   read_preference=sync_app.storage.analytics_read_preference)
+    return sync_app.storage.router.route(db, g.store.user_id)
+
+
+# Async helpers
+async def run_stats(periods=None, breakdown=None, recent_limit=0):
+    """Async counterpart of stats_engine.run_stats"""
+    pipeline = build_stats_pipeline(periods, breakdown, recent_limit)
+    result = await tenant_db().transactions.aggregate(pipeline).to_list(1)
+    return parse_stats(result[0] if result else {}, periods)
+
+
+async def load_rollups(since):
+    """Async counterpart of rollups.load_rollups"""
+    return await analytics_db().rollups.find(rollups_since(since), {'_id': 0}).to_list(None)
+
+
+async def load_columns(since, batch_size=10000):
+    """Async counterpart of analytics.load_columns"""
+    cursor = analytics_db().transactions.aggregate(daily_pipeline(since), batchSize=batch_size)
+    return columns_from_rows([row async for row in cursor])
+
+
+@cache.cached('transactions', key=today)
+async def get_dashboard_stats_async():
+    month_filter = get_date_filter('month')
+    return await run_stats(periods={'all': get_date_filter('all'), 'month': month_filter},
+                           breakdown=month_filter,
+                           recent_limit=5)
+
+
+@cache.cached('budgets')
+async def get_budgets_async(day):
+    budgets = await tenant_db().budgets.find(budget_window(day)).to_list(None)
+    return [normalize_budget(b) for b in budgets]
+
+
+@cache.cached('transactions')
+async def get_spend_counters_async(day):
+    return await tenant_db().counters.find(budget_window(day), {'_id': 0}).to_list(None)
+
+
+async def get_budget_status_async(day=None):
+    """Async counterpart of app.get_budget_status; budgets and counters load concurrently"""
+    day = day or datetime.now().date()
+    budgets, counters = await asyncio.gather(get_budgets_async(day), get_spend_counters_async(day))
+    return evaluate(budgets, counters, day)
+
+
+@cache.cached('transactions', key=period_boundary)
+async def get_category_breakdown_async(filter_type='month'):
+    result = await run_stats(breakdown=get_date_filter(filter_type))
+    return result['breakdown']
+
+
+@cache.cached('transactions', key=today)
+async def get_report_data_async():
+    keys, since = report_window()
+    return build_report_data(await load_rollups(since), keys)
+
+
+@cache.cached('transactions', key=today)
+async def get_monthly_series_async(label_format='%B %Y', count=6):
+    keys = month_keys(count)
+    return monthly_series(await load_rollups(keys[0]), keys, label_format)
+
+
+@cache.cached('transactions', key=today)
+async def compute_analytics_async(budget_items=()):
+    now = datetime.now()
+    # Rules of every tenant live in the shared database
+    cols, rules = await asyncio.gather(
+        load_columns(month_start(now, sync_app.ANALYTICS_MONTHS - 1)),
+        get_db().recurring_rules.find({TENANT_KEY: g.store.user_id}).to_list(None))
+    scheduled = scheduled_totals(rules, now, month_start(now, -FORECAST_MONTHS - 1) - timedelta(microseconds=1),
+                                 sync_app.rates)
+    return build_analytics(cols, dict(budget_items), now, sync_app.ANALYTICS_MONTHS, scheduled)
+
+
+async def get_analytics_async():
+    budgets = [item for item in await get_budget_status_async() if item['period'] == 'month']
+    return await compute_analytics_async(tuple(sorted((item['category'], item['budget']) for item in budgets)))
+
+
+# Views
+async def index():
+    """Dashboard: statistics and budget status fetched concurrently"""
+    result, budget_status = await asyncio.gather(
+        get_dashboard_stats_async(),
+        get_budget_status_async()
+    )
+    return render_template('index.html',
+                           stats=result['periods']['all'],
+                           month_stats=result['periods']['month'],
+                           recent_transactions=result['recent'],
+                           category_data=result['breakdown'],
+                           budget_alerts=build_budget_alerts(budget_status),
+                           live_updates=sync_app.live.enabled,
+                           live_state=dashboard_snapshot(result, budget_status, datetime.now()))
+
+
+async def reports():
+    """Reports: rollup read and analytics load run concurrently"""
+    report, analytics = await asyncio.gather(get_report_data_async(), get_analytics_async())
+    return render_template('reports.html', analytics=analytics, **report)
+
+
+async def dashboard_data():
+    """Dashboard state API"""
+    result, budget_status = await asyncio.gather(get_dashboard_stats_async(), get_budget_status_async())
+    return jsonify(dashboard_snapshot(result, budget_status, datetime.now()))
+
+
+async def analytics():
+    """Analytics API"""
+    return jsonify(await get_analytics_async())
+
+
+async def chart_data():
+    """Chart data API"""
+    chart_type = request.args.get('type', 'category')
+
+    if chart_type == 'category':
+        return jsonify(await get_category_breakdown_async('month'))
+
+    elif chart_type == 'monthly':
+        return jsonify(await get_monthly_series_async('%b %Y'))
+
+    return jsonify({})
+
+
+# Endpoint name -> async view used in ASGI mode
+ASYNC_VIEWS = {
+    'index': index,
+    'reports': reports,
+    'chart_data': chart_data,
+    'analytics': analytics,
+    'dashboard_data': dashboard_data,
+}
+
+
+def install(flask_app):
+    """Swap the sync views for their async counterparts (same URLs and endpoints)"""
+    if sync_app.storage.name != 'mongo':
+        return
+    for endpoint, view in ASYNC_VIEWS.items():
+        flask_app.view_functions[endpoint] = view
@@ -0,0 +1,768 @@
+"""
+Benchmark Suite
+Generates a synthetic dataset, drives every route through the Flask test
+client and records p50/p95/p99 latency, database round trips and response
+bytes per route as JSON.
+
+Usage:
+    python benchmark.py --size 10k --backend mongomock
+    python benchmark.py --size 1m --backend mongod --requests 50
+    python benchmark.py --size 1m --backend sqlite
+    python benchmark.py --compare bench_results/old.json bench_results/new.json
+    python benchmark.py --load sync=http://localhost:5000 async=http://localhost:8000
+    python benchmark.py --size 100k --tenants 20 --backend mongod
+    python benchmark.py --size 1m --backend sqlite --foreign 0.3
+    python benchmark.py --conformance --size 5000 --backends mongomock sqlite
+    python benchmark.py --startup --requests 10
+
+`--tenants N` loads N tenants of `--size` rows each and measures one of them
+(BENCH_TENANT). Comparing a `--tenants 1` run with a `--tenants 20` run on the
+same size shows whether a request's cost follows its tenant's data or the
+whole deployment's.
+
+`--foreign SHARE` enters that share of rows in EUR, GBP or JPY, converted
+to USD with synthetic daily exchange rates as they are loaded (see
+money.py), so mixed-currency reports can be compared with single-currency
+ones on the same size.
+
+`--load` fires concurrent HTTP requests at already-running servers (e.g.
+gunicorn app:app vs uvicorn asgi:application on the same dataset) and
+compares throughput and latency per route.
+
+`--conformance` loads the same dataset into each storage backend through
+the tenant store API, runs one workload (stats, totals, keyset pages,
+searches and facets, rollups, daily sums, budget evaluation, inserts and
+deletes) against each, reports any result that differs between backends and
+times every operation. Its dataset has 10% foreign-currency rows unless
+`--foreign` says otherwise. The synthetic descriptions only have a handful of
+distinct words, so fuzzy matching is also timed against a seeded vocabulary
+of SEARCH_VOCABULARY_SIZE words (search_fuzzy_vocabulary).
+
+`--startup` starts fresh interpreters that import the app and call
+create_app(), and reports how long each step took: the whole process
+(interpreter and dependency imports included), app.py itself and the
+factory. Set PREPARE_ON_START=true to include connecting and the startup
+migrations.
+
+`--backend mongod` uses MONGODB_URI with a separate DATABASE_NAME
+(default expense_tracker_bench) which is dropped and regenerated unless
+`--reuse` is given. `--backend sqlite` uses BENCH_SQLITE_PATH (default
+bench_results/expense_tracker_bench.db). `--backend mongomock` needs
+`pip install mongomock` and is only practical up to ~100k rows.
+"""
+
+from datetime import datetime, timedelta
+from pymongo import monitoring
+from bson.objectid import ObjectId
+from bson.decimal128 import Decimal128
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+from money import to_decimal
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+INSERT_BATCH_SIZE = 10_000
+BACKENDS = ['mongomock', 'mongod', 'sqlite']
+
+# Tenant every benchmarked request is made as (the first of --tenants)
+BENCH_TENANT = 'tenant-0'
+
+# Routes driven by the benchmark: (label, path)
+ROUTES = [
+    ('dashboard', '/'),
+    ('reports', '/reports'),
+    ('budget', '/budget'),
+    ('transactions', '/transactions'),
+    ('transactions_filtered', '/transactions?filter=month&type=expense'),
+    ('chart_category', '/api/chart-data?type=category'),
+    ('chart_monthly', '/api/chart-data?type=monthly'),
+    ('analytics', '/api/analytics'),
+    ('export_month_csv', '/export/transactions.csv?filter=month'),
+    ('search_prefix', '/transactions?q=transp'),
+    ('search_fuzzy', '/transactions?q=helthcare&fuzzy=1'),
+    ('search_ranges', '/transactions?q=food&min_amount=50&max_amount=100&from=2024-01-01&to=2024-12-31'),
+    ('search_api', '/api/search?q=shopping+purchase'),
+]
+
+# Currencies of --foreign rows: units per USD when the synthetic rates start
+FOREIGN_CURRENCIES = {'EUR': 0.92, 'GBP': 0.79, 'JPY': 150.0}
+CONFORMANCE_FOREIGN = 0.1
+
+# Distinct words fuzzy search expands against in the conformance workload
+SEARCH_VOCABULARY_SIZE = 50_000
+
+# Rough share of rows per category and a plausible amount range for each
+EXPENSE_PROFILE = {
+    'Food': (0.35, 5, 150),
+    'Transport': (0.2, 3, 80),
+    'Entertainment': (0.1, 10, 200),
+    'Healthcare': (0.05, 20, 500),
+    'Utilities': (0.1, 30, 300),
+    'Shopping': (0.15, 10, 600),
+    'Other': (0.05, 1, 100),
+}
+
+
+# Dataset generation
+def generate_transactions(count, years=5, seed=42, now=None, foreign=0.0):
+    """
+    Yield `count` synthetic transactions spread over the last `years` years,
+    a `foreign` share of them in one of FOREIGN_CURRENCIES
+    """
+    rng = random.Random(seed)
+    currencies = list(FOREIGN_CURRENCIES)
+    now = now or datetime.now()
+    span_seconds = int(years * 365 * 24 * 3600)
+    categories = list(EXPENSE_PROFILE)
+    weights = [EXPENSE_PROFILE[c][0] for c in categories]
+
+    for i in range(count):
+        date = now - timedelta(seconds=rng.randrange(span_seconds))
+        if rng.random() < 0.08:
+            category = 'Salary' if rng.random() < 0.8 else 'Other'
+            transaction = {
+                'type': 'income',
+                'amount': round(rng.uniform(500, 6000), 2),
+                'category': category,
+                'description': f'{category} payment {i}',
+                'date': date,
+                'created_at': date,
+            }
+        else:
+            category = rng.choices(categories, weights)[0]
+            _, low, high = EXPENSE_PROFILE[category]
+            transaction = {
+                'type': 'expense',
+                'amount': round(rng.uniform(low, high), 2),
+                'category': category,
+                'description': f'{category} purchase {i}',
+                'date': date,
+                'created_at': date,
+            }
+        # Drawn only when asked for, so single-currency datasets stay the same
+        if foreign and rng.random() < foreign:
+            currency = rng.choice(currencies)
+            transaction['currency'] = currency
+            transaction['amount'] = round(transaction['amount'] * FOREIGN_CURRENCIES[currency],
+                                          0 if currency == 'JPY' else 2)
+        yield transaction
+
+
+def bench_rates(years=5, seed=42, now=None):
+    """USD-reporting ExchangeRates for FOREIGN_CURRENCIES: a seeded daily random walk over `years` years"""
+    from money import ExchangeRates
+    rng = random.Random(seed)
+    today = (now or datetime.now()).date()
+    first = today - timedelta(days=years * 366)
+    rates = {}
+    for currency, rate in FOREIGN_CURRENCIES.items():
+        series, day = [], first
+        while day <= today:
+            series.append((day, round(rate, 6)))
+            rate *= 1 + rng.gauss(0, 0.004)
+            day += timedelta(days=1)
+        rates[currency] = series
+    return ExchangeRates('USD', rates)
+
+
+def search_vocabulary(count=SEARCH_VOCABULARY_SIZE, seed=42):
+    """`count` distinct lowercase words of 3 to 12 letters, sorted like a tenant's search terms"""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(3, 12))))
+    return sorted(words)
+
+
+def tenant_ids(tenants):
+    """User ids of the synthetic tenants; the first one is BENCH_TENANT"""
+    return [f'tenant-{i}' for i in range(tenants)]
+
+
+def load_dataset(storage, count, years=5, seed=42, create_indexes=True, tenants=1, foreign=0.0):
+    """
+    Bulk insert `count` synthetic transactions plus current-month budgets for
+    each of `tenants` tenants; returns seconds taken.
+    """
+    if storage.name != 'mongo':
+        return load_store_dataset(storage, count, years, seed, tenants, foreign=foreign)
+
+    from indexes import ensure_indexes
+    from rollups import rebuild_rollups
+    from budget_engine import rebuild_counters
+    from storage import prepare_transaction
+    from money import to_bson
+
+    db = storage.db
+    started = time.perf_counter()
+    db.transactions.delete_many({})
+    db.budgets.delete_many({})
+    db.monthly_rollups.delete_many({})
+    db.spend_counters.delete_many({})
+    db.budget_events.delete_many({})
+
+    now = datetime.now()
+    month_start = datetime(now.year, now.month, 1)
+    for offset, user_id in enumerate(tenant_ids(tenants)):
+        batch = []
+        for transaction in generate_transactions(count, years, seed + offset, foreign=foreign):
+            transaction['user_id'] = user_id
+            batch.append(prepare_transaction(transaction, storage.rates))
+            if len(batch) >= INSERT_BATCH_SIZE:
+                db.transactions.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            db.transactions.insert_many(batch, ordered=False)
+
+        db.budgets.insert_many([
+            {'user_id': user_id, 'category': category, 'amount': to_bson(500), 'period': 'month',
+             'start': month_start, 'rollover': False, 'month': now.month, 'year': now.year,
+             'updated_at': now}
+            for category in EXPENSE_PROFILE
+        ])
+
+    # Building indexes after the bulk load is much faster than maintaining them per batch
+    if create_indexes:
+        ensure_indexes(db)
+    rebuild_rollups(db.transactions, db.monthly_rollups)
+    rebuild_counters(db.transactions, db.spend_counters)
+    return time.perf_counter() - started
+
+
+def load_store_dataset(storage, count, years=5, seed=42, tenants=1, fixed_ids=False, now=None, foreign=0.0):
+    """
+    load_dataset through the tenant store API (works for every backend).
+
+    `fixed_ids` gives rows deterministic ids and millisecond dates (what
+    MongoDB stores), so several backends hold exactly the same data.
+    """
+    started = time.perf_counter()
+    now = now or datetime.now()
+    month_start = datetime(now.year, now.month, 1)
+    for offset, user_id in enumerate(tenant_ids(tenants)):
+        store = storage.tenant(user_id)
+        store.clear()
+        batch = []
+        for i, transaction in enumerate(generate_transactions(count, years, seed + offset, now, foreign)):
+            if fixed_ids:
+                transaction['_id'] = ObjectId(f'{offset:08x}{i:016x}')
+                for field in ('date', 'created_at'):
+                    value = transaction[field]
+                    transaction[field] = value.replace(microsecond=value.microsecond // 1000 * 1000)
+            batch.append(transaction)
+            if len(batch) >= INSERT_BATCH_SIZE:
+                store.insert_transactions(batch)
+                batch = []
+        if batch:
+            store.insert_transactions(batch)
+        for category in EXPENSE_PROFILE:
+            store.upsert_budget(category, 'month', month_start, 500.0)
+    return time.perf_counter() - started
+
+
+# Round-trip accounting
+class RoundTripCounter(monitoring.CommandListener):
+    """Counts the commands pymongo sends to the server"""
+
+    def __init__(self):
+        self.commands = 0
+
+    def reset(self):
+        self.commands = 0
+
+    def statement(self, sql):
+        """sqlite3 trace callback: one statement is one round trip"""
+        self.commands += 1
+
+    def started(self, event):
+        self.commands += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def count_mongomock_calls(counter):
+    """mongomock never emits command events, so count collection calls instead"""
+    import mongomock
+    depth = [0]
+
+    def wrap(method):
+        def wrapper(self, *args, **kwargs):
+            # mongomock implements some methods on top of others; count only the outer call
+            if depth[0] == 0:
+                counter.commands += 1
+            depth[0] += 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                depth[0] -= 1
+        return wrapper
+
+    for name in ('find', 'find_one', 'aggregate', 'insert_one', 'insert_many', 'update_one',
+                 'update_many', 'delete_one', 'delete_many', 'find_one_and_delete',
+                 'bulk_write', 'count_documents'):
+        setattr(mongomock.Collection, name, wrap(getattr(mongomock.Collection, name)))
+
+
+# Measurement
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_route(client, counter, path, requests, warmup=2, headers=None):
+    """Request `path` repeatedly; return latency/round-trip/bytes summary"""
+    for _ in range(warmup):
+        client.get(path, headers=headers)
+
+    latencies, round_trips, sizes = [], [], []
+    for _ in range(requests):
+        counter.reset()
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        body = response.get_data()
+        latencies.append((time.perf_counter() - started) * 1000)
+        round_trips.append(counter.commands)
+        sizes.append(len(body))
+        if response.status_code >= 400:
+            raise RuntimeError(f'{path} returned {response.status_code}')
+
+    return {
+        'path': path,
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'db_round_trips': max(round_trips),
+        'response_bytes': max(sizes),
+    }
+
+
+def load_route(base_url, path, concurrency, duration, headers=None):
+    """Hammer one URL from `concurrency` threads for `duration` seconds"""
+    url = base_url.rstrip('/') + path
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        latencies, errors = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                request = urllib.request.Request(url, headers=headers or {})
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                latencies.append((time.perf_counter() - started) * 1000)
+            except OSError:
+                errors += 1
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda _: worker(), range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [value for samples, _ in results for value in samples]
+    return {
+        'path': path,
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+    }
+
+
+def run_load(args):
+    """Compare running servers (e.g. sync vs async mode) under concurrent load"""
+    targets = dict(target.split('=', 1) if '=' in target else (target, target) for target in args.load)
+    routes = [route for route in ROUTES if not args.routes or route[0] in args.routes]
+    result = {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'targets': {},
+    }
+
+    for name, base_url in targets.items():
+        print(f"\n⏱  {name} ({base_url}), {args.concurrency} concurrent clients")
+        result['targets'][name] = {}
+        for label, path in routes:
+            stats = load_route(base_url, path, args.concurrency, args.duration,
+                               {args.tenant_header: BENCH_TENANT})
+            result['targets'][name][label] = stats
+            print(f"  {label:<24} {stats['throughput_rps']:>8.1f} req/s  p50 {stats['p50_ms']:>9.2f}ms  "
+                  f"p95 {stats['p95_ms']:>9.2f}ms  p99 {stats['p99_ms']:>9.2f}ms  {stats['errors']} errors")
+
+    output = args.output or os.path.join('bench_results', f"{result['revision']}_load.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\n✓ Results written to {output}")
+    return 0
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def import_app(backend, use_cache):
+    """Import app.py against the chosen backend and register the round-trip counter"""
+    counter = RoundTripCounter()
+    if not use_cache:
+        os.environ['CACHE_TTL'] = '0'
+    os.environ['ENSURE_INDEXES'] = 'false'
+
+    if backend == 'mongomock':
+        import mongomock
+        import pymongo
+        import money
+        pymongo.MongoClient = mongomock.MongoClient
+        money.DECIMAL128 = False
+        count_mongomock_calls(counter)
+    elif backend == 'sqlite':
+        path = os.getenv('BENCH_SQLITE_PATH', os.path.join('bench_results', 'expense_tracker_bench.db'))
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        os.environ['STORAGE_BACKEND'] = 'sqlite'
+        os.environ['SQLITE_PATH'] = path
+    else:
+        os.environ['DATABASE_NAME'] = os.getenv('BENCH_DATABASE_NAME', 'expense_tracker_bench')
+        monitoring.register(counter)
+
+    os.environ['PREPARE_ON_START'] = 'true'
+
+    import app
+    app.create_app()
+    app.app.config['TESTING'] = True
+    if backend == 'sqlite':
+        app.storage.set_trace(counter.statement)
+    return app, counter
+
+
+def run_startup(args):
+    """Time importing the app and create_app() in fresh interpreters"""
+    code = ('import json, app; app.create_app(); '
+            'print(json.dumps({**app.startup, "prepare_seconds": app.preparation.seconds}))')
+    samples = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+        sample = json.loads(output.decode().strip().splitlines()[-1])
+        sample['process_seconds'] = time.perf_counter() - started
+        samples.append(sample)
+
+    result = {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'runs': len(samples),
+        'startup': {},
+    }
+    print(f"\n⏱  Startup over {len(samples)} runs")
+    for metric in ('process_seconds', 'import_seconds', 'factory_seconds', 'prepare_seconds'):
+        values = sorted(sample[metric] for sample in samples if sample[metric] is not None)
+        if not values:
+            continue
+        stats = {'p50_ms': round(percentile(values, 50) * 1000, 2), 'max_ms': round(values[-1] * 1000, 2)}
+        result['startup'][metric] = stats
+        print(f"  {metric:<24} p50 {stats['p50_ms']:>9.2f}ms  max {stats['max_ms']:>9.2f}ms")
+
+    output = args.output or os.path.join('bench_results', f"{result['revision']}_startup.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\n✓ Results written to {output}")
+    return 0
+
+
+def run_benchmark(args):
+    size = SIZES.get(args.size.lower()) or int(args.size)
+    app, counter = import_app(args.backend, args.cache)
+
+    result = {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'backend': args.backend,
+        'size': size,
+        'tenants': args.tenants,
+        'total_rows': size * args.tenants,
+        'cache': args.cache,
+        'foreign': args.foreign,
+        'routes': {},
+    }
+
+    if args.foreign:
+        app.rates = app.storage.rates = bench_rates(args.years)
+
+    if not args.reuse:
+        total = size * args.tenants
+        print(f"📝 Generating {total:,} transactions ({args.tenants} tenant(s) x {size:,})...")
+        # mongomock indexes do not speed up queries, they only slow down inserts
+        seconds = load_dataset(app.storage, size, args.years, create_indexes=args.backend == 'mongod',
+                               tenants=args.tenants, foreign=args.foreign)
+        result['load_seconds'] = round(seconds, 2)
+        result['load_rows_per_sec'] = round(total / seconds) if seconds else total
+        print(f"  ✓ Loaded in {seconds:.1f}s ({result['load_rows_per_sec']:,} rows/sec)")
+
+    client = app.app.test_client()
+    headers = {app.TENANT_HEADER: BENCH_TENANT}
+    routes = [route for route in ROUTES if not args.routes or route[0] in args.routes]
+    print(f"\n⏱  Benchmarking {len(routes)} routes x {args.requests} requests as {BENCH_TENANT}...")
+    for label, path in routes:
+        stats = run_route(client, counter, path, args.requests, headers=headers)
+        result['routes'][label] = stats
+        print(f"  {label:<24} p50 {stats['p50_ms']:>9.2f}ms  p95 {stats['p95_ms']:>9.2f}ms  "
+              f"p99 {stats['p99_ms']:>9.2f}ms  {stats['db_round_trips']:>3} trips  "
+              f"{stats['response_bytes']:>9,} bytes")
+
+    suffix = f'_x{args.tenants}' if args.tenants > 1 else ''
+    output = args.output or os.path.join(
+        'bench_results', f"{result['revision']}_{args.backend}_{args.size}{suffix}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\n✓ Results written to {output}")
+    return 0
+
+
+# Backend conformance
+def open_storage(backend):
+    """A fresh storage of one benchmark backend, without importing app.py"""
+    from storage import create_storage
+    if backend == 'mongomock':
+        import mongomock
+        import money
+        money.DECIMAL128 = False
+        storage = create_storage('mongo', uri=None, database_name='expense_tracker_bench',
+                                 client=mongomock.MongoClient())
+    elif backend == 'sqlite':
+        path = os.getenv('BENCH_SQLITE_PATH', os.path.join('bench_results', 'expense_tracker_bench.db'))
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        storage = create_storage('sqlite', path=path)
+    else:
+        storage = create_storage('mongo', uri=os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'),
+                                 database_name=os.getenv('BENCH_DATABASE_NAME', 'expense_tracker_bench'))
+    storage.prepare(BENCH_TENANT)
+    return storage
+
+
+def conformance_workload(store, now):
+    """(label, operation) pairs; each operation returns a result every backend must agree on"""
+    from pagination import KeysetPage
+    from budget_engine import evaluate
+    from search import expand_word, search_words, text_filter
+    from recurring import new_rule
+
+    month = {'date': {'$gte': datetime(now.year, now.month, 1)}}
+    year = {'date': {'$gte': datetime(now.year, 1, 1)}}
+    day = now.date()
+
+    def pages(query, count=3, page_size=50):
+        rows, token = [], None
+        for _ in range(count):
+            page = KeysetPage(store, query, page_size, token)
+            rows.append(list(page))
+            token = page.next_cursor
+            if token is None:
+                break
+        return rows
+
+    def search(text, fuzzy=False, **ranges):
+        return {**ranges, **text_filter(search_words(text), store.search_terms(), fuzzy)}
+
+    def budget_status():
+        return evaluate(store.budgets(day), store.spend_counters(day), day)
+
+    # Built once (with the dataset's own words, which the typos stand for): only the expansion is timed
+    vocabulary = sorted(set(search_vocabulary()) | set(store.search_terms()))
+
+    def fuzzy_expansions():
+        return [expand_word(word, vocabulary, fuzzy=True) for word in search_words('helthcare purchse trnsport')]
+
+    # An expense that crosses its monthly budget, and its deletion
+    added = {'_id': ObjectId('ffffffff0000000000000001'), 'type': 'expense', 'amount': 450.0,
+             'category': 'Healthcare', 'description': 'conformance', 'date': now.replace(microsecond=0),
+             'created_at': now.replace(microsecond=0)}
+    rule = {**new_rule({'type': 'expense', 'amount': 15.0, 'category': 'Entertainment', 'description': 'conformance'},
+                       '0 0 1 * *', datetime(now.year, now.month, 1), now=now.replace(microsecond=0)),
+            '_id': ObjectId('ffffffff0000000000000002')}
+
+    return [
+        ('stats_dashboard', lambda: store.stats(periods={'all': {}, 'month': month}, breakdown=month,
+                                                recent_limit=5)),
+        ('stats_year', lambda: store.stats(periods={'year': year}, breakdown=year)),
+        ('totals_filtered', lambda: store.totals({**month, 'type': 'expense'})),
+        ('totals_category', lambda: store.totals({'category': {'$in': ['Food', 'Transport']}})),
+        ('keyset_pages', lambda: pages({})),
+        ('keyset_pages_filtered', lambda: pages({**year, 'category': 'Food'})),
+        ('search_terms', store.search_terms),
+        ('search_prefix_pages', lambda: pages(search('transp'))),
+        ('search_fuzzy_pages', lambda: pages(search('helthcare purchse', fuzzy=True))),
+        ('search_fuzzy_vocabulary', fuzzy_expansions),
+        ('search_facets', lambda: store.facets(search('pur', amount={'$gte': 50, '$lte': 100}, **year))),
+        ('monthly_rollups', lambda: store.monthly_rollups((now.year - 1, now.month))),
+        ('daily_sums', lambda: list(store.daily_sums(datetime(now.year, 1, 1)))),
+        ('budget_status', budget_status),
+        ('add_transaction', lambda: store.add_transaction(dict(added), budgets=budget_status())),
+        ('budget_status_after_add', budget_status),
+        ('delete_transaction', lambda: store.delete_transaction(str(added['_id']))),
+        ('budget_status_after_delete', budget_status),
+        ('add_rule', lambda: store.add_rule(dict(rule))),
+        ('recurring_rules', store.recurring_rules),
+        ('delete_rule', lambda: store.delete_rule(str(rule['_id']))),
+    ]
+
+
+def normalize(value):
+    """Backend-neutral form of a result: ids as strings, sums rounded, write timestamps dropped"""
+    if isinstance(value, dict):
+        # Write timestamps differ between runs; terms is MongoDB's copy of the search index
+        return {key: normalize(item) for key, item in value.items()
+                if key not in ('created_at', 'updated_at', 'terms')}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (float, Decimal, Decimal128)):
+        # Decimal128 on MongoDB, Decimal on SQLite and doubles on mongomock
+        return round(float(to_decimal(value)), 6)
+    return value
+
+
+# Results whose order is not part of the interface
+UNORDERED = {'monthly_rollups', 'daily_sums'}
+
+
+def run_conformance(args):
+    """Run the same workload against every backend; diff the results and time each operation"""
+    size = SIZES.get(args.size.lower()) or int(args.size)
+    now = datetime.now()
+    foreign = args.foreign or CONFORMANCE_FOREIGN
+    result = {
+        'revision': git_revision(),
+        'timestamp': now.isoformat(timespec='seconds'),
+        'size': size,
+        'foreign': foreign,
+        'backends': {},
+        'mismatches': [],
+    }
+
+    outputs = {}
+    for backend in args.backends:
+        storage = open_storage(backend)
+        storage.rates = bench_rates(args.years, now=now)
+        try:
+            print(f"\n📝 {backend}: loading {size:,} transactions...")
+            seconds = load_store_dataset(storage, size, args.years, fixed_ids=True, now=now, foreign=foreign)
+            timings = {'load_seconds': round(seconds, 2)}
+            outputs[backend] = {}
+            store = storage.tenant(BENCH_TENANT)
+            for label, operation in conformance_workload(store, now):
+                started = time.perf_counter()
+                value = normalize(operation())
+                timings[label] = round((time.perf_counter() - started) * 1000, 2)
+                if label in UNORDERED:
+                    value = sorted(value, key=lambda item: json.dumps(item, sort_keys=True, default=str))
+                outputs[backend][label] = value
+                print(f"  {label:<28} {timings[label]:>9.2f}ms")
+            result['backends'][backend] = timings
+        finally:
+            storage.close()
+
+    reference = args.backends[0]
+    for backend in args.backends[1:]:
+        for label, value in outputs[backend].items():
+            if value != outputs[reference][label]:
+                result['mismatches'].append({'operation': label, 'backends': [reference, backend]})
+
+    print()
+    for mismatch in result['mismatches']:
+        print(f"✗ {mismatch['operation']}: {' != '.join(mismatch['backends'])}")
+    if not result['mismatches']:
+        print(f"✓ {', '.join(args.backends)} agree on every operation")
+
+    output = args.output or os.path.join('bench_results', f"{result['revision']}_conformance_{args.size}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"✓ Results written to {output}")
+    return 1 if result['mismatches'] else 0
+
+
+def compare(old_path, new_path):
+    """Print per-route p50/p95 deltas between two result files"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{old['revision']} -> {new['revision']} ({new['backend']}, {new['size']:,} rows per tenant, "
+          f"{old.get('tenants', 1)} -> {new.get('tenants', 1)} tenant(s))\n")
+    for label, stats in new['routes'].items():
+        before = old['routes'].get(label)
+        if not before:
+            print(f"  {label:<24} (new)")
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'db_round_trips'):
+            delta = stats[metric] - before[metric]
+            change = f"{delta / before[metric] * 100:+.0f}%" if before[metric] else 'n/a'
+            print(f"  {label:<24} {metric:<15} {before[metric]:>10} -> {stats[metric]:>10}  {change}")
+    return 0
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Route benchmark suite')
+    parser.add_argument('--size', default='10k', help='10k, 100k, 1m, 10m or a row count')
+    parser.add_argument('--years', type=int, default=5, help='years of history to spread rows over')
+    parser.add_argument('--tenants', type=int, default=1, help='tenants of --size rows each')
+    parser.add_argument('--foreign', type=float, default=0.0, help='share of rows in EUR, GBP or JPY')
+    parser.add_argument('--tenant-header', default='X-User-Id', help='tenant header sent by --load')
+    parser.add_argument('--backend', choices=BACKENDS, default='mongomock')
+    parser.add_argument('--conformance', action='store_true', help='run the storage conformance workload')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=['mongomock', 'sqlite'],
+                        help='backends compared by --conformance (the first is the reference)')
+    parser.add_argument('--startup', action='store_true', help='time app import and create_app()')
+    parser.add_argument('--requests', type=int, default=20, help='timed requests per route (runs for --startup)')
+    parser.add_argument('--routes', nargs='*', help='only benchmark these route labels')
+    parser.add_argument('--cache', action='store_true', help='keep the aggregate cache enabled')
+    parser.add_argument('--reuse', action='store_true', help='reuse the existing dataset')
+    parser.add_argument('--output', help='result file (default bench_results/<rev>_<backend>_<size>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='diff two result files')
+    parser.add_argument('--load', nargs='+', metavar='NAME=URL', help='load-test running servers')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients for --load')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per route for --load')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+    if args.load:
+        return run_load(args)
+    if args.conformance:
+        return run_conformance(args)
+    if args.startup:
+        return run_startup(args)
+    return run_benchmark(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,343 @@
+"""
+Budget Engine
+Per-(period, start, category) expense counters kept up to date on every write,
+and a single-pass evaluation of every budget against them.
+
+Budgets cover a week (starting Monday), a month or a year. A rollover budget
+adds what was left over (or overspent) in its previous period. Crossing a
+threshold (THRESHOLDS, % of the budget) is detected at write time and
+returned as an event for the budget_events collection.
+
+Usage:
+    python budget_engine.py --rebuild  # backfill spend counters from transactions
+"""
+
+from pymongo import MongoClient, UpdateOne, ReturnDocument
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from collections import defaultdict
+import os
+import sys
+
+from tenancy import collection_names
+from http_cache import bump_all_versions
+from money import to_decimal, to_bson
+
+PERIODS = ('week', 'month', 'year')
+THRESHOLDS = (80, 100)
+WARNING_PCT = THRESHOLDS[0]
+
+
+# Periods
+def period_start(period, when):
+    """Start (midnight) of the `period` containing `when`"""
+    day = datetime(when.year, when.month, when.day)
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'year':
+        return day.replace(month=1, day=1)
+    raise ValueError(f'unknown budget period {period!r}')
+
+
+def previous_start(period, start):
+    """Start of the period before the one starting at `start`"""
+    if period == 'week':
+        return start - timedelta(days=7)
+    if period == 'month':
+        return (start - timedelta(days=1)).replace(day=1)
+    return start.replace(year=start.year - 1)
+
+
+def next_start(period, start):
+    """Start of the period after the one starting at `start`"""
+    if period == 'week':
+        return start + timedelta(days=7)
+    if period == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start.replace(year=start.year + 1)
+
+
+def period_label(period, start):
+    if period == 'week':
+        return f"Week of {start.strftime('%b %d, %Y')}"
+    if period == 'month':
+        return start.strftime('%B %Y')
+    return str(start.year)
+
+
+def budget_window(when):
+    """Filter for budgets/counters of the periods containing `when` and the ones before them"""
+    return {'$or': [
+        {'period': period, 'start': {'$in': [previous_start(period, period_start(period, when)),
+                                             period_start(period, when)]}}
+        for period in PERIODS
+    ]}
+
+
+def status_for(percentage):
+    if percentage >= 100:
+        return 'exceeded'
+    if percentage >= WARNING_PCT:
+        return 'warning'
+    return 'safe'
+
+
+def normalize_budget(budget):
+    """Budgets saved before periods existed are monthly ones without rollover"""
+    if 'period' not in budget:
+        budget = {**budget, 'period': 'month', 'start': datetime(budget['year'], budget['month'], 1)}
+    budget.setdefault('rollover', False)
+    return budget
+
+
+# Counters
+def _counter_keys(transaction):
+    """Counter filters (one per period) an expense contributes to"""
+    return [
+        {
+            'user_id': transaction.get('user_id'),
+            'period': period,
+            'start': period_start(period, transaction['date']),
+            'category': transaction['category']
+        }
+        for period in PERIODS
+    ]
+
+
+def crossings(item, before, after):
+    """
+    Threshold event for an evaluated budget whose spend went from `before` to
+    `after` (only the highest threshold crossed, so one write raises one alert)
+    """
+    events = []
+    for threshold in reversed(THRESHOLDS):
+        limit = item['budget'] * threshold / 100
+        if before < limit <= after:
+            events.append({
+                'category': item['category'],
+                'period': item['period'],
+                'start': item['start'],
+                'label': item['label'],
+                'threshold': threshold,
+                'budget': item['budget'],
+                'spent': round(after, 2),
+                'created_at': datetime.now()
+            })
+            break
+    return events
+
+
+def apply_spend(counters, transaction, sign=1, budgets=()):
+    """
+    Add (sign=1) or remove (sign=-1) one expense from its week/month/year counters.
+
+    `budgets` are evaluated budgets (see evaluate) covering the transaction's
+    date. Their counters are updated with find_one_and_update so the new total
+    is known atomically; returns the threshold events crossed.
+    """
+    if transaction['type'] != 'expense':
+        return []
+
+    amount = sign * to_decimal(transaction['amount'])
+    budgeted = {(item['period'], item['start'], item['category']): item for item in budgets}
+    update = {'$inc': {'spent': to_bson(amount), 'count': sign}}
+    events, ops = [], []
+    for key in _counter_keys(transaction):
+        item = budgeted.get((key['period'], key['start'], key['category']))
+        if item and sign > 0:
+            counter = counters.find_one_and_update(key, update, upsert=True,
+                                                   return_document=ReturnDocument.AFTER)
+            spent = to_decimal(counter['spent'])
+            events.extend(crossings(item, spent - amount, spent))
+        else:
+            ops.append(UpdateOne(key, update, upsert=True))
+    if ops:
+        counters.bulk_write(ops, ordered=False)
+    if sign < 0:
+        # Drop emptied counters so they never show up as spend
+        counters.delete_many({'$or': _counter_keys(transaction), 'count': {'$lte': 0}})
+    return events
+
+
+def apply_spends(counters, transactions, sign=1):
+    """Fold many transactions into their counters with one bulk write"""
+    deltas = defaultdict(lambda: [0, 0])
+    for transaction in transactions:
+        if transaction['type'] != 'expense':
+            continue
+        for key in _counter_keys(transaction):
+            delta = deltas[tuple(key.values())]
+            delta[0] += sign * to_decimal(transaction['amount'])
+            delta[1] += sign
+
+    if not deltas:
+        return
+
+    counters.bulk_write([
+        UpdateOne(
+            {'user_id': user_id, 'period': period, 'start': start, 'category': category},
+            {'$inc': {'spent': to_bson(spent), 'count': count}},
+            upsert=True
+        )
+        for (user_id, period, start, category), (spent, count) in deltas.items()
+    ], ordered=False)
+    if sign < 0:
+        counters.delete_many({'count': {'$lte': 0}})
+
+
+def rebuild_counters(transactions, counters):
+    """
+    Recompute the counters from scratch: the server collapses expenses to
+    daily sums and those are folded into week/month/year counters here.
+    """
+    daily = transactions.aggregate([
+        {'$match': {'type': 'expense'}},
+        {'$group': {
+            '_id': {
+                'user_id': '$user_id',
+                'y': {'$year': '$date'},
+                'm': {'$month': '$date'},
+                'd': {'$dayOfMonth': '$date'},
+                'category': '$category'
+            },
+            'spent': {'$sum': '$amount'},
+            'count': {'$sum': 1}
+        }}
+    ], batchSize=10000)
+
+    totals = defaultdict(lambda: [0, 0])
+    for row in daily:
+        key = row['_id']
+        day = datetime(key['y'], key['m'], key['d'])
+        for period in PERIODS:
+            total = totals[(key['user_id'], period, period_start(period, day), key['category'])]
+            total[0] += to_decimal(row['spent'])
+            total[1] += row['count']
+
+    counters.delete_many({})
+    if totals:
+        counters.insert_many([
+            {'user_id': user_id, 'period': period, 'start': start, 'category': category,
+             'spent': to_bson(spent), 'count': count}
+            for (user_id, period, start, category), (spent, count) in totals.items()
+        ], ordered=False)
+    return len(totals)
+
+
+def migrate_budgets(budgets):
+    """Give budgets saved before periods existed their period/start fields"""
+    ops = [
+        UpdateOne({'_id': budget['_id']}, {'$set': {
+            'period': 'month',
+            'start': datetime(budget['year'], budget['month'], 1),
+            'rollover': False
+        }})
+        for budget in budgets.find({'period': {'$exists': False}}, {'month': 1, 'year': 1})
+    ]
+    if ops:
+        budgets.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+# Evaluation
+def evaluate(budgets, counters, when):
+    """
+    Evaluate every budget of the periods containing `when` in one pass.
+
+    `budgets` and `counters` are the documents matching budget_window(when);
+    the previous periods' documents supply rollover amounts.
+    """
+    spent = {(c['period'], c['start'], c['category']): to_decimal(c['spent']) for c in counters}
+    by_key = {}
+    for budget in map(normalize_budget, budgets):
+        by_key[(budget['period'], budget['start'], budget['category'])] = budget
+
+    results = []
+    for (period, start, category), budget in by_key.items():
+        if start != period_start(period, when):
+            continue
+        carry = 0
+        if budget['rollover']:
+            previous = by_key.get((period, previous_start(period, start), category))
+            if previous:
+                carry = to_decimal(previous['amount']) - spent.get((period, previous['start'], category), 0)
+
+        amount = to_decimal(budget['amount']) + carry
+        used = spent.get((period, start, category), 0)
+        if amount > 0:
+            percentage = float(used / amount * 100)
+        else:
+            percentage = 100 if used > 0 else 0
+
+        results.append({
+            'category': category,
+            'period': period,
+            'start': start,
+            'label': period_label(period, start),
+            'amount': to_decimal(budget['amount']),
+            'rollover': budget['rollover'],
+            'carry': carry,
+            'budget': amount,
+            'spent': used,
+            'remaining': amount - used,
+            'percentage': percentage,
+            'status': status_for(percentage)
+        })
+
+    results.sort(key=lambda item: (PERIODS.index(item['period']), item['category']))
+    return results
+
+
+def period_spending(counters, period, start):
+    """Category -> spent for one period, from counter documents"""
+    return {c['category']: to_decimal(c['spent']) for c in counters if c['period'] == period and c['start'] == start}
+
+
+def status_events(before, after):
+    """Threshold events between two evaluate() results (e.g. around a bulk import)"""
+    previous = {(item['period'], item['start'], item['category']): item['spent'] for item in before}
+    events = []
+    for item in after:
+        events.extend(crossings(item, previous.get((item['period'], item['start'], item['category']), 0),
+                                item['spent']))
+    return events
+
+
+def main(argv):
+    load_dotenv()
+    mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+    database_name = os.getenv('DATABASE_NAME', 'expense_tracker_db')
+
+    if '--rebuild' not in argv:
+        print(__doc__)
+        return 1
+
+    try:
+        client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=5000)
+        client.server_info()
+        db = client[database_name]
+        print("✓ Connected to MongoDB successfully!")
+    except Exception as e:
+        print(f"✗ MongoDB connection failed: {e}")
+        return 1
+
+    try:
+        print("\n🔄 Rebuilding spend counters...")
+        count = rebuild_counters(db.transactions, db.spend_counters)
+        print(f"✓ Rebuilt {count} counters")
+        dedicated = [t.strip() for t in os.getenv('DEDICATED_TENANTS', '').split(',') if t.strip()]
+        for user_id in dedicated:
+            names = collection_names(user_id)
+            count = rebuild_counters(db[names['transactions']], db[names['spend_counters']])
+            print(f"✓ Rebuilt {count} counters for dedicated tenant {user_id}")
+        count = bump_all_versions(db.data_versions, db.transactions.distinct('user_id') + dedicated)
+        print(f"✓ Bumped the data version of {count} tenants")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,284 @@
+"""
+Aggregate Cache
+TTL + LRU cache for the aggregate helpers in app.py, invalidated by namespace
+from the write routes.
+
+Invalidation bumps a per-namespace generation (a counter, or a random token in
+the file backend) stored in the backend and every cache key embeds the current
+generation, so a shared backend (e.g. the file backend on a common directory)
+invalidates all gunicorn workers at once.
+Generations are kept apart from the entries and are never evicted: an evicted
+generation would restart from 0 and bring back entries it had invalidated.
+
+An optional `scope` callable (the current tenant) partitions both the keys and
+the generations, so one tenant's writes never evict another tenant's entries.
+An optional `version` callable (the tenant's data version, shared by every
+worker through the database) is embedded in every key as well, so a worker
+whose per-process backend missed another worker's invalidation still never
+serves an entry computed for an older version.
+"""
+
+from collections import OrderedDict
+from functools import wraps
+import asyncio
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+
+
+class MemoryBackend:
+    """Per-process LRU store"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+        # One small counter per (tenant, namespace), outside the LRU
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def generation(self, name):
+        with self._lock:
+            return self._generations.get(name, 0)
+
+    def bump(self, name):
+        with self._lock:
+            value = self._generations[name] = self._generations.get(name, 0) + 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FileBackend:
+    """
+    Directory-backed store shared by every process that points at the same path.
+
+    Entries are pickled one file per key; writes go through a temp file and
+    os.replace so readers never see a partial entry. Unpickling runs code, so
+    the directory must be private to the app's user: it is created with mode
+    0o700, and an existing one owned by someone else or open to other users
+    is refused. LRU order is tracked with
+    file mtimes (touched on read). Generations are random tokens in a
+    `generations` subdirectory that eviction and clear() leave alone.
+    """
+
+    GENERATIONS = 'generations'
+
+    def __init__(self, directory, max_entries=1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._generations = os.path.join(directory, self.GENERATIONS)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._check_private(directory)
+        os.makedirs(self._generations, mode=0o700, exist_ok=True)
+        self._check_private(self._generations)
+
+    @staticmethod
+    def _check_private(directory):
+        """ValueError unless `directory` is owned by this user and closed to everyone else (POSIX)"""
+        if not hasattr(os, 'getuid'):
+            return
+        info = os.stat(directory)
+        if info.st_uid != os.getuid():
+            raise ValueError(f'cache directory {directory} is not owned by this user')
+        if info.st_mode & 0o077:
+            raise ValueError(f'cache directory {directory} is accessible to other users (chmod 700 it)')
+
+    def _path(self, key, directory=None):
+        return os.path.join(directory or self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def _write(self, path, entry):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def get(self, key):
+        path = self._path(key)
+        entry = self._read(path)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        self._write(self._path(key), (expires_at, value))
+        self._evict()
+
+    def generation(self, name):
+        return self._read(self._path(name, self._generations)) or 0
+
+    def bump(self, name):
+        # A fresh random token instead of a read-increment-write counter: two
+        # workers bumping at once each write a value nobody has keyed entries
+        # with, so whichever replace lands last, no invalidation is lost
+        value = uuid.uuid4().hex
+        self._write(self._path(name, self._generations), value)
+        return value
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith('.tmp') or name == self.GENERATIONS:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name == self.GENERATIONS:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+class AggregateCache:
+    """Namespaced, generation-invalidated cache with hit/miss counters"""
+
+    def __init__(self, backend, ttl=60, scope=None, version=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.scope = scope
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+
+    def _scoped(self, namespace):
+        return f'{self.scope()}/{namespace}' if self.scope else namespace
+
+    def _generation(self, namespace):
+        return self.backend.generation(namespace)
+
+    def invalidate(self, *namespaces):
+        """Drop every cached value in the given namespaces (for the current scope)"""
+        for namespace in namespaces:
+            self.backend.bump(self._scoped(namespace))
+
+    def cached(self, namespace, key=None):
+        """
+        Decorator caching a helper's result.
+
+        `key` is an optional callable taking the helper's arguments and
+        returning extra key material (e.g. the period boundary).
+        """
+        def decorator(func):
+            def make_key(args, kwargs):
+                extra = key(*args, **kwargs) if key else None
+                scoped = self._scoped(namespace)
+                version = self.version() if self.version else None
+                return (f'{scoped}:{self._generation(scoped)}:{version}:{func.__name__}:'
+                        f'{args!r}:{sorted(kwargs.items())!r}:{extra!r}')
+
+            def lookup(cache_key):
+                value = self.backend.get(cache_key)
+                if value is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                return value
+
+            if asyncio.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.ttl:
+                        return await func(*args, **kwargs)
+                    cache_key = make_key(args, kwargs)
+                    value = lookup(cache_key)
+                    if value is None:
+                        value = await func(*args, **kwargs)
+                        self.backend.set(cache_key, value, self.ttl)
+                    return value
+                return async_wrapper
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.ttl:
+                    return func(*args, **kwargs)
+                cache_key = make_key(args, kwargs)
+                value = lookup(cache_key)
+                if value is None:
+                    value = func(*args, **kwargs)
+                    self.backend.set(cache_key, value, self.ttl)
+                return value
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """Hit/miss/eviction counters for this process"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+            'ttl': self.ttl,
+            'backend': type(self.backend).__name__
+        }
+
+
+def create_cache(backend='memory', ttl=60, max_entries=256, directory=None, scope=None, version=None):
+    """Build an AggregateCache from configuration values"""
+    if backend == 'file':
+        # No shared default such as the system temp dir: anyone able to write
+        # there could plant a pickle
+        if not directory:
+            raise ValueError('the file cache backend needs a directory (CACHE_DIR)')
+        return AggregateCache(FileBackend(directory, max_entries), ttl, scope, version)
+    return AggregateCache(MemoryBackend(max_entries), ttl, scope, version)
@@ -0,0 +1,6 @@
+"""
+Transaction Categories
+Shared by the web app and the command-line tools
+"""
+
+CATEGORIES = ['Food', 'Transport', 'Entertainment', 'Healthcare', 'Utilities', 'Shopping', 'Salary', 'Other']
@@ -0,0 +1,86 @@
+"""
+Streaming Export
+Generators that turn a tenant store's cursor into CSV or JSON Lines chunks
+(optionally gzipped) without ever holding the full result in memory.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+from money import json_default
+
+TRANSACTION_FIELDS = ['date', 'type', 'category', 'description', 'amount', 'currency', 'original_amount']
+MONTHLY_FIELDS = ['month', 'income', 'expenses']
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_transactions(store, query, batch_size=1000):
+    """Cursor over matching transactions, newest first, fetched `batch_size` rows at a time"""
+    projection = {field: 1 for field in TRANSACTION_FIELDS}
+    projection['_id'] = 0
+    return store.find_transactions(query, projection=projection, batch_size=batch_size)
+
+
+def _format_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def to_csv(rows, fields):
+    """Yield CSV text in ~CHUNK_SIZE pieces, header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow([_format_value(row.get(field, '')) for field in fields])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def to_jsonl(rows, fields):
+    """Yield JSON Lines text in ~CHUNK_SIZE pieces"""
+    chunk = []
+    size = 0
+    for row in rows:
+        line = json.dumps({field: _format_value(row.get(field)) for field in fields}, default=json_default) + '\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk, size = [], 0
+    yield ''.join(chunk)
+
+
+FORMATS = {
+    'csv': (to_csv, 'text/csv'),
+    'jsonl': (to_jsonl, 'application/x-ndjson'),
+}
+
+
+def gzip_chunks(chunks):
+    """Compress a stream of text chunks into a gzip stream on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(rows, fields, fmt, gzip=False):
+    """
+    Build the body and headers for an export.
+
+    Returns (body iterator, mimetype, file extension).
+    """
+    serializer, mimetype = FORMATS[fmt]
+    body = serializer(rows, fields)
+    if gzip:
+        return gzip_chunks(body), 'application/gzip', f'{fmt}.gz'
+    return body, mimetype, fmt
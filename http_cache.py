@@ -0,0 +1,158 @@
+"""
+HTTP Caching
+Conditional GET, response compression and fingerprinted static URLs.
+
+Every tenant has a data version in the data_versions collection, bumped by
+the write routes. A page's ETag hashes the release, tenant, data version,
+day and URL, so a revalidation can be answered with 304 from one _id lookup,
+before the view runs any aggregation. Because the version lives in MongoDB,
+all workers agree on it.
+
+Static files are fingerprinted by content (?v=<hash>). A fingerprinted URL
+never changes meaning, so it can be cached for a year.
+"""
+
+from pymongo import ReturnDocument
+from werkzeug.security import safe_join
+import gzip
+import hashlib
+import os
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'application/x-ndjson', 'image/svg+xml'
+}
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+
+# Data versions
+def current_version(collection, user_id):
+    document = collection.find_one({'_id': user_id}, {'version': 1})
+    return document['version'] if document else 0
+
+
+def bump_version(collection, user_id):
+    """Invalidate every ETag handed out for `user_id`"""
+    document = collection.find_one_and_update({'_id': user_id}, {'$inc': {'version': 1}},
+                                              upsert=True, return_document=ReturnDocument.AFTER)
+    return document['version']
+
+
+def bump_all_versions(collection, user_ids=()):
+    """
+    Invalidate every ETag of every tenant with a data version, and of
+    `user_ids` (tenants with data but no version yet), after a maintenance
+    job rewrote stored amounts or aggregates; returns the tenant count
+    """
+    collection.update_many({}, {'$inc': {'version': 1}})
+    existing = set(collection.distinct('_id'))
+    missing = set(user_ids) - existing
+    for user_id in missing:
+        bump_version(collection, user_id)
+    return len(existing) + len(missing)
+
+
+# ETags
+def make_etag(*parts):
+    return hashlib.sha1('\x1f'.join(map(str, parts)).encode()).hexdigest()[:20]
+
+
+def encoded_etag(etag, encoding=None):
+    """Strong ETag of one encoding of a representation (each encoding is a different entity)"""
+    return f'"{etag}-{encoding}"' if encoding else f'"{etag}"'
+
+
+def matching_etag(if_none_match, etag):
+    """The tag of an If-None-Match header naming any encoding of `etag`, or None"""
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == '*':
+        return encoded_etag(etag)
+    candidates = {encoded_etag(etag)} | {encoded_etag(etag, encoding) for encoding in ('br', 'gzip')}
+    for tag in if_none_match.split(','):
+        # Weak comparison, as RFC 9110 specifies for If-None-Match
+        tag = tag.strip().removeprefix('W/')
+        if tag in candidates:
+            return tag
+    return None
+
+
+def release_id(*directories):
+    """Content hash of the templates and static files, so a deploy changes every ETag"""
+    digest = hashlib.sha1()
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, directory).encode())
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+# Compression
+def negotiate_encoding(accept_encoding):
+    """Best supported content coding in an Accept-Encoding header, or None"""
+    offered = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if offered.get(encoding, offered.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, best=False):
+    """Compress a body; `best` trades CPU for size (for static files, compressed once)"""
+    if encoding == 'br':
+        # Quality 5 compresses about as well as gzip -9 at a fraction of quality 11's cost
+        return brotli.compress(data, quality=11 if best else 5)
+    return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+
+
+# Static files
+class StaticManifest:
+    """Content fingerprints of static files, recomputed when a file changes"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._versions = {}
+        self._compressed = {}
+
+    def version(self, filename):
+        path = safe_join(self.folder, filename)
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError):
+            return None
+        key = (filename, stat.st_mtime_ns, stat.st_size)
+        version = self._versions.get(key)
+        if version is None:
+            with open(path, 'rb') as f:
+                version = hashlib.sha256(f.read()).hexdigest()[:10]
+            self._versions[key] = version
+        return version
+
+    def compressed(self, filename, version, data, encoding):
+        """Compress a static file once per version and encoding"""
+        key = (filename, version, encoding)
+        body = self._compressed.get(key)
+        if body is None:
+            body = compress(data, encoding, best=True)
+            self._compressed[key] = body
+        return body
@@ -0,0 +1,256 @@
+"""
+Bulk Import
+Streams bank statements (CSV or OFX) into a tenant store in batches,
+skipping rows that were already imported. Rows in another currency are
+converted to the reporting currency as they are inserted.
+
+Usage:
+    python importer.py statement.csv [--batch-size 1000] [--user USER]
+    python importer.py statement.ofx
+"""
+
+from datetime import datetime
+from dotenv import load_dotenv
+from collections import Counter
+import csv
+import hashlib
+import os
+import re
+import sys
+import time
+
+from categories import CATEGORIES
+from tenancy import validate_tenant
+from storage import create_storage
+from money import parse_amount, rates_from_env
+
+DATE_FORMATS = ['%Y-%m-%d', '%m/%d/%Y', '%Y/%m/%d', '%d.%m.%Y']
+MAX_REPORTED_ERRORS = 20
+
+
+# Parsers
+def parse_csv(lines):
+    """
+    Yield raw rows from a CSV statement.
+
+    Expects a header with at least `date` and `amount`; `type`, `category`,
+    `description` and `currency` are optional (column names are
+    case-insensitive).
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+
+
+OFX_TAG = re.compile(r'<(/?\w+)>([^<]*)')
+
+
+def parse_ofx(lines):
+    """Yield raw rows from an OFX/QFX statement (SGML or XML flavour)"""
+    current, currency = None, ''
+    for line in lines:
+        for tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'CURDEF':
+                # The statement's currency, given before its transactions
+                currency = value.strip()
+            elif tag == 'STMTTRN':
+                current = {}
+            elif tag == '/STMTTRN' and current is not None:
+                yield {
+                    'date': current.get('DTPOSTED', '')[:8],
+                    'amount': current.get('TRNAMT', ''),
+                    'description': current.get('MEMO') or current.get('NAME', ''),
+                    'currency': currency,
+                }
+                current = None
+            elif current is not None and not tag.startswith('/'):
+                current[tag] = value.strip()
+
+
+PARSERS = {'csv': parse_csv, 'ofx': parse_ofx, 'qfx': parse_ofx}
+
+
+# Validation
+def parse_date(value):
+    """Parse a statement date in any of DATE_FORMATS (or OFX YYYYMMDD)"""
+    for fmt in DATE_FORMATS + ['%Y%m%d']:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f'unrecognised date {value!r}')
+
+
+def validate_row(row, categories):
+    """Turn a raw row into a transaction document or raise ValueError"""
+    date = parse_date(row.get('date', ''))
+
+    currency = row.get('currency', '').upper()
+    try:
+        amount = parse_amount(row.get('amount', ''), currency or 'USD')
+    except ValueError:
+        raise ValueError(f'invalid amount {row.get("amount")!r}')
+
+    # Signed statements: negative amounts are expenses
+    type_ = row.get('type', '').lower() or ('expense' if amount < 0 else 'income')
+    if type_ not in ('income', 'expense'):
+        raise ValueError(f'invalid type {type_!r}')
+    amount = abs(amount)
+    if amount == 0:
+        raise ValueError('amount must be non-zero')
+
+    category = row.get('category') or 'Other'
+    category = next((c for c in categories if c.lower() == category.lower()), None)
+    if category is None:
+        raise ValueError(f'unknown category {row.get("category")!r}')
+
+    transaction = {
+        'type': type_,
+        'amount': amount,
+        'category': category,
+        'description': row.get('description', ''),
+        'date': date,
+    }
+    # Without one the row is in the reporting currency
+    if currency:
+        transaction['currency'] = currency
+    return transaction
+
+
+def content_hash(transaction, occurrence):
+    """
+    Stable dedup key for an imported row.
+
+    `occurrence` numbers identical rows within one file so two genuine
+    same-day, same-amount purchases are both kept while re-importing the
+    file inserts nothing. The currency is only part of the key when the
+    row named one, so rows imported before currencies existed keep their key.
+    """
+    parts = [
+        transaction['date'].strftime('%Y-%m-%d'),
+        transaction['type'],
+        f"{transaction['amount']:.2f}",
+        transaction['category'],
+        transaction['description'],
+        str(occurrence)
+    ]
+    if 'currency' in transaction:
+        parts.append(transaction['currency'])
+    raw = '|'.join(parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+# Import
+def import_transactions(rows, store, batch_size=1000, categories=CATEGORIES, on_batch=None):
+    """
+    Validate and insert `rows` into a tenant store in batches of `batch_size`.
+
+    `on_batch` (e.g. cache invalidation) is called once per batch with the
+    inserted transactions. Returns a summary dict.
+    """
+    started = time.perf_counter()
+    summary = {'rows': 0, 'inserted': 0, 'duplicates': 0, 'invalid': 0, 'errors': []}
+    seen = Counter()
+    batch = []
+
+    def flush():
+        inserted, duplicates = store.insert_transactions(batch)
+        summary['inserted'] += len(inserted)
+        summary['duplicates'] += duplicates
+        if on_batch:
+            on_batch(inserted)
+        batch.clear()
+
+    for line_number, row in enumerate(rows, start=1):
+        summary['rows'] += 1
+        try:
+            transaction = validate_row(row, categories)
+            digest = content_hash(transaction, 0)
+            transaction['import_hash'] = content_hash(transaction, seen[digest])
+            # Converted here (after hashing the amount as entered) so a row in a
+            # currency without exchange rates is reported instead of failing its batch
+            store.rates.convert_transaction(transaction)
+        except ValueError as e:
+            summary['invalid'] += 1
+            if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                summary['errors'].append(f'row {line_number}: {e}')
+            continue
+
+        seen[digest] += 1
+        transaction['created_at'] = datetime.now()
+        batch.append(transaction)
+
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    elapsed = time.perf_counter() - started
+    summary['seconds'] = round(elapsed, 3)
+    summary['rows_per_sec'] = round(summary['rows'] / elapsed) if elapsed else summary['rows']
+    return summary
+
+
+def detect_format(filename):
+    """Pick a parser from the file extension (defaults to CSV)"""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    return extension if extension in PARSERS else 'csv'
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return 1
+
+    path = argv[0]
+    batch_size = int(argv[argv.index('--batch-size') + 1]) if '--batch-size' in argv else 1000
+
+    load_dotenv()
+    dedicated = [t.strip() for t in os.getenv('DEDICATED_TENANTS', '').split(',') if t.strip()]
+    try:
+        user_id = validate_tenant(argv[argv.index('--user') + 1] if '--user' in argv
+                                  else os.getenv('DEFAULT_TENANT', 'default'))
+    except (ValueError, IndexError) as e:
+        print(f"✗ Invalid --user: {e}")
+        return 1
+
+    storage = create_storage(
+        os.getenv('STORAGE_BACKEND', 'mongo'),
+        uri=os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'),
+        database_name=os.getenv('DATABASE_NAME', 'expense_tracker_db'),
+        dedicated=dedicated,
+        path=os.getenv('SQLITE_PATH'),
+        rates=rates_from_env()
+    )
+    try:
+        # Indexes included: the unique import_hash index is what makes re-imports idempotent.
+        # Legacy documents without an owner go to the default tenant, not the importing one.
+        storage.prepare(os.getenv('DEFAULT_TENANT', 'default'))
+    except Exception as e:
+        print(f"✗ Storage unavailable: {e}")
+        storage.close()
+        return 1
+
+    try:
+        store = storage.tenant(user_id)
+        print(f"\n📥 Importing {path} for tenant '{user_id}'...")
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            rows = PARSERS[detect_format(path)](f)
+            summary = import_transactions(rows, store, batch_size)
+        # Open pages of this tenant revalidate against the new data
+        store.bump_data_version()
+
+        print(f"  ✓ Inserted:   {summary['inserted']}")
+        print(f"  ↷ Duplicates: {summary['duplicates']}")
+        print(f"  ✗ Invalid:    {summary['invalid']}")
+        for error in summary['errors']:
+            print(f"      {error}")
+        print(f"\n✓ {summary['rows']} rows in {summary['seconds']}s ({summary['rows_per_sec']} rows/sec)")
+        return 0
+    finally:
+        storage.close()
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,224 @@
+"""
+Index Bootstrap
+Creates and verifies the indexes behind the app's query shapes and reports
+any query whose plan falls back to a collection scan.
+
+Usage:
+    python indexes.py            # create, verify and explain
+    python indexes.py --explain  # only verify and explain
+"""
+
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import os
+import sys
+
+# Index specs per collection: (name, keys, options)
+# Every index leads with user_id so a request only walks its own tenant's range
+INDEX_SPECS = {
+    'transactions': [
+        # Recent transactions and unfiltered /transactions pages (keyset on date, _id)
+        ('user_id_date_id', [('user_id', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)], {}),
+        # Type filters, statistics and monthly income/expense windows
+        ('user_id_type_date_id',
+         [('user_id', ASCENDING), ('type', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)], {}),
+        # Category + type filters on /transactions
+        ('user_id_category_type_date_id',
+         [('user_id', ASCENDING), ('category', ASCENDING), ('type', ASCENDING),
+          ('date', DESCENDING), ('_id', DESCENDING)], {}),
+        # Category-only filters on /transactions
+        ('user_id_category_date_id',
+         [('user_id', ASCENDING), ('category', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)], {}),
+        # Description search: one entry per word, already in page order (see search.py)
+        ('user_id_terms_date_id',
+         [('user_id', ASCENDING), ('terms', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)], {}),
+        # Per-tenant deduplication of bulk-imported rows (only imported rows carry the hash)
+        ('user_id_import_hash', [('user_id', ASCENDING), ('import_hash', ASCENDING)],
+         {'unique': True, 'partialFilterExpression': {'import_hash': {'$exists': True}}}),
+    ],
+    'budgets': [
+        # One budget per (period, start, category); window reads and the upsert
+        ('user_id_period_start_category',
+         [('user_id', ASCENDING), ('period', ASCENDING), ('start', ASCENDING), ('category', ASCENDING)],
+         {'unique': True}),
+    ],
+    'monthly_rollups': [
+        # One document per (user_id, year, month, type, category); range reads on (year, month)
+        ('user_id_year_month_type_category',
+         [('user_id', ASCENDING), ('year', ASCENDING), ('month', ASCENDING),
+          ('type', ASCENDING), ('category', ASCENDING)],
+         {'unique': True}),
+    ],
+    'spend_counters': [
+        # One counter per (period, start, category); window reads and $inc upserts
+        ('user_id_period_start_category',
+         [('user_id', ASCENDING), ('period', ASCENDING), ('start', ASCENDING), ('category', ASCENDING)],
+         {'unique': True}),
+    ],
+    'budget_events': [
+        # Most recent threshold events first
+        ('user_id_created_at', [('user_id', ASCENDING), ('created_at', DESCENDING)], {}),
+    ],
+    'recurring_rules': [
+        # A tenant's rules in creation order
+        ('user_id_created_at', [('user_id', ASCENDING), ('created_at', ASCENDING)], {}),
+        # Due rules of every tenant for the scheduler (see recurring.py); the one
+        # index not led by user_id. Sparse: ended rules have no next_due
+        ('next_due_id', [('next_due', ASCENDING), ('_id', ASCENDING)], {'sparse': True}),
+    ],
+}
+
+# Indexes replaced by the ones above
+RETIRED_INDEXES = {
+    'transactions': ['date_id', 'type_date_id', 'category_type_date_id', 'category_date_id', 'import_hash'],
+    'budgets': ['month_year_category', 'user_id_month_year_category'],
+    'monthly_rollups': ['year_month_type_category'],
+}
+
+
+def ensure_indexes(db, names=None):
+    """
+    Create all indexes in INDEX_SPECS (no-op for ones that already exist) and
+    drop RETIRED_INDEXES. `names` maps a collection in INDEX_SPECS to the
+    physical collection to index (e.g. a tenant's dedicated collection).
+    """
+    names = names or {}
+    created = []
+    for collection_name, specs in INDEX_SPECS.items():
+        collection = db[names.get(collection_name, collection_name)]
+        for name, keys, options in specs:
+            collection.create_index(keys, name=name, **options)
+            created.append(f'{collection.name}.{name}')
+        existing = collection.index_information()
+        for name in RETIRED_INDEXES.get(collection_name, []):
+            if name in existing:
+                collection.drop_index(name)
+    return created
+
+
+def verify_indexes(db):
+    """Return the names of INDEX_SPECS entries missing or differing in the database"""
+    problems = []
+    for collection_name, specs in INDEX_SPECS.items():
+        existing = db[collection_name].index_information()
+        for name, keys, _ in specs:
+            info = existing.get(name)
+            if info is None:
+                problems.append(f'{collection_name}.{name}: missing')
+            elif [tuple(k) for k in info['key']] != [tuple(k) for k in keys]:
+                problems.append(f'{collection_name}.{name}: key mismatch {info["key"]}')
+        for name in RETIRED_INDEXES.get(collection_name, []):
+            if name in existing:
+                problems.append(f'{collection_name}.{name}: retired, drop it')
+    return problems
+
+
+def get_query_shapes(user_id='default'):
+    """Representative find() shapes issued by the routes in app.py (all tenant-scoped)"""
+    since = datetime.now() - timedelta(days=30)
+    page_sort = [('date', DESCENDING), ('_id', DESCENDING)]
+    tenant = {'user_id': user_id}
+    month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    previous_month_start = (month_start - timedelta(days=1)).replace(day=1)
+    return [
+        ('recent transactions', 'transactions', tenant, [('date', DESCENDING)]),
+        ('transactions page', 'transactions', tenant, page_sort),
+        ('transactions by period', 'transactions', {**tenant, 'date': {'$gte': since}}, page_sort),
+        ('transactions by type', 'transactions',
+         {**tenant, 'type': 'expense', 'date': {'$gte': since}}, page_sort),
+        ('transactions by category', 'transactions',
+         {**tenant, 'category': 'Food', 'date': {'$gte': since}}, page_sort),
+        ('description search', 'transactions', {**tenant, 'terms': {'$in': ['uber', 'ubereats']}}, page_sort),
+        ('transactions by category and type', 'transactions',
+         {**tenant, 'category': 'Food', 'type': 'expense', 'date': {'$gte': since}}, page_sort),
+        ('monthly window', 'transactions',
+         {**tenant, 'type': 'income', 'date': {'$gte': since, '$lt': datetime.now()}}, None),
+        ('current budgets', 'budgets',
+         {**tenant, 'period': 'month', 'start': {'$in': [month_start, previous_month_start]}}, None),
+        ('current spend counters', 'spend_counters',
+         {**tenant, 'period': 'month', 'start': {'$in': [month_start, previous_month_start]}}, None),
+        ('recent budget events', 'budget_events', tenant, [('created_at', DESCENDING)]),
+        ('rollup window', 'monthly_rollups',
+         {**tenant, 'year': {'$gte': since.year}}, None),
+        ('recurring rules', 'recurring_rules', tenant, [('created_at', ASCENDING)]),
+        ('due recurring rules', 'recurring_rules',
+         {'next_due': {'$lte': datetime.now()}}, [('next_due', ASCENDING), ('_id', ASCENDING)]),
+    ]
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    if not isinstance(plan, dict):
+        return
+    if 'stage' in plan:
+        yield plan['stage']
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from _plan_stages(child)
+
+
+def explain_queries(db):
+    """
+    Explain every query shape and report its winning plan.
+
+    Returns a list of dicts: {'query', 'stages', 'collscan'}
+    """
+    report = []
+    for label, collection_name, query, sort in get_query_shapes():
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        stages = list(_plan_stages(winning_plan))
+        report.append({
+            'query': label,
+            'stages': stages,
+            'collscan': 'COLLSCAN' in stages
+        })
+    return report
+
+
+def main(argv):
+    load_dotenv()
+    mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+    database_name = os.getenv('DATABASE_NAME', 'expense_tracker_db')
+
+    try:
+        client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=5000)
+        client.server_info()
+        db = client[database_name]
+        print("✓ Connected to MongoDB successfully!")
+    except Exception as e:
+        print(f"✗ MongoDB connection failed: {e}")
+        return 1
+
+    try:
+        if '--explain' not in argv:
+            print("\n🔧 Creating indexes...")
+            for name in ensure_indexes(db):
+                print(f"  ✓ {name}")
+
+        print("\n🔍 Verifying indexes...")
+        problems = verify_indexes(db)
+        for problem in problems:
+            print(f"  ✗ {problem}")
+        if not problems:
+            print("  ✓ All indexes present")
+
+        print("\n📈 Explaining query shapes...")
+        collscans = 0
+        for entry in explain_queries(db):
+            marker = '✗' if entry['collscan'] else '✓'
+            collscans += entry['collscan']
+            print(f"  {marker} {entry['query']}: {' <- '.join(entry['stages'])}")
+
+        return 1 if problems or collscans else 0
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -3,28 +3,33 @@ Sample Data Insertion Script
 Adds realistic sample transactions to the database for demo purposes
 """
 
-from pymongo import MongoClient
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
 import random
 
+from storage import create_storage
+from recurring import new_rule
+from money import rates_from_env
+
 # Load environment variables
 load_dotenv()
 
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 DATABASE_NAME = os.getenv('DATABASE_NAME', 'expense_tracker_db')
+DEFAULT_TENANT = os.getenv('DEFAULT_TENANT', 'default')
+DEDICATED_TENANTS = [t.strip() for t in os.getenv('DEDICATED_TENANTS', '').split(',') if t.strip()]
 
-# Connect to MongoDB
+# Connect to the configured storage backend
+storage = create_storage(os.getenv('STORAGE_BACKEND', 'mongo'), uri=MONGODB_URI, database_name=DATABASE_NAME,
+                         dedicated=DEDICATED_TENANTS, path=os.getenv('SQLITE_PATH'), rates=rates_from_env())
 try:
-    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
-    client.server_info()
-    db = client[DATABASE_NAME]
-    transactions_collection = db.transactions
-    budgets_collection = db.budgets
-    print("✓ Connected to MongoDB successfully!")
+    storage.prepare(DEFAULT_TENANT)
+    # Sample data goes to the default tenant only; other tenants are untouched
+    store = storage.tenant(DEFAULT_TENANT)
+    print(f"✓ Connected to {storage.name} storage successfully!")
 except Exception as e:
-    print(f"✗ MongoDB connection failed: {e}")
+    print(f"✗ Storage connection failed: {e}")
     exit(1)
 
 # Sample transactions data
@@ -59,57 +64,74 @@ sample_transactions = [
 # Sample budgets for current month
 current_month = datetime.now().month
 current_year = datetime.now().year
+month_start = datetime(current_year, current_month, 1)
 
 sample_budgets = [
-    {'category': 'Food', 'amount': 800.00, 'month': current_month, 'year': current_year},
-    {'category': 'Transport', 'amount': 300.00, 'month': current_month, 'year': current_year},
-    {'category': 'Entertainment', 'amount': 150.00, 'month': current_month, 'year': current_year},
-    {'category': 'Healthcare', 'amount': 400.00, 'month': current_month, 'year': current_year},
-    {'category': 'Utilities', 'amount': 350.00, 'month': current_month, 'year': current_year},
-    {'category': 'Shopping', 'amount': 500.00, 'month': current_month, 'year': current_year},
+    {'category': 'Food', 'amount': 800.00, 'period': 'month', 'start': month_start, 'rollover': False, 'month': current_month, 'year': current_year},
+    {'category': 'Transport', 'amount': 300.00, 'period': 'month', 'start': month_start, 'rollover': False, 'month': current_month, 'year': current_year},
+    {'category': 'Entertainment', 'amount': 150.00, 'period': 'month', 'start': month_start, 'rollover': False, 'month': current_month, 'year': current_year},
+    {'category': 'Healthcare', 'amount': 400.00, 'period': 'month', 'start': month_start, 'rollover': False, 'month': current_month, 'year': current_year},
+    {'category': 'Utilities', 'amount': 350.00, 'period': 'month', 'start': month_start, 'rollover': False, 'month': current_month, 'year': current_year},
+    {'category': 'Shopping', 'amount': 500.00, 'period': 'month', 'start': month_start, 'rollover': False, 'month': current_month, 'year': current_year},
+]
+
+# Sample recurring rules (from tomorrow, so they don't repeat the transactions above)
+rules_start = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+
+sample_rules = [
+    {'type': 'income', 'amount': 5000.00, 'category': 'Salary', 'description': 'Monthly salary', 'schedule': '0 0 1 * *'},
+    {'type': 'expense', 'amount': 89.99, 'category': 'Entertainment', 'description': 'Netflix and Spotify subscriptions', 'schedule': '0 0 5 * *'},
+    {'type': 'expense', 'amount': 65.00, 'category': 'Utilities', 'description': 'Internet bill', 'schedule': '0 0 9 * *'},
 ]
 
 def insert_sample_data():
-    """Insert sample transactions and budgets into the database"""
+    """Insert sample transactions, budgets and recurring rules into the database"""
     
     # Clear existing data (optional - comment out if you want to keep existing data)
     print("\n⚠ Clearing existing data...")
-    transactions_collection.delete_many({})
-    budgets_collection.delete_many({})
+    store.clear()
     
     # Insert sample transactions
     print("\n📝 Inserting sample transactions...")
-    inserted_transactions = []
+    docs = []
     
     for transaction in sample_transactions:
         transaction_date = datetime.now() - timedelta(days=transaction['days_ago'])
         
-        doc = {
+        docs.append({
             'type': transaction['type'],
             'amount': transaction['amount'],
             'category': transaction['category'],
             'description': transaction['description'],
             'date': transaction_date,
             'created_at': datetime.now()
-        }
-        
-        result = transactions_collection.insert_one(doc)
-        inserted_transactions.append(result.inserted_id)
+        })
         print(f"  ✓ Added {transaction['type']}: ${transaction['amount']} - {transaction['category']}")
     
+    # One batch for all of them (rollups and budget counters are updated with it)
+    inserted_transactions, _ = store.insert_transactions(docs)
+    
     print(f"\n✓ Successfully inserted {len(inserted_transactions)} transactions!")
     
     # Insert sample budgets
     print("\n💰 Inserting sample budgets...")
-    inserted_budgets = []
-    
     for budget in sample_budgets:
-        budget['updated_at'] = datetime.now()
-        result = budgets_collection.insert_one(budget)
-        inserted_budgets.append(result.inserted_id)
+        store.upsert_budget(budget['category'], budget['period'], budget['start'], budget['amount'],
+                            rollover=budget['rollover'])
         print(f"  ✓ Set budget for {budget['category']}: ${budget['amount']}")
     
-    print(f"\n✓ Successfully inserted {len(inserted_budgets)} budgets!")
+    print(f"\n✓ Successfully inserted {len(sample_budgets)} budgets!")
+    
+    # Insert sample recurring rules
+    print("\n🔁 Inserting sample recurring rules...")
+    for template in sample_rules:
+        store.add_rule(new_rule(template, template['schedule'], rules_start))
+        print(f"  ✓ Scheduled {template['description']}: ${template['amount']} ({template['schedule']})")
+    
+    print(f"\n✓ Successfully inserted {len(sample_rules)} recurring rules!")
+    
+    # Open dashboards revalidate against the replaced data
+    store.bump_data_version()
     
     # Calculate and display summary
     print("\n" + "="*50)
@@ -123,7 +145,8 @@ def insert_sample_data():
     print(f"Total Income:    ${total_income:,.2f}")
     print(f"Total Expenses:  ${total_expenses:,.2f}")
     print(f"Balance:         ${balance:,.2f}")
-    print(f"\nBudgets Set:     {len(inserted_budgets)} categories")
+    print(f"\nBudgets Set:     {len(sample_budgets)} categories")
+    print(f"Recurring Rules: {len(sample_rules)}")
     print("="*50)
     
     print("\n✅ Sample data insertion completed successfully!")
@@ -135,4 +158,4 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"\n❌ Error inserting sample data: {e}")
     finally:
-        client.close()
+        storage.close()
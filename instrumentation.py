@@ -0,0 +1,324 @@
+"""
+Query Instrumentation
+A pymongo CommandListener that attributes every database command to the
+Flask endpoint that issued it, for Server-Timing headers, the debug footer,
+the Prometheus /metrics endpoint and the slow-query log, and a
+ConnectionPoolListener that tracks how busy the connection pool is.
+
+Slow queries are explained on a background thread, so the request that ran
+one does not also wait for the explain round trip.
+"""
+
+from pymongo import monitoring
+from bson import json_util
+from collections import defaultdict
+import bson
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger('expense_tracker.slow_query')
+
+# Keys pymongo adds to every command that must not be sent back inside explain
+SESSION_KEYS = {'lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber', 'autocommit', 'startTransaction'}
+# Commands worth explaining when slow
+EXPLAINABLE = {'find', 'aggregate', 'count', 'distinct', 'delete', 'update'}
+# Slow queries waiting for an explain; beyond this they are logged without a plan
+MAX_PENDING_EXPLAINS = 100
+
+
+def _winning_plan_stages(explain):
+    """Collect stage names of the first winningPlan found in an explain document"""
+    stages = []
+
+    def walk_plan(plan):
+        if isinstance(plan, dict):
+            if 'stage' in plan:
+                stages.append(plan['stage'])
+            for key in ('inputStage', 'queryPlan'):
+                walk_plan(plan.get(key))
+            for child in plan.get('inputStages', []):
+                walk_plan(child)
+
+    def find(node):
+        if isinstance(node, dict):
+            if 'winningPlan' in node:
+                walk_plan(node['winningPlan'])
+                return True
+            return any(find(value) for value in node.values())
+        if isinstance(node, list):
+            return any(find(value) for value in node)
+        return False
+
+    find(explain)
+    return stages
+
+
+class RequestStats:
+    """Database activity of one request"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.commands = 0
+        self.db_ms = 0.0
+        self.bytes = 0
+
+    @property
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+class QueryListener(monitoring.CommandListener):
+    """
+    Records count, duration and reply size of every command.
+
+    Sync pymongo calls listeners on the thread that issued the command, so a
+    thread-local holds the current request's stats.
+    """
+
+    def __init__(self, slow_query_ms=100, explain_slow=True):
+        self.slow_query_ms = slow_query_ms
+        self.explain_slow = explain_slow
+        self.client = None      # callable returning the MongoClient used to explain slow queries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._explains = None   # queue drained by this process's explain thread
+        self._explains_pid = None
+        # (endpoint, command) -> [count, seconds, bytes]
+        self.command_totals = defaultdict(lambda: [0, 0.0, 0])
+        # endpoint -> [requests, seconds]
+        self.request_totals = defaultdict(lambda: [0, 0.0])
+
+    # Request lifecycle
+    def begin(self, endpoint):
+        self._local.stats = RequestStats(endpoint or 'unknown')
+        self._local.pending = {}
+
+    def end(self):
+        stats = getattr(self._local, 'stats', None)
+        self._local.stats = None
+        if stats is not None:
+            with self._lock:
+                totals = self.request_totals[stats.endpoint]
+                totals[0] += 1
+                totals[1] += stats.elapsed_ms / 1000
+        return stats
+
+    @property
+    def current(self):
+        return getattr(self._local, 'stats', None)
+
+    # CommandListener
+    def started(self, event):
+        if getattr(self._local, 'explaining', False):
+            return
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            pending = self._local.pending = {}
+        if event.command_name in EXPLAINABLE:
+            pending[event.request_id] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        if getattr(self._local, 'explaining', False):
+            return
+        duration_ms = event.duration_micros / 1000
+        size = len(bson.encode(event.reply)) if isinstance(event.reply, dict) else 0
+        stats = self.current
+        endpoint = stats.endpoint if stats else 'none'
+
+        if stats:
+            stats.commands += 1
+            stats.db_ms += duration_ms
+            stats.bytes += size
+        with self._lock:
+            totals = self.command_totals[(endpoint, event.command_name)]
+            totals[0] += 1
+            totals[1] += duration_ms / 1000
+            totals[2] += size
+
+        command = getattr(self._local, 'pending', {}).pop(event.request_id, None)
+        if command and duration_ms >= self.slow_query_ms:
+            self._log_slow(endpoint, event.command_name, duration_ms, *command)
+
+    def failed(self, event):
+        getattr(self._local, 'pending', {}).pop(event.request_id, None)
+
+    # Slow query log
+    def _log_slow(self, endpoint, command_name, duration_ms, database_name, command):
+        body = {key: value for key, value in command.items() if key not in SESSION_KEYS}
+        if self.explain_slow and self.client is not None:
+            try:
+                self._explain_queue().put_nowait((endpoint, command_name, duration_ms, database_name, body))
+                return
+            except queue.Full:
+                self._write_slow(endpoint, command_name, duration_ms, body, 'explain skipped (queue full)')
+                return
+        self._write_slow(endpoint, command_name, duration_ms, body, '')
+
+    def _explain_queue(self):
+        """The explain queue, with its thread started on first use in each process (threads don't survive fork)"""
+        if self._explains_pid != os.getpid():
+            with self._lock:
+                if self._explains_pid != os.getpid():
+                    self._explains = queue.Queue(maxsize=MAX_PENDING_EXPLAINS)
+                    threading.Thread(target=self._explain_slow_queries, args=(self._explains,),
+                                     name='slow-query-explain', daemon=True).start()
+                    self._explains_pid = os.getpid()
+        return self._explains
+
+    def _explain_slow_queries(self, explains):
+        # The explain commands themselves are not counted or logged
+        self._local.explaining = True
+        while True:
+            endpoint, command_name, duration_ms, database_name, body = explains.get()
+            try:
+                explain = self.client()[database_name].command('explain', body, verbosity='queryPlanner')
+                summary = ' <- '.join(_winning_plan_stages(explain)) or 'no plan'
+            except Exception as e:
+                summary = f'explain failed: {e}'
+            self._write_slow(endpoint, command_name, duration_ms, body, summary)
+
+    def _write_slow(self, endpoint, command_name, duration_ms, body, summary):
+        logger.warning('Slow %s on %s (%.1fms) from %s: %s | plan: %s',
+                       command_name, body.get(command_name), duration_ms, endpoint,
+                       json_util.dumps(body.get('pipeline', body.get('filter', {}))), summary)
+
+    # Reporting
+    def server_timing(self, stats, db=True):
+        """Server-Timing header value for one request (`db=False`: its queries were not observed)"""
+        app = f'app;dur={stats.elapsed_ms:.1f}'
+        if not db:
+            return app
+        return f'db;dur={stats.db_ms:.1f};desc="{stats.commands} queries, {stats.bytes} bytes", {app}'
+
+    def prometheus(self, extra=None):
+        """Aggregate counters in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            command_totals = dict(self.command_totals)
+            request_totals = dict(self.request_totals)
+
+        metrics = [
+            ('expense_tracker_db_commands_total', 'counter', 'Database commands issued', 0),
+            ('expense_tracker_db_command_seconds_total', 'counter', 'Time spent in database commands', 1),
+            ('expense_tracker_db_response_bytes_total', 'counter', 'Bytes returned by database commands', 2),
+        ]
+        for name, kind, help_text, index in metrics:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (endpoint, command), totals in sorted(command_totals.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}",command="{command}"}} {totals[index]}')
+
+        metrics = [
+            ('expense_tracker_http_requests_total', 'counter', 'Requests handled', 0),
+            ('expense_tracker_http_request_seconds_total', 'counter', 'Time spent handling requests', 1),
+        ]
+        for name, kind, help_text, index in metrics:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for endpoint, totals in sorted(request_totals.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {totals[index]}')
+
+        for name, (kind, help_text, value) in (extra or {}).items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """
+    Connection pool utilization of this process: open and checked-out
+    connections, checkouts, time spent waiting for one and failed checkouts.
+
+    A checkout starts and completes on the thread that needs the connection,
+    so a thread-local holds the start time.
+    """
+
+    def __init__(self, max_pool_size=100):
+        self.max_pool_size = max_pool_size
+        self.open = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.failures = 0
+        self.cleared = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # ConnectionPoolListener
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = time.perf_counter() - getattr(self._local, 'started', time.perf_counter())
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_seconds += waited
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.cleared += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    # Reporting
+    def stats(self):
+        with self._lock:
+            return {
+                'open': self.open,
+                'in_use': self.in_use,
+                'max_pool_size': self.max_pool_size,
+                'utilization': self.in_use / self.max_pool_size if self.max_pool_size else 0,
+                'checkouts': self.checkouts,
+                'wait_seconds': self.wait_seconds,
+                'failures': self.failures,
+                'cleared': self.cleared,
+            }
+
+    def metrics(self):
+        """Extra metrics for QueryListener.prometheus"""
+        stats = self.stats()
+        return {
+            'expense_tracker_db_pool_connections': ('gauge', 'Open pooled connections', stats['open']),
+            'expense_tracker_db_pool_in_use': ('gauge', 'Connections checked out of the pool', stats['in_use']),
+            'expense_tracker_db_pool_max_size': ('gauge', 'Pool size limit per server', stats['max_pool_size']),
+            'expense_tracker_db_pool_checkouts_total': ('counter', 'Connections checked out', stats['checkouts']),
+            'expense_tracker_db_pool_wait_seconds_total': ('counter', 'Time spent waiting for a connection',
+                                                           stats['wait_seconds']),
+            'expense_tracker_db_pool_checkout_failures_total': ('counter', 'Failed connection checkouts',
+                                                                stats['failures']),
+            'expense_tracker_db_pool_cleared_total': ('counter', 'Pools cleared after a connection error',
+                                                      stats['cleared']),
+        }
@@ -0,0 +1,336 @@
+"""
+Live Dashboard Updates
+Server-sent event feed (/events) that keeps open dashboards current without
+reloading them. Writes publish small deltas to a per-tenant channel:
+
+    transaction  one transaction added (sign 1) or deleted (sign -1)
+    budget       a budget threshold event (see budget_engine.crossings)
+    resync       too much changed at once; fetch /api/dashboard instead
+
+main.js folds each delta into the totals, category chart, recent list and
+budget alerts it was rendered with, so N viewers no longer mean N dashboard
+aggregations after every write.
+
+Deltas come from one of two sources:
+
+- ChangeStreamFeed watches transactions and budget_events (replica set or
+  Atlas). It sees writes from every worker, the importer and scripts. Deletes
+  need pre-images (MongoDB 6.0+), which are enabled on start where possible.
+- Without change streams (a standalone mongod, or the SQLite backend) the
+  write routes publish to the in-process Broker, so viewers see writes
+  handled by their own process.
+
+Every open stream holds a server thread (or greenlet) for as long as the
+dashboard is open, so the app must be served by threaded or gevent workers,
+never gunicorn's default sync ones. Each process also caps its open streams
+at `max_streams`: past that, /events answers 503 and the dashboard polls
+/api/dashboard every POLL_SECONDS instead.
+"""
+
+from pymongo.errors import PyMongoError
+from collections import defaultdict
+import itertools
+import json
+import queue
+import threading
+import time
+
+from budget_engine import next_start, status_for, WARNING_PCT
+from tenancy import TENANT_KEY
+from money import to_decimal, json_default
+
+MODES = ('auto', 'changestream', 'local', 'off')
+
+# How often a dashboard turned away by the stream cap polls (main.js uses the same)
+POLL_SECONDS = 30
+
+WATCHED = r'^(transactions|budget_events)(__|$)'
+WATCH_PIPELINE = [{'$match': {
+    'operationType': {'$in': ['insert', 'delete']},
+    'ns.coll': {'$regex': WATCHED}
+}}]
+
+
+# Deltas
+def _day(value):
+    return value.strftime('%Y-%m-%d')
+
+
+def transaction_delta(transaction, sign=1):
+    """Client-side delta for one added (sign=1) or deleted (sign=-1) transaction"""
+    return {
+        'id': str(transaction.get('_id', '')),
+        'sign': sign,
+        'type': transaction['type'],
+        'amount': transaction['amount'],
+        'category': transaction['category'],
+        'description': transaction.get('description', ''),
+        'date': _day(transaction['date'])
+    }
+
+
+def budget_delta(item):
+    """Client-side form of an evaluated budget or a threshold event"""
+    spent, budget = to_decimal(item['spent']), to_decimal(item['budget'])
+    percentage = item.get('percentage', float(spent / budget * 100) if budget > 0 else 100)
+    return {
+        'category': item['category'],
+        'period': item['period'],
+        'label': item['label'],
+        'start': _day(item['start']),
+        'end': _day(next_start(item['period'], item['start'])),
+        'budget': budget,
+        'spent': spent,
+        'percentage': percentage,
+        'status': status_for(percentage),
+        'threshold': item.get('threshold')
+    }
+
+
+def dashboard_snapshot(stats, budget_status, now):
+    """Everything the live dashboard renders, as one JSON-friendly dict"""
+    return {
+        'month': now.strftime('%Y-%m'),
+        'warning_pct': WARNING_PCT,
+        'income': stats['periods']['all']['income'],
+        'expenses': stats['periods']['all']['expenses'],
+        'month_income': stats['periods']['month']['income'],
+        'month_expenses': stats['periods']['month']['expenses'],
+        'categories': stats['breakdown'],
+        'recent': [transaction_delta(t) for t in stats['recent']],
+        'budgets': [budget_delta(item) for item in budget_status if item['status'] != 'safe']
+    }
+
+
+def format_event(event, data, event_id=None):
+    """One text/event-stream message"""
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, default=json_default)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+# Pub/sub
+class Subscription:
+    """One open stream's bounded queue; a reader that falls behind gets a single resync"""
+
+    def __init__(self, max_pending=100):
+        self._queue = queue.Queue(maxsize=max_pending)
+
+    def put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            with self._queue.mutex:
+                self._queue.queue.clear()
+            self._queue.put_nowait((None, 'resync', {}))
+
+    def get(self, timeout):
+        return self._queue.get(timeout=timeout)
+
+
+class Broker:
+    """In-process pub/sub: channel (tenant id) -> open subscriptions"""
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._channels = defaultdict(set)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, channel, limit=None):
+        """A new subscription, or None when `limit` subscriptions are already open"""
+        subscription = Subscription(self.max_pending)
+        with self._lock:
+            if limit and sum(len(subscribers) for subscribers in self._channels.values()) >= limit:
+                return None
+            self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, channel, subscription):
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        if subscribers:
+            message = (next(self._ids), event, data)
+            for subscription in subscribers:
+                subscription.put(message)
+        return len(subscribers)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._channels.values())
+
+
+# Change streams
+class ChangeStreamFeed(threading.Thread):
+    """
+    Publishes transaction inserts/deletes and budget events from a database
+    change stream. Changes arriving together are published per tenant; a
+    tenant with more than `max_deltas` of them (e.g. an import) gets one
+    resync instead.
+    """
+
+    FLUSH_SECONDS = 0.25
+
+    def __init__(self, db, broker, max_deltas=50):
+        super().__init__(name='live-change-stream', daemon=True)
+        self.db = db
+        self.broker = broker
+        self.max_deltas = max_deltas
+        self.unrouted = 0
+        # Opening the stream raises on a standalone mongod, before the thread starts
+        self.stream = self._open()
+        self._enable_pre_images()
+
+    def _enable_pre_images(self):
+        """Let delete events carry the deleted document (MongoDB 6.0+)"""
+        for name in self.db.list_collection_names(filter={'name': {'$regex': r'^transactions(__|$)'}}):
+            try:
+                self.db.command({'collMod': name, 'changeStreamPreAndPostImages': {'enabled': True}})
+            except PyMongoError:
+                pass
+
+    def _open(self, resume_after=None):
+        return self.db.watch(WATCH_PIPELINE, full_document_before_change='whenAvailable',
+                             max_await_time_ms=int(self.FLUSH_SECONDS * 1000), resume_after=resume_after)
+
+    def run(self):
+        while True:
+            try:
+                self._consume()
+            except PyMongoError:
+                time.sleep(1)
+                try:
+                    self.stream = self._open(self.stream.resume_token)
+                except PyMongoError:
+                    continue
+
+    def _consume(self):
+        pending = defaultdict(list)
+        flushed_at = time.monotonic()
+        while self.stream.alive:
+            change = self.stream.try_next()
+            if change is not None:
+                routed = self._route(change)
+                if routed:
+                    pending[routed[0]].append(routed[1:])
+            if pending and (change is None or time.monotonic() - flushed_at >= self.FLUSH_SECONDS):
+                self._flush(pending)
+                pending = defaultdict(list)
+                flushed_at = time.monotonic()
+
+    def _route(self, change):
+        """(tenant, event, data) for one change, or None"""
+        document = change.get('fullDocument') or change.get('fullDocumentBeforeChange')
+        collection = change['ns']['coll']
+        if document is None:
+            self.unrouted += 1
+            return None
+        user_id = document.get(TENANT_KEY) or collection.partition('__')[2]
+        if collection.startswith('budget_events'):
+            return user_id, 'budget', budget_delta(document)
+        sign = 1 if change['operationType'] == 'insert' else -1
+        return user_id, 'transaction', transaction_delta(document, sign)
+
+    def _flush(self, pending):
+        for user_id, messages in pending.items():
+            transactions = [m for m in messages if m[0] == 'transaction']
+            if len(transactions) > self.max_deltas:
+                self.broker.publish(user_id, 'resync', {})
+                messages = [m for m in messages if m[0] != 'transaction']
+            for event, data in messages:
+                self.broker.publish(user_id, event, data)
+
+
+class LiveUpdates:
+    """
+    Delta source for /events. The change stream is opened on the first
+    subscription in each process (so forked workers open their own); until
+    then, and when it is unavailable, the write routes publish in-process.
+    """
+
+    def __init__(self, mode='auto', heartbeat=15, max_pending=100, max_deltas=50, max_streams=32):
+        if mode not in MODES:
+            raise ValueError(f'unknown live update mode {mode!r}')
+        self.mode = mode
+        self.heartbeat = heartbeat
+        self.max_deltas = max_deltas
+        self.max_streams = max_streams
+        self.broker = Broker(max_pending)
+        self.feed = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    @property
+    def source(self):
+        return 'changestream' if self.feed else 'local'
+
+    def check(self, backend):
+        """Reject a mode the storage backend (its name) cannot serve, before anything is served"""
+        if self.mode == 'changestream' and backend != 'mongo':
+            raise ValueError(f'live update mode changestream needs the mongo storage backend, not {backend!r}')
+
+    def start(self, db):
+        """Open the change stream of `db` (None: the backend has none, publish in-process)"""
+        with self._lock:
+            if self._started or self.mode not in ('auto', 'changestream') or db is None:
+                return
+            self._started = True
+            try:
+                self.feed = ChangeStreamFeed(db, self.broker, self.max_deltas)
+            except PyMongoError as e:
+                if self.mode == 'changestream':
+                    raise
+                print(f"✓ Live updates: change streams unavailable ({e}), publishing in-process")
+                return
+            self.feed.start()
+            print("✓ Live updates: following the change stream")
+
+    # Publishing from the write routes (skipped while the change stream does it)
+    def _publish(self, user_id, event, data):
+        if self.enabled and self.feed is None:
+            self.broker.publish(user_id, event, data)
+
+    def transaction(self, user_id, transaction, sign=1):
+        self._publish(user_id, 'transaction', transaction_delta(transaction, sign))
+
+    def budget_events(self, user_id, events):
+        for event in events:
+            self._publish(user_id, 'budget', budget_delta(event))
+
+    def resync(self, user_id):
+        self._publish(user_id, 'resync', {})
+
+    # Streaming
+    def subscribe(self, user_id):
+        """A viewer's subscription, or None when this process already has `max_streams` open"""
+        return self.broker.subscribe(user_id, self.max_streams)
+
+    def unsubscribe(self, user_id, subscription):
+        self.broker.unsubscribe(user_id, subscription)
+
+    def stream(self, user_id, subscription):
+        """text/event-stream generator for one viewer; ends when the client disconnects"""
+        try:
+            yield f'retry: {self.heartbeat * 1000}\n\n'
+            while True:
+                try:
+                    event_id, event, data = subscription.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_event(event, data, event_id)
+        finally:
+            self.broker.unsubscribe(user_id, subscription)
@@ -0,0 +1,307 @@
+"""
+Money
+Decimal amounts, currencies and a local table of per-day exchange rates.
+
+Amounts are Decimal in Python and Decimal128 in MongoDB, so sums are exact
+instead of drifting like floats. Every transaction has a `currency` and
+`original_amount` (what was entered) and an `amount` in the reporting
+currency, converted at the rate for the transaction's date when it is
+written. Storage does that conversion, so every $sum, rollup, budget counter,
+search range and chart works on reporting-currency `amount` and never looks
+up a rate at read time.
+
+Rates come from a CSV file (no network), either in long form
+
+    date,currency,rate
+    2024-01-02,USD,1.0956
+
+or in the wide form of the ECB reference rates download
+
+    Date,USD,JPY,GBP,...
+    2024-01-02,1.0956,155.68,0.86518,...
+
+quoted as units of each currency per one unit of the base currency (EUR for
+the ECB file); the base currency itself is always 1. A day without a quote
+(weekends, holidays) uses the latest earlier one. Conversion factors are
+memoized per (currency, day), so converting millions of rows costs one
+lookup per distinct currency and day.
+
+Usage:
+    python money.py --reconvert  # recompute amounts after editing the rates file
+"""
+
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from bisect import bisect_right
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+import csv
+import os
+import sys
+
+from bson.decimal128 import Decimal128
+
+# code -> (symbol, decimal places)
+CURRENCIES = {
+    'USD': ('$', 2),
+    'EUR': ('€', 2),
+    'GBP': ('£', 2),
+    'JPY': ('¥', 0),
+    'CHF': ('CHF ', 2),
+    'CAD': ('CA$', 2),
+    'AUD': ('A$', 2),
+    'CNY': ('CN¥', 2),
+    'INR': ('₹', 2),
+    'SEK': ('SEK ', 2),
+}
+
+AMOUNT_FIELDS = ('amount', 'original_amount')
+
+# Amounts are written to MongoDB as Decimal128. mongomock cannot compare,
+# sort or $inc Decimal128 values, so the benchmark turns this off for it.
+DECIMAL128 = True
+
+
+def currency_format(currency):
+    """(symbol, decimal places) for a currency code"""
+    return CURRENCIES.get(currency, (f'{currency} ', 2))
+
+
+def to_decimal(value):
+    """Decimal from whatever a backend returned: Decimal128, float, int or Decimal"""
+    if value is None or isinstance(value, Decimal):
+        return value
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    if isinstance(value, float):
+        # repr is the shortest string that round-trips, so 0.1 stays 0.1
+        return Decimal(repr(value))
+    return Decimal(value)
+
+
+def to_bson(value):
+    """The MongoDB form of an amount"""
+    value = to_decimal(value)
+    return Decimal128(value) if DECIMAL128 else float(value)
+
+
+def encode_amounts(document, fields=AMOUNT_FIELDS):
+    """Store the amount fields of `document` in their MongoDB form, in place"""
+    for field in fields:
+        if document.get(field) is not None:
+            document[field] = to_bson(document[field])
+    return document
+
+
+def quantize(amount, currency):
+    """Round to the currency's smallest unit, half to even"""
+    places = currency_format(currency)[1]
+    return to_decimal(amount).quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_EVEN)
+
+
+def parse_amount(text, currency='USD'):
+    """Decimal amount from user input like '1,234.50' or '$12'; ValueError if it isn't one"""
+    text = str(text).strip().replace(',', '').replace('$', '')
+    text = text.removeprefix(currency_format(currency)[0].strip()).strip()
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f'invalid amount: {text!r}') from None
+    if not amount.is_finite():
+        raise ValueError(f'invalid amount: {text!r}')
+    return quantize(amount, currency)
+
+
+def format_money(value, currency='USD'):
+    """'$1,234.50', '¥1,235', ..."""
+    symbol, places = currency_format(currency)
+    return f"{symbol}{to_decimal(value or 0):,.{places}f}"
+
+
+def json_default(value, fallback=str):
+    """json.dumps `default` that writes amounts as numbers"""
+    if isinstance(value, (Decimal, Decimal128)):
+        return float(to_decimal(value))
+    return fallback(value)
+
+
+class ExchangeRates:
+    """
+    Per-day exchange rates and conversion into one reporting currency.
+
+    `rates` maps a currency code to (day, rate) pairs, in units of that
+    currency per one unit of `base` (the reporting currency by default).
+    """
+
+    def __init__(self, reporting='USD', rates=None, base=None):
+        self.reporting = reporting
+        self.base = base or reporting
+        self._days = {}
+        self._rates = {}
+        for currency, series in (rates or {}).items():
+            series = sorted(series)
+            self._days[currency] = [day for day, _ in series]
+            self._rates[currency] = [to_decimal(rate) for _, rate in series]
+        self._factors = {}
+        if self._days and reporting != self.base and reporting not in self._days:
+            raise ValueError(f'no exchange rates for the reporting currency {reporting}')
+
+    @classmethod
+    def load(cls, path, reporting='USD', base='EUR'):
+        """Rates from a long or wide CSV file; without a file only `reporting` is known"""
+        if not path:
+            return cls(reporting)
+
+        rates = {}
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            fields = {field.strip().lower(): field for field in reader.fieldnames or []}
+            long_form = {'date', 'currency', 'rate'} <= fields.keys()
+            for row in reader:
+                day = datetime.strptime(row[fields['date']].strip(), '%Y-%m-%d').date()
+                if long_form:
+                    quotes = [(row[fields['currency']], row[fields['rate']])]
+                else:
+                    quotes = [(field, row[field]) for field in reader.fieldnames if field != fields['date']]
+                for currency, rate in quotes:
+                    currency, rate = (currency or '').strip().upper(), (rate or '').strip()
+                    # The ECB file has N/A for currencies not quoted that day
+                    if not currency or not rate or rate.upper() == 'N/A':
+                        continue
+                    rates.setdefault(currency, []).append((day, Decimal(rate)))
+        return cls(reporting, rates, base)
+
+    @property
+    def currencies(self):
+        """The reporting currency first, then every currency it can convert from"""
+        if not self._days:
+            return [self.reporting]
+        return [self.reporting] + sorted(({self.base} | self._days.keys()) - {self.reporting})
+
+    def rate(self, currency, day):
+        """Units of `currency` per base unit on `day` (or the latest day before it)"""
+        if currency == self.base:
+            return Decimal(1)
+        days = self._days.get(currency)
+        if not days:
+            raise ValueError(f'no exchange rates for {currency}')
+        index = bisect_right(days, day) - 1
+        if index < 0:
+            raise ValueError(f'no {currency} exchange rate on or before {day:%Y-%m-%d}')
+        return self._rates[currency][index]
+
+    def factor(self, currency, day):
+        """Reporting-currency units per unit of `currency` on `day`, memoized"""
+        key = (currency, day)
+        factor = self._factors.get(key)
+        if factor is None:
+            factor = self._factors[key] = self.rate(self.reporting, day) / self.rate(currency, day)
+        return factor
+
+    def convert(self, amount, currency, when):
+        """`amount` of `currency` in the reporting currency at the rate for `when`"""
+        if currency == self.reporting:
+            return quantize(amount, currency)
+        day = when.date() if isinstance(when, datetime) else when
+        return quantize(to_decimal(amount) * self.factor(currency, day), self.reporting)
+
+    def convert_transaction(self, transaction):
+        """
+        Set `currency`, `original_amount` and the reporting-currency `amount`
+        of a transaction about to be written, in place.
+
+        `amount` is taken as entered, in `currency` (the reporting currency
+        when absent). Transactions that already have an `original_amount`
+        were converted before and are left alone.
+        """
+        if 'original_amount' in transaction:
+            return transaction
+        currency = transaction.setdefault('currency', self.reporting)
+        original = quantize(transaction['amount'], currency)
+        transaction['original_amount'] = original
+        transaction['amount'] = self.convert(original, currency, transaction['date'])
+        return transaction
+
+
+# Maintenance
+def _bulk_updates(collection, updates, batch_size):
+    """bulk_write UpdateOnes in batches of `batch_size`; returns the count"""
+    ops, count = [], 0
+    for op in updates:
+        ops.append(op)
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            count += len(ops)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        count += len(ops)
+    return count
+
+
+def backfill_currency(collection, currency, batch_size=1000):
+    """
+    Give transactions written before currencies existed `currency` (the
+    reporting one), an `original_amount` and Decimal128 amounts; returns the count
+    """
+    def updates():
+        for transaction in collection.find({'currency': {'$exists': False}}, {'amount': 1}).batch_size(batch_size):
+            amount = to_bson(quantize(transaction['amount'], currency))
+            yield UpdateOne({'_id': transaction['_id']},
+                            {'$set': {'currency': currency, 'amount': amount, 'original_amount': amount}})
+    return _bulk_updates(collection, updates(), batch_size)
+
+
+def reconvert_amounts(collection, rates, batch_size=1000):
+    """Recompute `amount` from `original_amount` at `rates`; returns the count of amounts changed"""
+    def updates():
+        fields = {'date': 1, 'currency': 1, 'amount': 1, 'original_amount': 1}
+        for transaction in collection.find({'original_amount': {'$exists': True}}, fields).batch_size(batch_size):
+            amount = rates.convert(transaction['original_amount'], transaction['currency'], transaction['date'])
+            if amount != to_decimal(transaction['amount']):
+                yield UpdateOne({'_id': transaction['_id']}, {'$set': {'amount': to_bson(amount)}})
+    return _bulk_updates(collection, updates(), batch_size)
+
+
+def rates_from_env():
+    """ExchangeRates configured by REPORTING_CURRENCY, EXCHANGE_RATES_FILE and EXCHANGE_RATES_BASE"""
+    return ExchangeRates.load(
+        os.getenv('EXCHANGE_RATES_FILE'),
+        reporting=os.getenv('REPORTING_CURRENCY', 'USD').upper(),
+        base=os.getenv('EXCHANGE_RATES_BASE', 'EUR').upper()
+    )
+
+
+def main(argv):
+    load_dotenv()
+    if '--reconvert' not in argv:
+        print(__doc__)
+        return 1
+
+    from storage import create_storage
+
+    rates = rates_from_env()
+    storage = create_storage(
+        os.getenv('STORAGE_BACKEND', 'mongo'),
+        uri=os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'),
+        database_name=os.getenv('DATABASE_NAME', 'expense_tracker_db'),
+        dedicated=[t.strip() for t in os.getenv('DEDICATED_TENANTS', '').split(',') if t.strip()],
+        path=os.getenv('SQLITE_PATH'),
+        rates=rates
+    )
+    try:
+        storage.prepare(os.getenv('DEFAULT_TENANT', 'default'))
+        print(f"\n💱 Converting every transaction to {rates.reporting}...")
+        count = storage.reconvert()
+        print(f"✓ Reconverted {count} transactions, rebuilt rollups and budget counters "
+              "and bumped every tenant's data version")
+        return 0
+    except Exception as e:
+        print(f"✗ Reconversion failed: {e}")
+        return 1
+    finally:
+        storage.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,76 @@
+"""
+Keyset Pagination
+Pages through transactions on (date, _id) instead of skip/limit so every page
+costs the same index range scan no matter how deep the user goes.
+"""
+
+from pymongo import DESCENDING
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
+
+CURSOR_DATE_FORMAT = '%Y%m%d%H%M%S%f'
+KEYSET_SORT = [('date', DESCENDING), ('_id', DESCENDING)]
+
+
+def encode_cursor(transaction):
+    """Build the opaque page token for the last row of a page"""
+    return f"{transaction['date'].strftime(CURSOR_DATE_FORMAT)}_{transaction['_id']}"
+
+
+def decode_cursor(token):
+    """Parse a page token back into (date, ObjectId); None if invalid"""
+    try:
+        date_part, id_part = token.split('_', 1)
+        return datetime.strptime(date_part, CURSOR_DATE_FORMAT), ObjectId(id_part)
+    except (ValueError, InvalidId, AttributeError):
+        return None
+
+
+def keyset_query(query, token):
+    """Restrict `query` to rows strictly after the cursor in KEYSET_SORT order"""
+    position = decode_cursor(token) if token else None
+    if position is None:
+        return query
+
+    date, object_id = position
+    after = {'$or': [
+        {'date': {'$lt': date}},
+        {'date': date, '_id': {'$lt': object_id}}
+    ]}
+    return {'$and': [query, after]} if query else after
+
+
+class KeysetPage:
+    """
+    Lazily iterates one page of a cursor.
+
+    Iterating yields at most `page_size` rows; once exhausted, `has_more` and
+    `next_cursor` describe the following page. Works the same whether the
+    template is rendered in one go or streamed.
+    """
+
+    def __init__(self, store, query, page_size, token=None, projection=None):
+        self.page_size = page_size
+        self.cursor_token = token
+        self.has_more = False
+        self.next_cursor = None
+        self.count = 0
+        self._cursor = store.find_transactions(keyset_query(query, token), KEYSET_SORT,
+                                               limit=page_size + 1, projection=projection)
+
+    def __iter__(self):
+        last = None
+        for transaction in self._cursor:
+            if self.count == self.page_size:
+                self.has_more = True
+                break
+            self.count += 1
+            last = transaction
+            yield transaction
+
+        if self.has_more and last is not None:
+            self.next_cursor = encode_cursor(last)
+        close = getattr(self._cursor, 'close', None)
+        if close:
+            close()
@@ -0,0 +1,384 @@
+"""
+Recurring Transactions
+Rules that add a transaction on a cron-like schedule (salary on the 1st,
+rent, subscriptions, utility bills), materialized by a background scheduler.
+
+A rule is a template transaction (type, amount, currency, category,
+description), a
+schedule, a start, an optional `until`, and `next_due`: its first occurrence
+not materialized yet (absent once the rule has ended). The scheduler only
+reads rules whose next_due has passed, in next_due order from an index, so a
+pass costs the same whether there are ten rules or a million.
+
+Each pass materializes every occurrence up to now, catching up on the ones
+missed while the app was down, inserts them with bulk insert_many batches
+and then moves next_due past them. A materialized transaction carries
+import_hash `recurring:<rule id>:<occurrence>`, and the per-tenant unique
+index on it makes materialization idempotent: a pass interrupted between
+the insert and the next_due update is redone without duplicates.
+
+Schedules have the five cron fields, minute hour day-of-month month
+day-of-week (0 or 7 is Sunday; names like jan or mon work), or one of
+@daily, @weekly, @monthly, @yearly.
+
+Usage:
+    python recurring.py            # materialize every due occurrence once
+"""
+
+from datetime import datetime, date, timedelta
+from collections import defaultdict
+from functools import lru_cache
+from dotenv import load_dotenv
+import os
+import socket
+import sys
+import threading
+import time
+
+from money import to_decimal, rates_from_env
+
+SHORTCUTS = {
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7))
+NAMES = {
+    'month': {name: i for i, name in enumerate(
+        ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], start=1)},
+    'weekday': {name: i for i, name in enumerate(['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])},
+}
+# Longest gap between two occurrences: Feb 29 skips a leap year every century
+MAX_GAP_DAYS = 366 * 9
+
+TEMPLATE_FIELDS = ('type', 'amount', 'currency', 'category', 'description')
+MAX_CATCH_UP = 1000     # occurrences of one rule per pass (a daily rule down for years catches up over passes)
+LEASE_NAME = 'recurring'
+
+
+# Schedules
+def parse_field(text, name, low, high):
+    """Sorted values of one cron field ('*', 'a-b', 'a,b', '*/n', 'a-b/n', names)"""
+    names = NAMES.get(name, {})
+
+    def value(token):
+        token = token.strip().lower()
+        return names[token] if token in names else int(token)
+
+    values = set()
+    for part in text.split(','):
+        body, slash, step = part.partition('/')
+        step = int(step) if slash else 1
+        if body == '*':
+            first, last = low, high
+        elif '-' in body:
+            first, last = (value(token) for token in body.split('-', 1))
+        else:
+            first = value(body)
+            last = high if slash else first
+        if step < 1 or not low <= first <= last <= high:
+            raise ValueError(f'invalid {name} field {text!r}')
+        values.update(range(first, last + 1, step))
+    return sorted(values)
+
+
+class Schedule:
+    """A parsed cron expression"""
+
+    def __init__(self, expression):
+        self.expression = ' '.join(expression.split())
+        fields = SHORTCUTS.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f'schedule {expression!r} needs 5 fields: minute hour day month weekday')
+        try:
+            minutes, hours, days, months, weekdays = (
+                parse_field(text, name, low, high) for text, (name, low, high) in zip(fields, FIELDS))
+        except ValueError as e:
+            raise ValueError(f'invalid schedule {expression!r}: {e}') from None
+        self.minutes, self.hours = minutes, hours
+        self.days, self.months = set(days), set(months)
+        self.weekdays = {day % 7 for day in weekdays}
+        # As in cron, a day matches either restricted field when both are restricted
+        self.either_day = not fields[2].startswith('*') and not fields[4].startswith('*')
+        self.next_after(datetime(2000, 1, 1))   # rejects schedules that never fire (Feb 30)
+
+    def _day_matches(self, day):
+        in_month = day.day in self.days
+        in_week = (day.weekday() + 1) % 7 in self.weekdays
+        return (in_month or in_week) if self.either_day else (in_month and in_week)
+
+    def next_after(self, moment):
+        """First occurrence strictly after `moment`"""
+        day = moment.date()
+        last = day + timedelta(days=MAX_GAP_DAYS)
+        while day <= last:
+            if day.month not in self.months:
+                day = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+                continue
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime(day.year, day.month, day.day, hour, minute)
+                        if candidate > moment:
+                            return candidate
+            day += timedelta(days=1)
+        raise ValueError(f'schedule {self.expression!r} never fires')
+
+    def first_from(self, moment):
+        """First occurrence at or after `moment`"""
+        return self.next_after(moment - timedelta(microseconds=1))
+
+
+@lru_cache(maxsize=1024)
+def schedule_for(expression):
+    """Parsed schedule, shared by every rule with the same expression"""
+    return Schedule(expression)
+
+
+# Rules
+def new_rule(template, schedule, start, until=None, now=None, rates=None):
+    """
+    Rule document for `template` (type, amount, currency, category, description).
+    Raises ValueError for an invalid schedule, an `until` before `start`, or
+    (given `rates`) a currency without an exchange rate on the start date.
+    """
+    parsed = schedule_for(' '.join(schedule.split()))
+    if until is not None and until < start:
+        raise ValueError('the end date is before the start date')
+    if rates is not None:
+        rates.convert(template['amount'], template.get('currency', rates.reporting), start)
+    rule = {field: template[field] for field in TEMPLATE_FIELDS if field in template}
+    rule.update({
+        'schedule': parsed.expression,
+        'start': start,
+        'until': until,
+        'created_at': now or datetime.now(),
+    })
+    first = parsed.first_from(start)
+    if until is None or first <= until:
+        rule['next_due'] = first
+    return rule
+
+
+def due_occurrences(rule, now, limit=MAX_CATCH_UP):
+    """
+    (occurrences of `rule` from its next_due up to `now`, at most `limit`,
+    the next_due after them or None when the rule has ended)
+    """
+    schedule = schedule_for(rule['schedule'])
+    until = rule.get('until')
+    occurrences, when = [], rule.get('next_due')
+    while when is not None and when <= now and len(occurrences) < limit:
+        if until is not None and when > until:
+            return occurrences, None
+        occurrences.append(when)
+        when = schedule.next_after(when)
+    if when is not None and until is not None and when > until:
+        when = None
+    return occurrences, when
+
+
+def occurrence_key(rule_id, when):
+    """import_hash of one materialized occurrence"""
+    return f'recurring:{rule_id}:{when:%Y%m%d%H%M}'
+
+
+def occurrence(rule, when, now=None):
+    """The transaction `rule` adds at `when`"""
+    # Storage converts `amount` from the rule's currency at the rate for `when`
+    transaction = {field: rule[field] for field in TEMPLATE_FIELDS if field in rule}
+    transaction.update({
+        'user_id': rule['user_id'],
+        'date': when,
+        'created_at': now or datetime.now(),
+        'import_hash': occurrence_key(rule['_id'], when),
+    })
+    return transaction
+
+
+# Projections
+def project(rules, start, end, limit=None):
+    """
+    Occurrences of `rules` from `start` to `end` that are not materialized
+    yet, as transactions flagged `projected` (never saved), in date order.
+    """
+    projected = []
+    for rule in rules:
+        when = rule.get('next_due')
+        if when is None:
+            continue
+        schedule = schedule_for(rule['schedule'])
+        until = rule.get('until')
+        if when < start:
+            when = schedule.first_from(start)
+        count = 0
+        while when <= end and (until is None or when <= until) and (limit is None or count < limit):
+            transaction = {field: rule[field] for field in TEMPLATE_FIELDS if field in rule}
+            transaction.update({'date': when, 'rule_id': str(rule['_id']), 'projected': True})
+            projected.append(transaction)
+            count += 1
+            when = schedule.next_after(when)
+    projected.sort(key=lambda transaction: (transaction['date'], transaction['rule_id']))
+    return projected[:limit] if limit is not None else projected
+
+
+def scheduled_totals(rules, start, end, rates=None):
+    """
+    {(year, month): {'income': total, 'expense': total}} of the occurrences
+    projected from start to end, in the reporting currency of `rates` (at the
+    latest known rate for future dates) or as entered without it
+    """
+    totals = defaultdict(lambda: {'income': 0, 'expense': 0})
+    for transaction in project(rules, start, end):
+        amount = to_decimal(transaction['amount'])
+        if rates is not None:
+            amount = rates.convert(amount, transaction.get('currency', rates.reporting), transaction['date'])
+        totals[(transaction['date'].year, transaction['date'].month)][transaction['type']] += amount
+    return dict(totals)
+
+
+# Scheduler
+class RecurringScheduler:
+    """
+    Materializes due occurrences every `interval` seconds in a background
+    thread. Every worker of a pre-fork server may run one: each pass first
+    claims a lease in the database, so only one process does the work.
+
+    on_materialized(user_id, transactions) is called for each tenant that
+    got new transactions (cache invalidation, ETags, live dashboards).
+    """
+
+    def __init__(self, storage, interval=60, batch_size=1000, insert_batch_size=1000,
+                 max_catch_up=MAX_CATCH_UP, on_materialized=None):
+        self.storage = storage
+        self.interval = interval
+        self.batch_size = batch_size
+        self.insert_batch_size = insert_batch_size
+        self.max_catch_up = max_catch_up
+        self.on_materialized = on_materialized
+        self.owner = None
+        self.passes = 0
+        self.rules = 0
+        self.materialized = 0
+        self.duplicates = 0
+        self.last_pass_seconds = None
+        self.last_error = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the thread in this process (threads do not survive a fork, so children start their own)"""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.owner = f'{socket.gethostname()}:{self._pid}'
+            self._thread = threading.Thread(target=self._run, name='recurring-scheduler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                # The lease outlives a missed tick, so a live owner keeps it between passes
+                if self.storage.claim_lease(LEASE_NAME, self.owner, self.interval * 3, datetime.now()):
+                    self.run_once()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"✗ Recurring scheduler pass failed: {e}")
+            time.sleep(self.interval)
+
+    def run_once(self, now=None):
+        """Materialize every occurrence due by `now`; returns (rules advanced, inserted, duplicates)"""
+        now = now or datetime.now()
+        started = time.perf_counter()
+        advanced = inserted_count = duplicate_count = 0
+        while True:
+            rules = self.storage.due_rules(now, self.batch_size)
+            if not rules:
+                break
+            transactions, advances, held = [], [], 0
+            for rule in rules:
+                try:
+                    occurrences, next_due = due_occurrences(rule, now, self.max_catch_up)
+                except ValueError as e:
+                    # A schedule that no longer parses stops instead of blocking every pass
+                    print(f"✗ Recurring rule {rule['_id']} stopped: {e}")
+                    occurrences, next_due = [], None
+                for when in occurrences:
+                    transaction = occurrence(rule, when, now)
+                    try:
+                        # Converted rule by rule, so a missing exchange rate holds back
+                        # only this rule, at its first occurrence without one
+                        self.storage.rates.convert_transaction(transaction)
+                    except ValueError as e:
+                        self.last_error = f"rule {rule['_id']}: {e}"
+                        print(f"✗ Recurring rule {rule['_id']} held at {when:%Y-%m-%d %H:%M}: {e}")
+                        next_due = when
+                        held += 1
+                        break
+                    transactions.append(transaction)
+                advances.append((rule['_id'], next_due))
+
+            for start in range(0, len(transactions), self.insert_batch_size):
+                inserted, duplicates = self.storage.insert_transactions(
+                    transactions[start:start + self.insert_batch_size])
+                inserted_count += len(inserted)
+                duplicate_count += duplicates
+                self._notify(inserted)
+            # Only after the inserts: a pass that dies before this line is redone
+            self.storage.advance_rules(advances, now)
+            advanced += len(advances) - held
+            # Held rules stay due: stop once a batch holds nothing else
+            if len(rules) < self.batch_size or held == len(rules):
+                break
+
+        self.passes += 1
+        self.rules += advanced
+        self.materialized += inserted_count
+        self.duplicates += duplicate_count
+        self.last_pass_seconds = time.perf_counter() - started
+        return advanced, inserted_count, duplicate_count
+
+    def _notify(self, inserted):
+        if not self.on_materialized:
+            return
+        by_tenant = defaultdict(list)
+        for transaction in inserted:
+            by_tenant[transaction['user_id']].append(transaction)
+        for user_id, transactions in by_tenant.items():
+            self.on_materialized(user_id, transactions)
+
+    def stats(self):
+        return {
+            'passes': self.passes,
+            'rules': self.rules,
+            'materialized': self.materialized,
+            'duplicates': self.duplicates,
+            'last_pass_seconds': self.last_pass_seconds,
+            'last_error': self.last_error,
+        }
+
+
+def main(argv):
+    from storage import create_storage
+    load_dotenv()
+    storage = create_storage(os.getenv('STORAGE_BACKEND', 'mongo'),
+                             uri=os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'),
+                             database_name=os.getenv('DATABASE_NAME', 'expense_tracker_db'),
+                             dedicated=[t.strip() for t in os.getenv('DEDICATED_TENANTS', '').split(',') if t.strip()],
+                             path=os.getenv('SQLITE_PATH'),
+                             rates=rates_from_env())
+    try:
+        storage.prepare(os.getenv('DEFAULT_TENANT', 'default'))
+        rules, inserted, duplicates = RecurringScheduler(storage).run_once()
+        print(f"✓ {rules} recurring rules advanced, {inserted} transactions added, {duplicates} already present")
+        return 0
+    finally:
+        storage.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,211 @@
+"""
+Monthly Rollups
+Materialized (user_id, year, month, type, category) sums kept up to date on every write
+so reports read O(months) documents instead of rescanning transactions.
+
+Usage:
+    python rollups.py --rebuild  # backfill from the transactions collection
+"""
+
+from pymongo import MongoClient, UpdateOne
+from datetime import datetime
+from dotenv import load_dotenv
+from collections import defaultdict
+import os
+import sys
+
+from tenancy import collection_names
+from http_cache import bump_all_versions
+from money import to_decimal, to_bson
+
+
+def rollup_key(transaction):
+    """Identify the rollup document a transaction contributes to"""
+    date = transaction['date']
+    return {
+        'user_id': transaction.get('user_id'),
+        'year': date.year,
+        'month': date.month,
+        'type': transaction['type'],
+        'category': transaction['category']
+    }
+
+
+def apply_transaction(rollups, transaction, sign=1):
+    """Add (sign=1) or remove (sign=-1) one transaction from its rollup"""
+    rollups.update_one(
+        rollup_key(transaction),
+        {'$inc': {'total': to_bson(sign * to_decimal(transaction['amount'])), 'count': sign}},
+        upsert=True
+    )
+    if sign < 0:
+        # Drop emptied rollups so they never show up in reports
+        rollups.delete_one({**rollup_key(transaction), 'count': {'$lte': 0}})
+
+
+def apply_transactions(rollups, transactions, sign=1):
+    """Fold many transactions into their rollups with one bulk write"""
+    deltas = defaultdict(lambda: [0, 0])
+    for transaction in transactions:
+        key = rollup_key(transaction)
+        delta = deltas[(key['user_id'], key['year'], key['month'], key['type'], key['category'])]
+        delta[0] += sign * to_decimal(transaction['amount'])
+        delta[1] += sign
+
+    if not deltas:
+        return
+
+    rollups.bulk_write([
+        UpdateOne(
+            {'user_id': user_id, 'year': year, 'month': month, 'type': type_, 'category': category},
+            {'$inc': {'total': to_bson(total), 'count': count}},
+            upsert=True
+        )
+        for (user_id, year, month, type_, category), (total, count) in deltas.items()
+    ], ordered=False)
+    if sign < 0:
+        rollups.delete_many({'count': {'$lte': 0}})
+
+
+def rebuild_rollups(transactions, rollups):
+    """
+    Recompute every rollup from scratch with a server-side $group/$out.
+
+    `$out` replaces the whole rollups collection, so pass the shared
+    collections (or a dedicated tenant's), never a tenant-scoped view of
+    the shared ones.
+    """
+    transactions.aggregate([
+        {'$group': {
+            '_id': {
+                'user_id': '$user_id',
+                'year': {'$year': '$date'},
+                'month': {'$month': '$date'},
+                'type': '$type',
+                'category': '$category'
+            },
+            'total': {'$sum': '$amount'},
+            'count': {'$sum': 1}
+        }},
+        {'$project': {
+            '_id': 0,
+            'user_id': '$_id.user_id',
+            'year': '$_id.year',
+            'month': '$_id.month',
+            'type': '$_id.type',
+            'category': '$_id.category',
+            'total': 1,
+            'count': 1
+        }},
+        {'$out': rollups.name}
+    ])
+    return rollups.count_documents({})
+
+
+def month_keys(count=6, now=None):
+    """(year, month) for the last `count` calendar months, oldest first"""
+    now = now or datetime.now()
+    keys = []
+    year, month = now.year, now.month
+    for _ in range(count):
+        keys.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    keys.reverse()
+    return keys
+
+
+def rollups_since(since):
+    """Filter for rollup documents from (year, month) `since` onwards"""
+    year, month = since
+    return {'$or': [
+        {'year': {'$gt': year}},
+        {'year': year, 'month': {'$gte': month}}
+    ]}
+
+
+def load_rollups(rollups, since):
+    """All rollup documents from (year, month) `since` onwards"""
+    return list(rollups.find(rollups_since(since), {'_id': 0}))
+
+
+def monthly_series(docs, keys, label_format='%B %Y'):
+    """Income/expenses per month in `keys` order"""
+    totals = defaultdict(lambda: {'income': 0, 'expense': 0})
+    for doc in docs:
+        totals[(doc['year'], doc['month'])][doc['type']] += to_decimal(doc['total'])
+
+    return [
+        {
+            'month': datetime(year, month, 1).strftime(label_format),
+            'income': totals[(year, month)]['income'],
+            'expenses': totals[(year, month)]['expense']
+        }
+        for year, month in keys
+    ]
+
+
+def period_totals(docs, since):
+    """Income/expenses/balance for rollups at or after (year, month) `since`"""
+    income = expenses = 0
+    for doc in docs:
+        if (doc['year'], doc['month']) >= since:
+            if doc['type'] == 'income':
+                income += to_decimal(doc['total'])
+            elif doc['type'] == 'expense':
+                expenses += to_decimal(doc['total'])
+    return {
+        'income': income,
+        'expenses': expenses,
+        'balance': income - expenses
+    }
+
+
+def category_totals(docs, since):
+    """Expense totals per category at or after (year, month) `since`, largest first"""
+    totals = defaultdict(int)
+    for doc in docs:
+        if doc['type'] == 'expense' and (doc['year'], doc['month']) >= since:
+            totals[doc['category']] += to_decimal(doc['total'])
+    return dict(sorted(
+        ((category, total) for category, total in totals.items() if total),
+        key=lambda item: item[1],
+        reverse=True
+    ))
+
+
+def main(argv):
+    load_dotenv()
+    mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+    database_name = os.getenv('DATABASE_NAME', 'expense_tracker_db')
+
+    if '--rebuild' not in argv:
+        print(__doc__)
+        return 1
+
+    try:
+        client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=5000)
+        client.server_info()
+        db = client[database_name]
+        print("✓ Connected to MongoDB successfully!")
+    except Exception as e:
+        print(f"✗ MongoDB connection failed: {e}")
+        return 1
+
+    try:
+        print("\n🔄 Rebuilding monthly rollups...")
+        count = rebuild_rollups(db.transactions, db.monthly_rollups)
+        print(f"✓ Rebuilt {count} rollup documents")
+        dedicated = [t.strip() for t in os.getenv('DEDICATED_TENANTS', '').split(',') if t.strip()]
+        for user_id in dedicated:
+            names = collection_names(user_id)
+            count = rebuild_rollups(db[names['transactions']], db[names['monthly_rollups']])
+            print(f"✓ Rebuilt {count} rollup documents for dedicated tenant {user_id}")
+        count = bump_all_versions(db.data_versions, db.transactions.distinct('user_id') + dedicated)
+        print(f"✓ Bumped the data version of {count} tenants")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,134 @@
+"""
+Transaction Search
+Word search over descriptions (prefix and fuzzy matching), amount and date
+ranges, and per-category/type facet counts.
+
+Every transaction carries `terms`, the distinct lowercase words of its
+description: an inverted index kept with the data. MongoDB indexes it as
+(user_id, terms, date, _id); SQLite keeps the same entries in its
+transaction_terms table.
+
+A search word is expanded against the tenant's vocabulary (its indexed
+terms, sorted) into the exact terms it stands for: the ones it is a prefix of
+and, with fuzzy matching, the ones within a small edit distance that share its
+first letter (a contiguous slice of the sorted vocabulary, so the edit
+distance is only computed for a fraction of it). The filter is
+then an $in on exact terms, which the index returns already in date order,
+so a result page costs about the same however many rows match.
+"""
+
+from pymongo import UpdateOne
+from datetime import datetime, timedelta
+import bisect
+import re
+
+WORD = re.compile(r'[^\W_]+')
+MIN_PREFIX = 2          # shorter words only match whole terms
+MAX_EXPANSIONS = 100    # exact terms one search word may stand for
+MAX_WORDS = 8
+SEARCH_PARAMS = ('q', 'fuzzy', 'from', 'to', 'min_amount', 'max_amount')
+
+
+# Indexing
+def terms(text):
+    """Distinct searchable words of a description (numbers alone are not indexed)"""
+    return sorted({word for word in WORD.findall((text or '').lower()) if any(c.isalpha() for c in word)})
+
+
+def backfill_terms(collection, batch_size=1000):
+    """Give transactions written before search existed their `terms`; returns the count"""
+    ops, count = [], 0
+    for transaction in collection.find({'terms': {'$exists': False}}, {'description': 1}).batch_size(batch_size):
+        ops.append(UpdateOne({'_id': transaction['_id']},
+                             {'$set': {'terms': terms(transaction.get('description'))}}))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            count += len(ops)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        count += len(ops)
+    return count
+
+
+# Matching
+def max_distance(word):
+    """Edits tolerated by fuzzy matching: none for short words, 1 up to 7 letters, then 2"""
+    if len(word) < 4:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+def within_distance(a, b, limit):
+    """Whether the Levenshtein distance between a and b is at most `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def expand_word(word, vocabulary, fuzzy=False):
+    """Exact terms of the sorted `vocabulary` that `word` matches"""
+    start = bisect.bisect_left(vocabulary, word)
+    if len(word) < MIN_PREFIX:
+        matches = vocabulary[start:start + 1] if vocabulary[start:start + 1] == [word] else []
+    else:
+        matches = vocabulary[start:bisect.bisect_left(vocabulary, word + '\uffff', start)]
+
+    if fuzzy and max_distance(word):
+        limit = max_distance(word)
+        seen = set(matches)
+        low = bisect.bisect_left(vocabulary, word[0])
+        high = bisect.bisect_left(vocabulary, word[0] + '\uffff', low)
+        matches = list(matches) + [term for term in vocabulary[low:high]
+                                   if abs(len(term) - len(word)) <= limit and term not in seen
+                                   and within_distance(word, term, limit)]
+
+    # Closest terms first: the whole word, then short completions
+    return sorted(matches, key=lambda term: (len(term), term))[:MAX_EXPANSIONS]
+
+
+def search_words(text):
+    return terms(text)[:MAX_WORDS]
+
+
+def text_filter(words, vocabulary, fuzzy=False):
+    """Filter requiring every word (a word with no match matches nothing)"""
+    clauses = [{'terms': {'$in': expand_word(word, vocabulary, fuzzy)}} for word in words]
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+# Ranges
+def date_range(args):
+    """{'date': ...} for the from/to (YYYY-MM-DD, inclusive) parameters, or {}"""
+    bounds = {}
+    for name, op in (('from', '$gte'), ('to', '$lt')):
+        try:
+            day = datetime.strptime(args.get(name, ''), '%Y-%m-%d')
+        except ValueError:
+            continue
+        bounds[op] = day + timedelta(days=1) if name == 'to' else day
+    return {'date': bounds} if bounds else {}
+
+
+def amount_range(args):
+    """{'amount': ...} for the min_amount/max_amount parameters, or {}"""
+    bounds = {}
+    for name, op in (('min_amount', '$gte'), ('max_amount', '$lte')):
+        try:
+            bounds[op] = float(args.get(name, ''))
+        except ValueError:
+            continue
+    return {'amount': bounds} if bounds else {}
+
+
+def search_args(args):
+    """The search parameters present in `args`, for links that keep the search"""
+    return {name: args[name] for name in SEARCH_PARAMS if args.get(name)}
@@ -146,3 +146,252 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 });
+
+// Live dashboard updates (server-sent events from /events)
+const RECENT_LIMIT = 5;
+
+// The reporting currency every amount the server sends is in
+const CURRENCY = document.body.dataset.currency || 'USD';
+
+function formatCurrency(value) {
+    return value.toLocaleString('en-US', {style: 'currency', currency: CURRENCY});
+}
+
+function createElement(tag, className, text) {
+    const el = document.createElement(tag);
+    if (className) el.className = className;
+    if (text !== undefined) el.textContent = text;
+    return el;
+}
+
+function budgetStatus(budget, warningPct) {
+    if (budget.percentage >= 100) return 'exceeded';
+    if (budget.percentage >= warningPct) return 'warning';
+    return 'safe';
+}
+
+// Fold one transaction delta into the dashboard state; returns true when
+// the state can't be completed client side and needs a snapshot
+function applyTransaction(state, delta) {
+    const amount = delta.sign * delta.amount;
+    const inMonth = delta.date.startsWith(state.month);
+
+    if (delta.type === 'income') {
+        state.income += amount;
+        if (inMonth) state.month_income += amount;
+    } else {
+        state.expenses += amount;
+        if (inMonth) {
+            state.month_expenses += amount;
+            const total = (state.categories[delta.category] || 0) + amount;
+            if (total > 0.005) {
+                state.categories[delta.category] = total;
+            } else {
+                delete state.categories[delta.category];
+            }
+        }
+        state.budgets.forEach(budget => {
+            if (budget.category === delta.category && budget.start <= delta.date && delta.date < budget.end) {
+                budget.spent += amount;
+                budget.percentage = budget.budget > 0 ? budget.spent / budget.budget * 100 : (budget.spent > 0 ? 100 : 0);
+            }
+        });
+    }
+
+    if (delta.sign > 0) {
+        const last = state.recent[state.recent.length - 1];
+        if (state.recent.length < RECENT_LIMIT || delta.date >= last.date) {
+            state.recent.unshift(delta);
+            state.recent.sort((a, b) => b.date.localeCompare(a.date));
+            state.recent = state.recent.slice(0, RECENT_LIMIT);
+        }
+        return false;
+    }
+
+    const index = state.recent.findIndex(transaction => transaction.id === delta.id);
+    if (index === -1) return false;
+    state.recent.splice(index, 1);
+    // The transaction that moves up into the list is only known server side
+    return true;
+}
+
+function applyBudgetEvent(state, event) {
+    const budget = state.budgets.find(item =>
+        item.category === event.category && item.period === event.period && item.start === event.start);
+    if (budget) {
+        Object.assign(budget, {budget: event.budget, spent: event.spent, percentage: event.percentage});
+    } else {
+        state.budgets.push(event);
+    }
+}
+
+function renderTransaction(transaction) {
+    const item = createElement('div', 'transaction-item');
+    item.dataset.id = transaction.id;
+
+    const icon = createElement('div', 'transaction-icon ' + transaction.type);
+    icon.appendChild(createElement('i', transaction.type === 'income' ? 'fas fa-plus' : 'fas fa-minus'));
+
+    const description = transaction.description.length > 30
+        ? transaction.description.slice(0, 30) + '...'
+        : transaction.description;
+    const date = new Date(transaction.date + 'T00:00:00')
+        .toLocaleDateString('en-US', {month: 'short', day: '2-digit', year: 'numeric'});
+    const details = createElement('div', 'transaction-details');
+    details.appendChild(createElement('h4', null, transaction.category));
+    details.appendChild(createElement('p', 'transaction-desc', description));
+    details.appendChild(createElement('span', 'transaction-date', date));
+
+    const sign = transaction.type === 'income' ? '+' : '-';
+    const amount = createElement('div', 'transaction-amount ' + transaction.type,
+                                 sign + formatCurrency(transaction.amount));
+
+    item.append(icon, details, amount);
+    return item;
+}
+
+function renderBudgetAlert(budget) {
+    const card = createElement('div', 'alert-card alert-' + budget.status);
+    const header = createElement('div', 'alert-header');
+    header.appendChild(createElement('h4', null, budget.category));
+    header.appendChild(createElement('span', 'alert-badge', Math.round(budget.percentage) + '%'));
+
+    const body = createElement('div', 'alert-body');
+    body.appendChild(createElement('p', null,
+        'Spent: ' + formatCurrency(budget.spent) + ' / ' + formatCurrency(budget.budget)));
+    const progress = createElement('div', 'alert-progress');
+    const bar = createElement('div', 'progress-bar');
+    bar.style.width = budget.percentage + '%';
+    progress.appendChild(bar);
+    body.appendChild(progress);
+
+    card.append(header, body);
+    return card;
+}
+
+function renderDashboard(state) {
+    const values = {
+        income: state.income,
+        expenses: state.expenses,
+        balance: state.income - state.expenses,
+        month_expenses: state.month_expenses
+    };
+    document.querySelectorAll('[data-live]').forEach(el => {
+        el.textContent = formatCurrency(values[el.dataset.live]);
+    });
+    const balance = document.querySelector('[data-live="balance"]');
+    if (balance) {
+        balance.classList.toggle('positive', values.balance >= 0);
+        balance.classList.toggle('negative', values.balance < 0);
+    }
+
+    // Category chart
+    const categories = Object.entries(state.categories).sort((a, b) => b[1] - a[1]);
+    const canvas = document.getElementById('categoryChart');
+    const empty = document.getElementById('categoryEmpty');
+    if (window.categoryChart && canvas) {
+        const wasHidden = canvas.hidden;
+        canvas.hidden = categories.length === 0;
+        if (empty) empty.hidden = categories.length > 0;
+        window.categoryChart.data.labels = categories.map(entry => entry[0]);
+        window.categoryChart.data.datasets[0].data = categories.map(entry => entry[1]);
+        if (wasHidden && !canvas.hidden) window.categoryChart.resize();
+        window.categoryChart.update();
+    }
+
+    // Recent transactions
+    const recent = document.getElementById('recentTransactions');
+    if (recent) {
+        recent.replaceChildren();
+        if (state.recent.length) {
+            const list = createElement('div', 'transactions-list');
+            state.recent.forEach(transaction => list.appendChild(renderTransaction(transaction)));
+            recent.appendChild(list);
+        } else {
+            const empty = createElement('div', 'no-data');
+            empty.appendChild(createElement('i', 'fas fa-inbox'));
+            empty.appendChild(createElement('p', null, 'No transactions yet'));
+            recent.appendChild(empty);
+        }
+    }
+
+    // Budget alerts
+    const alerts = document.getElementById('budgetAlerts');
+    if (alerts) {
+        state.budgets.forEach(budget => {
+            budget.status = budgetStatus(budget, state.warning_pct);
+        });
+        const active = state.budgets.filter(budget => budget.status !== 'safe');
+        const grid = alerts.querySelector('.alerts-grid');
+        grid.replaceChildren(...active.map(renderBudgetAlert));
+        alerts.hidden = active.length === 0;
+    }
+}
+
+function showLiveMessage(message, category) {
+    let container = document.querySelector('.flash-container');
+    if (!container) {
+        container = createElement('div', 'flash-container');
+        document.body.insertBefore(container, document.querySelector('.main-content'));
+    }
+    const flash = createElement('div', 'flash-message flash-' + category);
+    flash.appendChild(createElement('span', null, message));
+    const close = createElement('button', 'flash-close', '×');
+    close.addEventListener('click', () => flash.remove());
+    flash.appendChild(close);
+    container.appendChild(flash);
+    setTimeout(() => {
+        flash.style.animation = 'slideOut 0.3s ease';
+        setTimeout(() => flash.remove(), 300);
+    }, 5000);
+}
+
+// How often a dashboard refused a stream polls (live.POLL_SECONDS)
+const LIVE_POLL_INTERVAL = 30000;
+
+function initLiveDashboard() {
+    const stateElement = document.getElementById('dashboardState');
+    if (!stateElement || !window.EventSource) return;
+
+    let state = JSON.parse(stateElement.textContent);
+    let connected = false;
+
+    function resync() {
+        fetch(stateElement.dataset.snapshot, {credentials: 'same-origin'})
+            .then(response => response.json())
+            .then(snapshot => {
+                state = snapshot;
+                renderDashboard(state);
+            });
+    }
+
+    const source = new EventSource(stateElement.dataset.events);
+    source.addEventListener('open', function() {
+        // Deltas published while reconnecting were missed; catch up once
+        if (connected) resync();
+        connected = true;
+    });
+    source.addEventListener('transaction', function(e) {
+        if (applyTransaction(state, JSON.parse(e.data))) {
+            resync();
+        } else {
+            renderDashboard(state);
+        }
+    });
+    source.addEventListener('budget', function(e) {
+        const event = JSON.parse(e.data);
+        applyBudgetEvent(state, event);
+        renderDashboard(state);
+        showLiveMessage(event.category + ' budget for ' + event.label + ' reached ' + event.threshold + '% (' +
+                        formatCurrency(event.spent) + ' of ' + formatCurrency(event.budget) + ')', 'warning');
+    });
+    source.addEventListener('resync', resync);
+    source.addEventListener('error', function() {
+        // A refused stream (503: the server's stream cap) is not retried; poll instead
+        if (source.readyState === EventSource.CLOSED) {
+            setInterval(resync, LIVE_POLL_INTERVAL);
+        }
+    });
+}
+
+document.addEventListener('DOMContentLoaded', initLiveDashboard);
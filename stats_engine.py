@@ -0,0 +1,151 @@
+"""
+Statistics Engine
+Computes every dashboard/report aggregate in a single $facet round trip
+
+Sums are of `amount`, which storage keeps in the reporting currency (see
+money.py), so they need no conversion here; totals come back as Decimal.
+"""
+
+from money import to_decimal
+
+
+def _period_facet(date_filter):
+    """Income/expense totals for one period"""
+    return [
+        {'$match': date_filter},
+        {'$group': {'_id': '$type', 'total': {'$sum': '$amount'}}}
+    ]
+
+
+def _breakdown_facet(date_filter):
+    """Expense totals per category for one period"""
+    return [
+        {'$match': {**date_filter, 'type': 'expense'}},
+        {'$group': {'_id': '$category', 'total': {'$sum': '$amount'}}},
+        {'$sort': {'total': -1}}
+    ]
+
+
+def _recent_facet(limit):
+    """Most recent transactions"""
+    return [
+        {'$sort': {'date': -1}},
+        {'$limit': limit}
+    ]
+
+
+def build_stats_pipeline(periods=None, breakdown=None, recent_limit=0):
+    """
+    Build a single $facet pipeline.
+
+    periods:      {name: date_filter} -> income/expense totals per period
+    breakdown:    date_filter for the expense category breakdown (or None)
+    recent_limit: number of most recent transactions to return (0 = none)
+    """
+    facets = {}
+
+    for name, date_filter in (periods or {}).items():
+        facets[f'period_{name}'] = _period_facet(date_filter)
+
+    if breakdown is not None:
+        facets['breakdown'] = _breakdown_facet(breakdown)
+
+    if recent_limit:
+        facets['recent'] = _recent_facet(recent_limit)
+
+    return [{'$facet': facets}]
+
+
+def _totals(rows):
+    """Turn [{_id: type, total}] into an income/expenses/balance dict"""
+    totals = {row['_id']: to_decimal(row['total']) for row in rows}
+    income = totals.get('income', 0)
+    expenses = totals.get('expense', 0)
+    return {
+        'income': income,
+        'expenses': expenses,
+        'balance': income - expenses
+    }
+
+
+def parse_stats(result, periods=None):
+    """Shape the single $facet result document"""
+    return {
+        'periods': {
+            name: _totals(result.get(f'period_{name}', []))
+            for name in (periods or {})
+        },
+        'breakdown': {
+            item['_id']: to_decimal(item['total']) for item in result.get('breakdown', [])
+        },
+        'recent': result.get('recent', [])
+    }
+
+
+def run_stats(collection, periods=None, breakdown=None, recent_limit=0):
+    """
+    Run the $facet pipeline against the transactions collection.
+
+    Returns {'periods': {name: stats}, 'breakdown': {category: total},
+    'recent': [transactions]} in one database round trip.
+    """
+    pipeline = build_stats_pipeline(periods, breakdown, recent_limit)
+    return parse_stats(next(collection.aggregate(pipeline), {}), periods)
+
+
+def build_totals_pipeline(query):
+    """
+    Income/expense totals and row count for an arbitrary filter.
+
+    Uses a plain $match/$group (no $facet) so the match can be served by the
+    transactions indexes.
+    """
+    return [
+        {'$match': query},
+        {'$group': {'_id': '$type', 'total': {'$sum': '$amount'}, 'count': {'$sum': 1}}}
+    ]
+
+
+def parse_totals(rows):
+    """Shape the totals pipeline result"""
+    totals = _totals(rows)
+    totals['count'] = sum(row['count'] for row in rows)
+    return totals
+
+
+def run_totals(collection, query):
+    """Income/expense totals and row count for `query` in one round trip"""
+    return parse_totals(list(collection.aggregate(build_totals_pipeline(query))))
+
+
+def build_facets_pipeline(query):
+    """
+    Facet counts for `query` in one $facet: count and total per type (the
+    totals of run_totals) and count per category. The leading $match can be
+    served by the transactions indexes.
+    """
+    return [
+        {'$match': query},
+        {'$facet': {
+            'type': [{'$group': {'_id': '$type', 'total': {'$sum': '$amount'}, 'count': {'$sum': 1}}}],
+            'category': [
+                {'$group': {'_id': '$category', 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1, '_id': 1}}
+            ]
+        }}
+    ]
+
+
+def parse_facets(result):
+    """Shape the facets pipeline result"""
+    types = result.get('type', [])
+    return {
+        'totals': parse_totals(types),
+        'type': {row['_id']: row['count'] for row in types},
+        'category': {row['_id']: row['count'] for row in result.get('category', [])}
+    }
+
+
+def run_facets(collection, query):
+    """Totals plus per-type and per-category counts for `query` in one round trip"""
+    return parse_facets(next(collection.aggregate(build_facets_pipeline(query)), {}))
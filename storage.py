@@ -0,0 +1,478 @@
+"""
+Storage Backends
+Routes read and write through a tenant store (g.store): one object per
+request offering the operations the app needs, namely inserts and deletes,
+filtered/sorted finds, grouped sums and budget upserts. Filters are the
+Mongo-style query dicts the app already builds (date ranges, equality, $in,
+$or, and $in on `terms` for description search), and every backend
+understands them.
+
+- MongoStorage: MongoDB, with monthly rollups and spend counters maintained
+  on every write, $facet dashboards and dedicated-tenant routing.
+- SQLiteStorage (storage_sqlite.py): an embedded database for single-node
+  installs and local analytics. Its sums run over covering indexes.
+
+STORAGE_BACKEND selects one (mongo or sqlite).
+
+Transactions are converted to the reporting currency as they are written
+(money.ExchangeRates), so every sum below is over reporting-currency
+`amount` and comes back as an exact Decimal.
+
+Nothing connects when a storage is built. Each process opens its own
+connections on first use (a child forked by a pre-fork server never reuses
+its parent's), and Preparation runs the startup migrations once the database
+is reachable.
+
+Tenant store interface (both backends):
+
+    add_transaction(transaction, budgets)  -> threshold events crossed
+    insert_transactions(transactions)      -> (inserted, duplicate count)
+    delete_transaction(transaction_id)     -> deleted transaction or None
+    find_transactions(query, sort, limit, projection, batch_size)
+    stats(periods, breakdown, recent_limit) / totals(query) / facets(query)
+    search_terms()                         -> sorted vocabulary (see search.py)
+    monthly_rollups(since) / daily_sums(since)
+    budgets(day) / spend_counters(day) / upsert_budget(...)
+    record_events(events) / recent_events(limit)
+    recurring_rules() / add_rule(rule) / delete_rule(rule_id)
+    data_version() / bump_data_version() / clear()
+    rates                                  -> the storage's ExchangeRates
+
+Storage-wide operations for the recurring scheduler (recurring.py), which
+works across tenants:
+
+    due_rules(now, limit) / advance_rules(advances, now)
+    insert_transactions(transactions)      -> each carries its user_id
+    claim_lease(name, owner, seconds, now) -> whether `owner` holds it
+
+and `reconvert()`, which recomputes every amount after the rates changed.
+"""
+
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReadPreference, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from collections import defaultdict
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+
+from indexes import ensure_indexes
+from tenancy import TenantRouter, TenantCollection, assign_default_tenant, collection_names
+from stats_engine import run_stats, run_totals, run_facets
+from rollups import apply_transaction, apply_transactions, rebuild_rollups, load_rollups
+from budget_engine import (budget_window, apply_spend, apply_spends, rebuild_counters, migrate_budgets)
+from analytics import daily_pipeline
+from pagination import KEYSET_SORT
+from http_cache import current_version, bump_version, bump_all_versions
+from search import terms, backfill_terms
+from money import ExchangeRates, encode_amounts, to_bson, backfill_currency, reconvert_amounts
+
+BACKENDS = ('mongo', 'sqlite')
+DUPLICATE_KEY_ERROR = 11000
+
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST,
+}
+
+
+def create_storage(backend='mongo', **options):
+    """
+    Build the configured backend.
+
+    mongo:  uri, database_name, dedicated, event_listeners, client (e.g. a
+            mongomock client), client_options (MongoClient keyword arguments:
+            pool sizes, timeouts, readPreference), analytics_read_preference
+    sqlite: path
+    both:   rates (money.ExchangeRates; without it everything is in USD)
+    """
+    if backend == 'sqlite':
+        from storage_sqlite import SQLiteStorage
+        return SQLiteStorage(options.get('path') or 'expense_tracker.db', options.get('rates'))
+    if backend == 'mongo':
+        return MongoStorage(options['uri'], options['database_name'], options.get('dedicated', ()),
+                            options.get('event_listeners', ()), options.get('client'),
+                            options.get('client_options'), options.get('analytics_read_preference'),
+                            options.get('rates'))
+    raise ValueError(f'unknown storage backend {backend!r}')
+
+
+# MongoDB
+def prepare_transaction(transaction, rates):
+    """Convert a transaction about to be inserted to the reporting currency and index its description"""
+    rates.convert_transaction(transaction)
+    transaction['terms'] = terms(transaction.get('description'))
+    return encode_amounts(transaction)
+
+
+def insert_batch(transactions, batch):
+    """insert_many one batch, skipping duplicate import hashes; return (inserted docs, duplicate count)"""
+    try:
+        transactions.insert_many(batch, ordered=False)
+        return batch, 0
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        other = [err for err in errors if err.get('code') != DUPLICATE_KEY_ERROR]
+        if other:
+            raise
+        failed = {err['index'] for err in errors}
+        return [doc for i, doc in enumerate(batch) if i not in failed], len(failed)
+
+
+# Startup
+class Preparation:
+    """
+    Runs storage.prepare once per process, on first need rather than at import.
+
+    While the database is unreachable every attempt fails fast for
+    `retry_seconds` after the last one, so requests get a 503 instead of each
+    waiting out the server selection timeout.
+    """
+
+    def __init__(self, storage, default_tenant, ensure_indexes=True, retry_seconds=5):
+        self.storage = storage
+        self.default_tenant = default_tenant
+        self.ensure_indexes = ensure_indexes
+        self.retry_seconds = retry_seconds
+        self.ready = False
+        self.error = None
+        self.seconds = None     # duration of the successful prepare
+        self.attempts = 0
+        self._last_attempt = None
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        """Prepare the storage unless done or tried within retry_seconds; returns whether it is ready"""
+        if self.ready:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if self.ready or (self._last_attempt is not None and now - self._last_attempt < self.retry_seconds):
+                return self.ready
+            self._last_attempt = now
+            self.attempts += 1
+            try:
+                self.storage.prepare(self.default_tenant, self.ensure_indexes)
+            except Exception as e:
+                self.error = str(e) or type(e).__name__
+                print(f"✗ Storage unavailable: {self.error}")
+                return False
+            self.seconds = time.monotonic() - now
+            self.ready, self.error = True, None
+            print(f"✓ Storage ready ({self.storage.name}, {self.seconds * 1000:.0f}ms)")
+            return True
+
+
+class MongoStorage:
+    """MongoDB deployment: a client per process, tenants routed to shared or dedicated collections"""
+
+    name = 'mongo'
+    unavailable_errors = (ConnectionFailure,)
+
+    @staticmethod
+    def is_unavailable(error):
+        """Whether one of unavailable_errors means the database is unreachable (always, for MongoDB)"""
+        return True
+
+    def __init__(self, uri, database_name, dedicated=(), event_listeners=(), client=None,
+                 client_options=None, analytics_read_preference=None, rates=None):
+        self.uri = uri
+        self.database_name = database_name
+        self.event_listeners = list(event_listeners)
+        self.client_options = {'serverSelectionTimeoutMS': 5000, **(client_options or {})}
+        # Reports and analytics tolerate replication lag, so they may read from secondaries
+        self.analytics_read_preference = READ_PREFERENCES[analytics_read_preference or 'primary']
+        self.router = TenantRouter(dedicated)
+        self.rates = rates or ExchangeRates()
+        self._client = client
+        self._shared = client is not None   # a given client (mongomock) is used as is
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """This process's MongoClient, created on first use (pymongo clients must not cross a fork)"""
+        if self._client is None or (not self._shared and self._pid != os.getpid()):
+            with self._lock:
+                if self._client is None or (not self._shared and self._pid != os.getpid()):
+                    self._client = MongoClient(self.uri, event_listeners=self.event_listeners,
+                                               **self.client_options)
+                    self._pid = os.getpid()
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self.database_name]
+
+    @property
+    def analytics_db(self):
+        return self.client.get_database(self.database_name, read_preference=self.analytics_read_preference)
+
+    def ping(self):
+        """Round trip to the server; raises if it is unreachable"""
+        self.client.admin.command('ping')
+
+    def prepare(self, default_tenant, ensure=True):
+        """Migrate, index and backfill at startup; raises if the server is unreachable"""
+        self.ping()
+        # Budgets saved before budget periods existed become monthly ones
+        # (before indexing: the budgets index is unique on period/start)
+        if migrate_budgets(self.db.budgets):
+            print("✓ Budgets migrated to budget periods")
+        if ensure:
+            ensure_indexes(self.db)
+            for tenant_id in self.router.dedicated:
+                ensure_indexes(self.db, collection_names(tenant_id))
+            print("✓ MongoDB indexes verified")
+        elif 'user_id_import_hash' not in self.db.transactions.index_information():
+            # Without it re-imports and retried scheduler passes insert every row again
+            print("⚠ transactions has no user_id_import_hash index (ENSURE_INDEXES is off): "
+                  "imports are not deduplicated until `python indexes.py` creates it")
+        # Description search terms for transactions written before search existed
+        backfilled = backfill_terms(self.db.transactions)
+        for tenant_id in self.router.dedicated:
+            backfilled += backfill_terms(self.db[collection_names(tenant_id)['transactions']])
+        if backfilled:
+            print(f"✓ Search terms indexed for {backfilled} transactions")
+        # Documents written before multi-tenancy belong to the default tenant
+        if assign_default_tenant(self.db, default_tenant):
+            print(f"✓ Existing data assigned to tenant '{default_tenant}'")
+        # Transactions written before currencies existed are in the reporting currency;
+        # their sums are recomputed so rollups and counters become exact Decimal128 too
+        converted = 0
+        for transactions, rollups, counters in self._collection_sets():
+            count = backfill_currency(transactions, self.rates.reporting)
+            if count:
+                rebuild_rollups(transactions, rollups)
+                rebuild_counters(transactions, counters)
+                converted += count
+        if converted:
+            print(f"✓ {converted} transactions recorded in {self.rates.reporting}")
+        # Backfill rollups and counters the first time the app runs against existing data
+        if self.db.transactions.estimated_document_count() > 0:
+            if self.db.monthly_rollups.estimated_document_count() == 0:
+                rebuild_rollups(self.db.transactions, self.db.monthly_rollups)
+                print("✓ Monthly rollups rebuilt")
+            if self.db.spend_counters.estimated_document_count() == 0:
+                rebuild_counters(self.db.transactions, self.db.spend_counters)
+                print("✓ Budget spend counters rebuilt")
+
+    def tenant(self, user_id):
+        db = self.db
+        return MongoTenantStore(db, self.router.route(db, user_id),
+                                self.router.route(self.analytics_db, user_id), self.rates)
+
+    def _collection_sets(self):
+        """(transactions, rollups, counters) of the shared collections and of each dedicated tenant"""
+        db = self.db
+        yield db.transactions, db.monthly_rollups, db.spend_counters
+        for tenant_id in self.router.dedicated:
+            names = collection_names(tenant_id)
+            yield db[names['transactions']], db[names['monthly_rollups']], db[names['spend_counters']]
+
+    def reconvert(self):
+        """Recompute every amount from its original amount at the current rates; returns the count changed"""
+        converted = 0
+        for transactions, rollups, counters in self._collection_sets():
+            converted += reconvert_amounts(transactions, self.rates)
+            rebuild_rollups(transactions, rollups)
+            rebuild_counters(transactions, counters)
+        self.bump_data_versions()
+        return converted
+
+    def bump_data_versions(self):
+        """Change every tenant's ETags and cache keys (after rewriting stored amounts)"""
+        return bump_all_versions(self.db.data_versions,
+                                 self.db.transactions.distinct('user_id') + list(self.router.dedicated))
+
+    # Recurring scheduler (rules of every tenant live in the shared recurring_rules collection)
+    def due_rules(self, now, limit):
+        """Rules with an occurrence due by `now`, oldest first, from the next_due index"""
+        return list(self.db.recurring_rules.find({'next_due': {'$lte': now}})
+                    .sort([('next_due', ASCENDING), ('_id', ASCENDING)]).limit(limit))
+
+    def advance_rules(self, advances, now):
+        """Set next_due of each (rule id, next_due); None ends the rule"""
+        if not advances:
+            return
+        self.db.recurring_rules.bulk_write([
+            UpdateOne({'_id': rule_id}, {'$set': {'next_due': next_due, 'last_run_at': now}} if next_due
+                      else {'$set': {'last_run_at': now}, '$unset': {'next_due': ''}})
+            for rule_id, next_due in advances
+        ], ordered=False)
+
+    def insert_transactions(self, transactions):
+        """
+        Insert transactions of any tenants (each carries user_id), skipping
+        duplicate import hashes; returns (inserted, duplicates). Tenants in
+        the shared collections get one insert_many and one bulk write per
+        rollup collection between them.
+        """
+        shared, dedicated = [], defaultdict(list)
+        for transaction in transactions:
+            if transaction['user_id'] in self.router.dedicated:
+                dedicated[transaction['user_id']].append(transaction)
+            else:
+                shared.append(prepare_transaction(transaction, self.rates))
+        inserted, duplicates = insert_batch(self.db.transactions, shared) if shared else ([], 0)
+        # Rollup and counter updates are keyed by user_id, so one bulk write covers every tenant
+        apply_transactions(self.db.monthly_rollups, inserted)
+        apply_spends(self.db.spend_counters, inserted)
+        for user_id, batch in dedicated.items():
+            tenant_inserted, tenant_duplicates = self.tenant(user_id).insert_transactions(batch)
+            inserted = inserted + tenant_inserted
+            duplicates += tenant_duplicates
+        return inserted, duplicates
+
+    def claim_lease(self, name, owner, seconds, now):
+        """Take or renew the lease `name` for `seconds`; False while another owner holds it"""
+        try:
+            self.db.scheduler_leases.find_one_and_update(
+                {'_id': name, '$or': [{'owner': owner}, {'expires': {'$lte': now}}]},
+                {'$set': {'owner': owner, 'expires': now + timedelta(seconds=seconds)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The lease exists and is held by someone else, so the upsert tried to insert it again
+            return False
+        return True
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            if not self._shared:
+                self._client = None
+
+
+class MongoTenantStore:
+    """One tenant's data in MongoDB (see tenancy.TenantData); `analytics` is the same data read for reports"""
+
+    def __init__(self, db, data, analytics=None, rates=None):
+        self.db = db
+        self.data = data
+        self.analytics = analytics or data
+        self.rates = rates or ExchangeRates()
+        self.user_id = data.user_id
+        self.rules = TenantCollection(db.recurring_rules, self.user_id)
+
+    # Transactions
+    def add_transaction(self, transaction, budgets=()):
+        """Insert one transaction and update its rollup and counters; returns threshold events"""
+        prepare_transaction(transaction, self.rates)
+        self.data.transactions.insert_one(transaction)
+        apply_transaction(self.data.rollups, transaction)
+        return apply_spend(self.data.counters, transaction, budgets=budgets)
+
+    def insert_transactions(self, transactions):
+        """Insert a batch (duplicate import hashes are skipped); returns (inserted, duplicates)"""
+        for transaction in transactions:
+            prepare_transaction(transaction, self.rates)
+        inserted, duplicates = insert_batch(self.data.transactions, transactions)
+        apply_transactions(self.data.rollups, inserted)
+        apply_spends(self.data.counters, inserted)
+        return inserted, duplicates
+
+    def delete_transaction(self, transaction_id):
+        """Delete one transaction and back it out of its rollup and counters"""
+        try:
+            object_id = ObjectId(transaction_id)
+        except (InvalidId, TypeError):
+            return None
+        transaction = self.data.transactions.find_one_and_delete({'_id': object_id})
+        if transaction:
+            apply_transaction(self.data.rollups, transaction, sign=-1)
+            apply_spend(self.data.counters, transaction, sign=-1)
+        return transaction
+
+    def find_transactions(self, query, sort=KEYSET_SORT, limit=0, projection=None, batch_size=None):
+        cursor = self.data.transactions.find(query, projection).sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        return cursor
+
+    # Grouped sums
+    def stats(self, periods=None, breakdown=None, recent_limit=0):
+        return run_stats(self.data.transactions, periods, breakdown, recent_limit)
+
+    def totals(self, query):
+        return run_totals(self.data.transactions, query)
+
+    def facets(self, query):
+        return run_facets(self.data.transactions, query)
+
+    def search_terms(self):
+        # A DISTINCT_SCAN over the terms index: one seek per word, not per transaction
+        return sorted(self.data.transactions.distinct('terms'))
+
+    def monthly_rollups(self, since):
+        return load_rollups(self.analytics.rollups, since)
+
+    def daily_sums(self, since, batch_size=10000):
+        return self.analytics.transactions.aggregate(daily_pipeline(since), batchSize=batch_size)
+
+    # Budgets
+    def budgets(self, day):
+        return list(self.data.budgets.find(budget_window(day)))
+
+    def spend_counters(self, day):
+        return list(self.data.counters.find(budget_window(day), {'_id': 0}))
+
+    def upsert_budget(self, category, period, start, amount, rollover=False):
+        self.data.budgets.update_one(
+            {'category': category, 'period': period, 'start': start},
+            {'$set': {
+                'category': category,
+                'amount': to_bson(amount),
+                'period': period,
+                'start': start,
+                'rollover': rollover,
+                'month': start.month,
+                'year': start.year,
+                'updated_at': datetime.now()
+            }},
+            upsert=True
+        )
+
+    def record_events(self, events):
+        if events:
+            self.data.events.insert_many([encode_amounts(event, ('budget', 'spent')) for event in events])
+
+    def recent_events(self, limit=10):
+        return list(self.data.events.find({}, {'_id': 0}).sort('created_at', DESCENDING).limit(limit))
+
+    # Recurring rules
+    def recurring_rules(self):
+        return list(self.rules.find().sort('created_at', ASCENDING))
+
+    def add_rule(self, rule):
+        self.rules.insert_one(encode_amounts(rule))
+        return rule
+
+    def delete_rule(self, rule_id):
+        try:
+            object_id = ObjectId(rule_id)
+        except (InvalidId, TypeError):
+            return False
+        return self.rules.delete_one({'_id': object_id}).deleted_count == 1
+
+    # HTTP cache versions
+    def data_version(self):
+        return current_version(self.db.data_versions, self.user_id)
+
+    def bump_data_version(self):
+        return bump_version(self.db.data_versions, self.user_id)
+
+    def clear(self):
+        """Delete every document of this tenant"""
+        for collection in (self.data.transactions, self.data.budgets, self.data.rollups,
+                           self.data.counters, self.data.events, self.rules):
+            collection.delete_many({})
+        # The version only ever grows, so ETags handed out before the clear never match again
+        self.bump_data_version()
@@ -0,0 +1,783 @@
+"""
+SQLite Storage
+Embedded backend for single-node installs (STORAGE_BACKEND=sqlite): one
+database file, no server, no extra dependencies.
+
+Every index leads with user_id, and the transaction indexes carry
+(date, id, type, category, amount), so filtered pages, totals, monthly and
+daily sums and budget spend are all answered from an index. Nothing is
+precomputed: sums replace MongoDB's rollup and counter collections, and a
+write only touches the transactions table.
+
+Description search terms (search.py) live in transaction_terms, keyed
+(user_id, term, date, id) and carrying type, category and amount: a search
+reads one term's entries already in date order, and its filters and facet
+sums never touch the transactions table.
+
+Transaction ids are ObjectId strings, so page cursors, templates and URLs
+are the same on both backends. Dates are stored as ISO-8601 text, whose
+ordering is chronological. Amounts are REAL, rounded to their currency's
+smallest unit, and summed as integer ten-thousandths (SUM_AMOUNT), so sums
+are exact like MongoDB's Decimal128 ones and come back as Decimal.
+"""
+
+from bson.objectid import ObjectId
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+import os
+import sqlite3
+import threading
+
+from stats_engine import parse_stats, parse_totals, parse_facets
+from budget_engine import PERIODS, period_start, previous_start, next_start, budget_window, crossings
+from pagination import KEYSET_SORT
+from search import terms
+from money import ExchangeRates, to_decimal
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    date TEXT NOT NULL,
+    created_at TEXT,
+    import_hash TEXT,
+    currency TEXT,
+    original_amount REAL
+);
+CREATE INDEX IF NOT EXISTS transactions_user_date
+    ON transactions (user_id, date, id, type, category, amount);
+CREATE INDEX IF NOT EXISTS transactions_user_type_date
+    ON transactions (user_id, type, date, id, category, amount);
+CREATE INDEX IF NOT EXISTS transactions_user_category_date
+    ON transactions (user_id, category, date, id, type, amount);
+CREATE UNIQUE INDEX IF NOT EXISTS transactions_user_import_hash
+    ON transactions (user_id, import_hash) WHERE import_hash IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS transaction_terms (
+    user_id TEXT NOT NULL,
+    term TEXT NOT NULL,
+    date TEXT NOT NULL,
+    id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL,
+    PRIMARY KEY (user_id, term, date, id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS budgets (
+    user_id TEXT NOT NULL,
+    period TEXT NOT NULL,
+    start TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL,
+    rollover INTEGER NOT NULL DEFAULT 0,
+    month INTEGER,
+    year INTEGER,
+    updated_at TEXT,
+    PRIMARY KEY (user_id, period, start, category)
+);
+
+CREATE TABLE IF NOT EXISTS budget_events (
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    period TEXT NOT NULL,
+    start TEXT NOT NULL,
+    label TEXT NOT NULL,
+    threshold INTEGER NOT NULL,
+    budget REAL NOT NULL,
+    spent REAL NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS budget_events_user_created_at ON budget_events (user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS recurring_rules (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    schedule TEXT NOT NULL,
+    start TEXT NOT NULL,
+    until TEXT,
+    next_due TEXT,
+    created_at TEXT NOT NULL,
+    last_run_at TEXT,
+    currency TEXT
+);
+CREATE INDEX IF NOT EXISTS recurring_rules_user_created_at ON recurring_rules (user_id, created_at);
+CREATE INDEX IF NOT EXISTS recurring_rules_next_due
+    ON recurring_rules (next_due, id) WHERE next_due IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS scheduler_leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS data_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+TRANSACTION_COLUMNS = ('id', 'user_id', 'type', 'amount', 'category', 'description', 'date',
+                       'created_at', 'import_hash', 'currency', 'original_amount')
+TERM_COLUMNS = ('user_id', 'term', 'date', 'id', 'type', 'category', 'amount')
+BUDGET_COLUMNS = ('user_id', 'period', 'start', 'category', 'amount', 'rollover', 'month', 'year', 'updated_at')
+RULE_COLUMNS = ('id', 'user_id', 'type', 'amount', 'currency', 'category', 'description', 'schedule', 'start',
+                'until', 'next_due', 'created_at', 'last_run_at')
+
+# Columns added after their table first shipped; prepare() adds them to older databases
+ADDED_COLUMNS = {
+    'transactions': (('currency', 'TEXT'), ('original_amount', 'REAL')),
+    'recurring_rules': (('currency', 'TEXT'),),
+}
+
+# Exact sums of REAL amounts: each is rounded to an integer number of
+# ten-thousandths (enough for every currency's smallest unit) before adding
+MONEY_SCALE = 10000
+SUM_AMOUNT = f'SUM(CAST(ROUND(amount * {MONEY_SCALE}) AS INTEGER))'
+EVENT_COLUMNS = ('category', 'period', 'start', 'label', 'threshold', 'budget', 'spent', 'created_at')
+
+# Filter field -> column, per table (anything else is rejected); `terms` is
+# answered from transaction_terms, whose other columns are SEARCH_FIELDS
+TRANSACTION_FIELDS = {'_id': 'id', **{c: c for c in TRANSACTION_COLUMNS if c != 'id'}}
+SEARCH_FIELDS = {'_id': 'id', **{c: c for c in TERM_COLUMNS if c not in ('id', 'term')}}
+BUDGET_FIELDS = {c: c for c in BUDGET_COLUMNS}
+
+# Start of the budget period containing `date`, as SQL (Monday-based weeks)
+PERIOD_BUCKETS = {
+    'week': "date(date, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', date)",
+    'year': "strftime('%Y-01-01', date)",
+}
+
+# Entries counted per word to pick the one a multi-word search reads
+TERM_SAMPLE = 10000
+
+COMPARISONS = {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<=', '$ne': '!='}
+
+
+# Values
+def to_sql(value):
+    """Python value -> SQLite parameter (datetimes as sortable ISO text)"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='microseconds')
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).isoformat(sep=' ', timespec='microseconds')
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def from_sql_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def from_sql_sum(value):
+    """Decimal from a SUM_AMOUNT result"""
+    return Decimal(value or 0) / MONEY_SCALE
+
+
+def placeholders(values):
+    return ", ".join("?" * len(values))
+
+
+def split_terms(query):
+    """
+    (term lists, rest of the filter): the `terms` conditions `query` requires,
+    each a list of which one must match, and the filter without them.
+    """
+    required, rest = [], {}
+    for key, value in (query or {}).items():
+        if key == 'terms':
+            if isinstance(value, str):
+                value = {'$in': [value]}
+            if not (isinstance(value, dict) and set(value) == {'$in'}):
+                raise ValueError('only equality and $in are supported on terms')
+            required.append(list(value['$in']))
+        elif key == '$and':
+            parts = [split_terms(item) for item in value]
+            required.extend(words for part, _ in parts for words in part)
+            remaining = [item for _, item in parts if item]
+            if remaining:
+                rest['$and'] = remaining
+        else:
+            rest[key] = value
+    return required, rest
+
+
+def compile_filter(query, fields):
+    """
+    Mongo-style filter -> (SQL condition, parameters).
+
+    Supports the subset the app builds: equality, $gt/$gte/$lt/$lte/$ne,
+    $in/$nin, $exists, $and and $or, on the fields in `fields`.
+    """
+    clauses, params = [], []
+    for key, value in (query or {}).items():
+        if key in ('$and', '$or'):
+            parts = [compile_filter(item, fields) for item in value]
+            joiner = ' AND ' if key == '$and' else ' OR '
+            if parts:
+                clauses.append('(' + joiner.join(f'({sql})' for sql, _ in parts) + ')')
+                params.extend(param for _, part in parts for param in part)
+            else:
+                clauses.append('1' if key == '$and' else '0')
+            continue
+
+        column = fields.get(key)
+        if column is None:
+            raise ValueError(f'unsupported filter field {key!r}')
+        if not (isinstance(value, dict) and all(op.startswith('$') for op in value)):
+            clauses.append(f'{column} = ?')
+            params.append(to_sql(value))
+            continue
+
+        for op, operand in value.items():
+            if op in COMPARISONS:
+                clauses.append(f'{column} {COMPARISONS[op]} ?')
+                params.append(to_sql(operand))
+            elif op in ('$in', '$nin'):
+                operand = list(operand)
+                if not operand:
+                    clauses.append('0' if op == '$in' else '1')
+                    continue
+                negate = 'NOT ' if op == '$nin' else ''
+                clauses.append(f'{column} {negate}IN ({placeholders(operand)})')
+                params.extend(to_sql(item) for item in operand)
+            elif op == '$exists':
+                clauses.append(f'{column} IS {"NOT " if operand else ""}NULL')
+            else:
+                raise ValueError(f'unsupported filter operator {op!r}')
+    return ' AND '.join(clauses) or '1', params
+
+
+def compile_sort(sort, fields):
+    return ', '.join(f'{fields[key]} {"DESC" if direction < 0 else "ASC"}' for key, direction in sort)
+
+
+def transaction_from_row(row):
+    document = {
+        '_id': ObjectId(row['id']),
+        'user_id': row['user_id'],
+        'type': row['type'],
+        'amount': to_decimal(row['amount']),
+        'currency': row['currency'],
+        'original_amount': to_decimal(row['original_amount']),
+        'category': row['category'],
+        'description': row['description'],
+        'date': from_sql_datetime(row['date']),
+        'created_at': from_sql_datetime(row['created_at']),
+    }
+    if row['import_hash'] is not None:
+        document['import_hash'] = row['import_hash']
+    return document
+
+
+def rule_from_row(row):
+    rule = {'_id': ObjectId(row['id']), **{column: row[column] for column in RULE_COLUMNS if column != 'id'}}
+    for column in ('start', 'until', 'next_due', 'created_at', 'last_run_at'):
+        rule[column] = from_sql_datetime(row[column])
+    rule['amount'] = to_decimal(row['amount'])
+    # Like MongoDB, where next_due is unset when a rule ends, last_run_at is set by its
+    # first run and rules added before currencies existed have none
+    for column in ('next_due', 'last_run_at', 'currency'):
+        if rule[column] is None:
+            del rule[column]
+    return rule
+
+
+def project(document, projection):
+    """Apply a Mongo-style inclusion projection ({field: 1, '_id': 0})"""
+    if not projection:
+        return document
+    keep = {key for key, include in projection.items() if include}
+    if projection.get('_id', 1):
+        keep.add('_id')
+    return {key: value for key, value in document.items() if key in keep}
+
+
+# OperationalError also covers syntax errors and missing tables or columns;
+# only these mean the database file cannot be used right now
+UNAVAILABLE_MESSAGES = ('database is locked', 'database table is locked', 'unable to open database file',
+                        'disk I/O error')
+UNAVAILABLE_CODES = {5, 6, 10, 14}  # SQLITE_BUSY, SQLITE_LOCKED, SQLITE_IOERR, SQLITE_CANTOPEN
+
+
+class SQLiteStorage:
+    """One SQLite database file; each thread of each process gets its own connection"""
+
+    name = 'sqlite'
+    db = None  # no change streams; live updates are published in-process
+    unavailable_errors = (sqlite3.OperationalError,)
+
+    @staticmethod
+    def is_unavailable(error):
+        """Whether one of unavailable_errors means busy, locked or unreadable rather than a bad statement"""
+        code = getattr(error, 'sqlite_errorcode', None)   # Python 3.11+
+        if code is not None:
+            return code & 0xff in UNAVAILABLE_CODES
+        return str(error).startswith(UNAVAILABLE_MESSAGES)
+
+    def __init__(self, path, rates=None):
+        self.path = path
+        self.rates = rates or ExchangeRates()
+        self.trace = None
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection inherited through fork() must not be used by the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL lets readers run alongside the single writer
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if self.trace:
+                conn.set_trace_callback(self.trace)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def ping(self):
+        self.connection().execute('SELECT 1')
+
+    def prepare(self, default_tenant=None, ensure=True):
+        """Create the tables and indexes, and bring older databases up to date"""
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            for table, columns in ADDED_COLUMNS.items():
+                existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+                for column, definition in columns:
+                    if column not in existing:
+                        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            # Transactions written before currencies existed are in the reporting currency
+            converted = conn.execute('UPDATE transactions SET currency = ?, original_amount = amount '
+                                     'WHERE currency IS NULL', [self.rates.reporting]).rowcount
+            if converted:
+                print(f"✓ {converted} transactions recorded in {self.rates.reporting}")
+            if not conn.execute('SELECT EXISTS (SELECT 1 FROM transaction_terms)').fetchone()[0]:
+                conn.executemany(
+                    f'INSERT OR IGNORE INTO transaction_terms ({", ".join(TERM_COLUMNS)}) '
+                    f'VALUES ({placeholders(TERM_COLUMNS)})',
+                    ((row['user_id'], term, row['date'], row['id'], row['type'], row['category'], row['amount'])
+                     for row in conn.execute('SELECT * FROM transactions')
+                     for term in terms(row['description']))
+                )
+            # Refresh planner statistics so range scans pick the narrowest covering index
+            conn.execute('PRAGMA optimize')
+        print(f"✓ SQLite database ready ({self.path})")
+
+    def set_trace(self, callback):
+        """Call `callback(sql)` for every statement executed (benchmark round-trip counting)"""
+        self.trace = callback
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.set_trace_callback(callback)
+
+    def tenant(self, user_id):
+        return SQLiteTenantStore(self, user_id)
+
+    def reconvert(self):
+        """Recompute every amount from its original amount at the current rates; returns the count changed"""
+        conn = self.connection()
+        changed = []
+        for row in conn.execute('SELECT id, user_id, date, description, amount, currency, original_amount '
+                                'FROM transactions'):
+            amount = self.rates.convert(to_decimal(row['original_amount']), row['currency'],
+                                        from_sql_datetime(row['date']))
+            if amount != to_decimal(row['amount']):
+                changed.append((row, float(amount)))
+        with conn:
+            conn.executemany('UPDATE transactions SET amount = ? WHERE id = ?',
+                             [(amount, row['id']) for row, amount in changed])
+            conn.executemany('UPDATE transaction_terms SET amount = ? '
+                             'WHERE user_id = ? AND term = ? AND date = ? AND id = ?',
+                             [(amount, row['user_id'], term, row['date'], row['id'])
+                              for row, amount in changed for term in terms(row['description'])])
+        self.bump_data_versions()
+        return len(changed)
+
+    def bump_data_versions(self):
+        """Change every tenant's ETags and cache keys (after rewriting stored amounts)"""
+        with self.connection() as conn:
+            conn.execute('UPDATE data_versions SET version = version + 1')
+            conn.execute('INSERT INTO data_versions (user_id, version) '
+                         'SELECT DISTINCT user_id, 1 FROM transactions WHERE true '
+                         'ON CONFLICT (user_id) DO NOTHING')
+            return conn.execute('SELECT COUNT(*) FROM data_versions').fetchone()[0]
+
+    # Recurring scheduler
+    def due_rules(self, now, limit):
+        rows = self.connection().execute(
+            'SELECT * FROM recurring_rules WHERE next_due IS NOT NULL AND next_due <= ? '
+            'ORDER BY next_due, id LIMIT ?', [to_sql(now), limit]
+        ).fetchall()
+        return [rule_from_row(row) for row in rows]
+
+    def advance_rules(self, advances, now):
+        with self.connection() as conn:
+            conn.executemany('UPDATE recurring_rules SET next_due = ?, last_run_at = ? WHERE id = ?',
+                             [(to_sql(next_due), to_sql(now), str(rule_id)) for rule_id, next_due in advances])
+
+    def insert_transactions(self, transactions):
+        """Insert transactions of any tenants in one SQLite transaction; returns (inserted, duplicates)"""
+        inserted = []
+        with self.connection() as conn:
+            for transaction in transactions:
+                if self.tenant(transaction['user_id'])._insert(conn, transaction):
+                    inserted.append(transaction)
+        return inserted, len(transactions) - len(inserted)
+
+    def claim_lease(self, name, owner, seconds, now):
+        with self.connection() as conn:
+            row = conn.execute(
+                'INSERT INTO scheduler_leases (name, owner, expires) VALUES (?, ?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires '
+                'WHERE scheduler_leases.owner = excluded.owner OR scheduler_leases.expires <= ? '
+                'RETURNING owner',
+                [name, owner, to_sql(now + timedelta(seconds=seconds)), to_sql(now)]
+            ).fetchone()
+        return row is not None
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class SQLiteTenantStore:
+    """One tenant's rows; every statement is restricted to its user_id"""
+
+    def __init__(self, storage, user_id):
+        self.storage = storage
+        self.user_id = user_id
+
+    @property
+    def rates(self):
+        return self.storage.rates
+
+    def _conn(self):
+        return self.storage.connection()
+
+    def _where(self, query, fields=TRANSACTION_FIELDS):
+        sql, params = compile_filter(query, fields)
+        return f'user_id = ? AND ({sql})', [self.user_id, *params]
+
+    def _term_entries(self, words):
+        """Entries for any of `words`, counted up to TERM_SAMPLE (enough to tell rare from common)"""
+        return self._conn().execute(
+            f'SELECT COUNT(*) FROM (SELECT 1 FROM transaction_terms WHERE user_id = ? '
+            f'AND term IN ({placeholders(words)}) LIMIT {TERM_SAMPLE})', [self.user_id, *words]
+        ).fetchone()[0]
+
+    def _source(self, query):
+        """
+        (FROM clause, WHERE clause, parameters) for a transactions filter.
+
+        A search reads the entries of its rarest word's terms (DISTINCT when
+        there are several: a description may hold more than one of them),
+        keeps those whose transaction also has a term of each other word, and
+        filters them on their own columns.
+        """
+        required, rest = split_terms(query)
+        if not required:
+            where, params = self._where(query)
+            return 'transactions', where, params
+        if len(required) > 1:
+            required.sort(key=self._term_entries)
+        first, *others = required
+        distinct = 'DISTINCT ' if len(first) > 1 else ''
+        source = (f'(SELECT {distinct}{", ".join(SEARCH_FIELDS.values())} FROM transaction_terms AS entry '
+                  f'WHERE user_id = ? AND term IN ({placeholders(first)})')
+        source_params = [self.user_id, *first]
+        for words in others:
+            # A primary key probe per entry: same tenant, one of the terms, same date and id
+            source += (f' AND EXISTS (SELECT 1 FROM transaction_terms AS other WHERE other.user_id = entry.user_id '
+                       f'AND other.term IN ({placeholders(words)}) AND other.date = entry.date AND other.id = entry.id)')
+            source_params += words
+        where, params = self._where(rest, SEARCH_FIELDS)
+        return source + ')', where, source_params + params
+
+    # Transactions
+    def _insert(self, conn, transaction):
+        transaction.setdefault('_id', ObjectId())
+        transaction['user_id'] = self.user_id
+        self.rates.convert_transaction(transaction)
+        cursor = conn.execute(
+            'INSERT INTO transactions (id, user_id, type, amount, category, description, date, created_at, '
+            'import_hash, currency, original_amount) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (user_id, import_hash) WHERE import_hash IS NOT NULL DO NOTHING',
+            [to_sql(transaction.get(field)) for field in ('_id', 'user_id', 'type', 'amount', 'category')]
+            + [transaction.get('description', ''), to_sql(transaction['date']),
+               to_sql(transaction.get('created_at')), transaction.get('import_hash'),
+               transaction['currency'], to_sql(transaction['original_amount'])]
+        )
+        if cursor.rowcount != 1:
+            return False
+        row = [to_sql(transaction[field]) for field in ('date', '_id', 'type', 'category', 'amount')]
+        conn.executemany(f'INSERT INTO transaction_terms ({", ".join(TERM_COLUMNS)}) '
+                         f'VALUES ({placeholders(TERM_COLUMNS)})',
+                         [(self.user_id, term, *row) for term in terms(transaction.get('description'))])
+        return True
+
+    def _spent(self, category, period, start):
+        row = self._conn().execute(
+            f"SELECT {SUM_AMOUNT} FROM transactions "
+            f"WHERE user_id = ? AND category = ? AND type = 'expense' AND date >= ? AND date < ?",
+            [self.user_id, category, to_sql(start), to_sql(next_start(period, start))]
+        ).fetchone()
+        return from_sql_sum(row[0])
+
+    def add_transaction(self, transaction, budgets=()):
+        """Insert one transaction; returns the threshold events it crossed"""
+        with self._conn() as conn:
+            self._insert(conn, transaction)
+        if transaction['type'] != 'expense':
+            return []
+
+        events = []
+        for item in budgets:
+            if (item['category'] == transaction['category']
+                    and item['start'] == period_start(item['period'], transaction['date'])):
+                after = self._spent(item['category'], item['period'], item['start'])
+                events.extend(crossings(item, after - to_decimal(transaction['amount']), after))
+        return events
+
+    def insert_transactions(self, transactions):
+        """Insert a batch in one transaction, skipping duplicate import hashes"""
+        inserted = []
+        with self._conn() as conn:
+            for transaction in transactions:
+                if self._insert(conn, transaction):
+                    inserted.append(transaction)
+        return inserted, len(transactions) - len(inserted)
+
+    def delete_transaction(self, transaction_id):
+        with self._conn() as conn:
+            row = conn.execute('SELECT * FROM transactions WHERE user_id = ? AND id = ?',
+                               [self.user_id, str(transaction_id)]).fetchone()
+            if row is None:
+                return None
+            conn.execute('DELETE FROM transactions WHERE user_id = ? AND id = ?', [self.user_id, row['id']])
+            conn.executemany('DELETE FROM transaction_terms WHERE user_id = ? AND term = ? AND date = ? AND id = ?',
+                             [(self.user_id, term, row['date'], row['id']) for term in terms(row['description'])])
+        return transaction_from_row(row)
+
+    def find_transactions(self, query, sort=KEYSET_SORT, limit=0, projection=None, batch_size=None):
+        source, where, params = self._source(query)
+        order = compile_sort(sort, TRANSACTION_FIELDS)
+        limit_sql = f' LIMIT {int(limit)}' if limit else ''
+        if source == 'transactions':
+            sql = f'SELECT * FROM transactions WHERE {where} ORDER BY {order}{limit_sql}'
+        else:
+            # Page through the matching entries, then fetch just those rows
+            sql = (f'SELECT * FROM transactions WHERE id IN (SELECT id FROM {source} WHERE {where} '
+                   f'ORDER BY {order}{limit_sql}) ORDER BY {order}')
+        cursor = self._conn().execute(sql, params)
+        if batch_size:
+            cursor.arraysize = batch_size
+
+        def rows():
+            try:
+                while True:
+                    batch = cursor.fetchmany()
+                    if not batch:
+                        return
+                    for row in batch:
+                        yield project(transaction_from_row(row), projection)
+            finally:
+                cursor.close()
+        return rows()
+
+    # Grouped sums
+    def _type_totals(self, query):
+        source, where, params = self._source(query)
+        rows = self._conn().execute(
+            f'SELECT type, {SUM_AMOUNT}, COUNT(*) FROM {source} WHERE {where} GROUP BY type', params
+        ).fetchall()
+        return [{'_id': row[0], 'total': from_sql_sum(row[1]), 'count': row[2]} for row in rows]
+
+    def stats(self, periods=None, breakdown=None, recent_limit=0):
+        """Same shape as stats_engine.run_stats"""
+        result = {f'period_{name}': self._type_totals(query) for name, query in (periods or {}).items()}
+        if breakdown is not None:
+            source, where, params = self._source({**breakdown, 'type': 'expense'})
+            rows = self._conn().execute(
+                f'SELECT category, {SUM_AMOUNT} AS total FROM {source} WHERE {where} '
+                f'GROUP BY category ORDER BY total DESC', params
+            ).fetchall()
+            result['breakdown'] = [{'_id': row[0], 'total': from_sql_sum(row[1])} for row in rows]
+        if recent_limit:
+            result['recent'] = list(self.find_transactions({}, [('date', -1)], recent_limit))
+        return parse_stats(result, periods)
+
+    def totals(self, query):
+        return parse_totals(self._type_totals(query))
+
+    def facets(self, query):
+        """Same shape as stats_engine.run_facets, from one pass over the matching rows"""
+        source, where, params = self._source(query)
+        rows = self._conn().execute(
+            f'SELECT type, category, {SUM_AMOUNT}, COUNT(*) FROM {source} WHERE {where} GROUP BY type, category',
+            params
+        ).fetchall()
+        types, categories = {}, {}
+        for type_, category, total, count in rows:
+            totals = types.setdefault(type_, {'_id': type_, 'total': 0, 'count': 0})
+            totals['total'] += from_sql_sum(total)
+            totals['count'] += count
+            categories[category] = categories.get(category, 0) + count
+        return parse_facets({
+            'type': list(types.values()),
+            'category': [{'_id': category, 'count': count}
+                         for category, count in sorted(categories.items(), key=lambda item: (-item[1], item[0]))]
+        })
+
+    def search_terms(self):
+        """Sorted distinct terms, one index seek per term (a loose index scan)"""
+        rows = self._conn().execute(
+            'WITH RECURSIVE vocabulary(term) AS ('
+            '  SELECT MIN(term) FROM transaction_terms WHERE user_id = ?1'
+            '  UNION ALL'
+            '  SELECT (SELECT MIN(term) FROM transaction_terms WHERE user_id = ?1 AND term > vocabulary.term)'
+            '  FROM vocabulary WHERE term IS NOT NULL'
+            ') SELECT term FROM vocabulary WHERE term IS NOT NULL',
+            [self.user_id]
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def monthly_rollups(self, since):
+        """Same documents as the monthly_rollups collection, from (year, month) `since`"""
+        year, month = since
+        rows = self._conn().execute(
+            f"SELECT CAST(strftime('%Y', date) AS INTEGER), CAST(strftime('%m', date) AS INTEGER), "
+            f"type, category, {SUM_AMOUNT}, COUNT(*) FROM transactions WHERE user_id = ? AND date >= ? "
+            f"GROUP BY 1, 2, 3, 4",
+            [self.user_id, to_sql(datetime(year, month, 1))]
+        ).fetchall()
+        return [{'user_id': self.user_id, 'year': row[0], 'month': row[1], 'type': row[2], 'category': row[3],
+                 'total': from_sql_sum(row[4]), 'count': row[5]} for row in rows]
+
+    def daily_sums(self, since, batch_size=10000):
+        """Same rows as analytics.daily_pipeline"""
+        rows = self._conn().execute(
+            f"SELECT substr(date, 1, 10) AS day, category, type, {SUM_AMOUNT} FROM transactions "
+            f"WHERE user_id = ? AND date >= ? GROUP BY day, category, type",
+            [self.user_id, to_sql(since)]
+        ).fetchall()
+        for day, category, type_, total in rows:
+            y, m, d = map(int, day.split('-'))
+            yield {'_id': {'y': y, 'm': m, 'd': d, 'c': category, 't': type_}, 'total': from_sql_sum(total)}
+
+    # Budgets
+    def budgets(self, day):
+        where, params = self._where(budget_window(day), BUDGET_FIELDS)
+        rows = self._conn().execute(f'SELECT * FROM budgets WHERE {where}', params).fetchall()
+        return [{**dict(row), 'start': from_sql_datetime(row['start']), 'amount': to_decimal(row['amount']),
+                 'rollover': bool(row['rollover']), 'updated_at': from_sql_datetime(row['updated_at'])}
+                for row in rows]
+
+    def spend_counters(self, day):
+        """Spend per (period, start, category) for the periods containing `day` and the ones before"""
+        counters = []
+        for period in PERIODS:
+            current = period_start(period, day)
+            bucket = PERIOD_BUCKETS[period]
+            rows = self._conn().execute(
+                f"SELECT {bucket} AS start, category, {SUM_AMOUNT}, COUNT(*) FROM transactions "
+                f"WHERE user_id = ? AND type = 'expense' AND date >= ? AND date < ? GROUP BY start, category",
+                [self.user_id, to_sql(previous_start(period, current)), to_sql(next_start(period, current))]
+            ).fetchall()
+            counters.extend(
+                {'user_id': self.user_id, 'period': period, 'start': datetime.strptime(row[0], '%Y-%m-%d'),
+                 'category': row[1], 'spent': from_sql_sum(row[2]), 'count': row[3]}
+                for row in rows
+            )
+        return counters
+
+    def upsert_budget(self, category, period, start, amount, rollover=False):
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT INTO budgets (user_id, period, start, category, amount, rollover, month, year, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (user_id, period, start, category) DO UPDATE SET amount = excluded.amount, '
+                'rollover = excluded.rollover, updated_at = excluded.updated_at',
+                [self.user_id, period, to_sql(start), category, to_sql(amount), int(rollover), start.month, start.year,
+                 to_sql(datetime.now())]
+            )
+
+    def record_events(self, events):
+        if not events:
+            return
+        with self._conn() as conn:
+            conn.executemany(
+                f'INSERT INTO budget_events (user_id, {", ".join(EVENT_COLUMNS)}) '
+                f'VALUES (?, {", ".join("?" * len(EVENT_COLUMNS))})',
+                [[self.user_id, *(to_sql(event[column]) for column in EVENT_COLUMNS)] for event in events]
+            )
+
+    def recent_events(self, limit=10):
+        rows = self._conn().execute(
+            f'SELECT {", ".join(EVENT_COLUMNS)} FROM budget_events WHERE user_id = ? '
+            f'ORDER BY created_at DESC LIMIT ?', [self.user_id, limit]
+        ).fetchall()
+        return [{**dict(row), 'start': from_sql_datetime(row['start']), 'budget': to_decimal(row['budget']),
+                 'spent': to_decimal(row['spent']), 'created_at': from_sql_datetime(row['created_at'])}
+                for row in rows]
+
+    # Recurring rules
+    def recurring_rules(self):
+        rows = self._conn().execute('SELECT * FROM recurring_rules WHERE user_id = ? ORDER BY created_at',
+                                    [self.user_id]).fetchall()
+        return [rule_from_row(row) for row in rows]
+
+    def add_rule(self, rule):
+        rule.setdefault('_id', ObjectId())
+        rule['user_id'] = self.user_id
+        with self._conn() as conn:
+            conn.execute(
+                f'INSERT INTO recurring_rules ({", ".join(RULE_COLUMNS)}) VALUES ({placeholders(RULE_COLUMNS)})',
+                [to_sql(rule['_id'])] + [to_sql(rule.get(column)) for column in RULE_COLUMNS[1:]]
+            )
+        return rule
+
+    def delete_rule(self, rule_id):
+        with self._conn() as conn:
+            cursor = conn.execute('DELETE FROM recurring_rules WHERE user_id = ? AND id = ?',
+                                  [self.user_id, str(rule_id)])
+        return cursor.rowcount == 1
+
+    # HTTP cache versions
+    def data_version(self):
+        row = self._conn().execute('SELECT version FROM data_versions WHERE user_id = ?',
+                                   [self.user_id]).fetchone()
+        return row[0] if row else 0
+
+    def bump_data_version(self):
+        with self._conn() as conn:
+            return conn.execute(
+                'INSERT INTO data_versions (user_id, version) VALUES (?, 1) '
+                'ON CONFLICT (user_id) DO UPDATE SET version = version + 1 RETURNING version',
+                [self.user_id]
+            ).fetchone()[0]
+
+    def clear(self):
+        """Delete every row of this tenant"""
+        with self._conn() as conn:
+            for table in ('transactions', 'transaction_terms', 'budgets', 'budget_events', 'recurring_rules'):
+                conn.execute(f'DELETE FROM {table} WHERE user_id = ?', [self.user_id])
+        self.bump_data_version()
+
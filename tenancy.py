@@ -0,0 +1,247 @@
+"""
+Tenant Data Access
+Every route reads and writes through a TenantData: the tenant's collections
+wrapped so that each filter, pipeline and inserted document carries its
+user_id. All indexes lead with user_id, so a request only walks its own
+tenant's index range and costs the same on a deployment of any size.
+
+Very large tenants can be given dedicated collections (DEDICATED_TENANTS in
+.env, after --promote), or the shared collections can be sharded on the
+tenant key (--shard).
+
+Usage:
+    python tenancy.py --assign-default       # stamp legacy documents with DEFAULT_TENANT
+    python tenancy.py --promote USER         # copy USER into dedicated collections
+    python tenancy.py --purge-shared USER    # remove USER from the shared collections
+    python tenancy.py --shard                # shard the shared collections on the tenant key
+"""
+
+from pymongo import MongoClient, ASCENDING
+from dotenv import load_dotenv
+import os
+import re
+import sys
+
+from indexes import ensure_indexes
+
+TENANT_KEY = 'user_id'
+TENANT_ID = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+# TenantData attribute -> shared collection name
+COLLECTIONS = {
+    'transactions': 'transactions',
+    'budgets': 'budgets',
+    'rollups': 'monthly_rollups',
+    'counters': 'spend_counters',
+    'events': 'budget_events',
+}
+
+# Shard keys for the shared collections; user_id first keeps every app query targeted
+SHARD_KEYS = {
+    'transactions': [(TENANT_KEY, ASCENDING), ('date', ASCENDING)],
+    'budgets': [(TENANT_KEY, ASCENDING)],
+    'monthly_rollups': [(TENANT_KEY, ASCENDING)],
+    'spend_counters': [(TENANT_KEY, ASCENDING)],
+    'budget_events': [(TENANT_KEY, ASCENDING)],
+}
+
+
+def validate_tenant(user_id):
+    """Return `user_id` if it is a usable tenant id, else raise ValueError"""
+    if not isinstance(user_id, str) or not TENANT_ID.match(user_id):
+        raise ValueError(f'invalid tenant id {user_id!r}')
+    return user_id
+
+
+def collection_name(name, user_id, dedicated=False):
+    """Physical collection holding `name` for a tenant"""
+    return f'{name}__{user_id}' if dedicated else name
+
+
+def collection_names(user_id, dedicated=True):
+    """Shared collection name -> physical name, as taken by indexes.ensure_indexes"""
+    return {name: collection_name(name, user_id, dedicated) for name in COLLECTIONS.values()}
+
+
+class TenantCollection:
+    """
+    Collection proxy that scopes every read and write to one tenant.
+
+    Methods mirror pymongo's and return whatever the wrapped collection
+    returns, so the same proxy works over a Motor collection.
+    """
+
+    def __init__(self, collection, user_id):
+        self.collection = collection
+        self.user_id = user_id
+
+    @property
+    def name(self):
+        return self.collection.name
+
+    def scope(self, filter=None):
+        return {**(filter or {}), TENANT_KEY: self.user_id}
+
+    def _stamp(self, document):
+        document[TENANT_KEY] = self.user_id
+        return document
+
+    # Reads
+    def find(self, filter=None, *args, **kwargs):
+        return self.collection.find(self.scope(filter), *args, **kwargs)
+
+    def find_one(self, filter=None, *args, **kwargs):
+        return self.collection.find_one(self.scope(filter), *args, **kwargs)
+
+    def count_documents(self, filter=None, **kwargs):
+        return self.collection.count_documents(self.scope(filter), **kwargs)
+
+    def distinct(self, key, filter=None, **kwargs):
+        return self.collection.distinct(key, self.scope(filter), **kwargs)
+
+    def aggregate(self, pipeline, **kwargs):
+        # A leading $match is merged with the pipeline's own by the optimizer,
+        # so the user_id-prefixed indexes still serve its date/type filters
+        return self.collection.aggregate([{'$match': self.scope()}, *pipeline], **kwargs)
+
+    # Writes
+    def insert_one(self, document, **kwargs):
+        return self.collection.insert_one(self._stamp(document), **kwargs)
+
+    def insert_many(self, documents, **kwargs):
+        return self.collection.insert_many([self._stamp(document) for document in documents], **kwargs)
+
+    def update_one(self, filter, update, **kwargs):
+        return self.collection.update_one(self.scope(filter), update, **kwargs)
+
+    def update_many(self, filter, update, **kwargs):
+        return self.collection.update_many(self.scope(filter), update, **kwargs)
+
+    def delete_one(self, filter, **kwargs):
+        return self.collection.delete_one(self.scope(filter), **kwargs)
+
+    def delete_many(self, filter, **kwargs):
+        return self.collection.delete_many(self.scope(filter), **kwargs)
+
+    def find_one_and_delete(self, filter, **kwargs):
+        return self.collection.find_one_and_delete(self.scope(filter), **kwargs)
+
+    def find_one_and_update(self, filter, update, **kwargs):
+        return self.collection.find_one_and_update(self.scope(filter), update, **kwargs)
+
+    def bulk_write(self, requests, **kwargs):
+        # Operations are built by the caller from this tenant's documents
+        # (see rollups.apply_transactions and budget_engine.apply_spends,
+        # which key every op by user_id)
+        return self.collection.bulk_write(requests, **kwargs)
+
+
+class TenantData:
+    """One tenant's transactions, budgets, rollups, spend counters and budget events"""
+
+    def __init__(self, db, user_id, dedicated=False):
+        self.user_id = user_id
+        self.dedicated = dedicated
+        names = collection_names(user_id, dedicated)
+        self.transactions = TenantCollection(db[names['transactions']], user_id)
+        self.budgets = TenantCollection(db[names['budgets']], user_id)
+        self.rollups = TenantCollection(db[names['monthly_rollups']], user_id)
+        self.counters = TenantCollection(db[names['spend_counters']], user_id)
+        self.events = TenantCollection(db[names['budget_events']], user_id)
+
+
+class TenantRouter:
+    """Routes a tenant to the shared collections or to its dedicated ones"""
+
+    def __init__(self, dedicated=()):
+        self.dedicated = frozenset(dedicated)
+
+    def route(self, db, user_id):
+        return TenantData(db, user_id, user_id in self.dedicated)
+
+
+# Maintenance
+def assign_default_tenant(db, user_id):
+    """Stamp documents written before multi-tenancy with `user_id`"""
+    updated = 0
+    for name in COLLECTIONS.values():
+        result = db[name].update_many({TENANT_KEY: {'$exists': False}}, {'$set': {TENANT_KEY: user_id}})
+        updated += result.modified_count
+    return updated
+
+
+def promote_tenant(db, user_id):
+    """Copy one tenant into dedicated collections and index them; returns copied counts"""
+    counts = {}
+    for name, target in collection_names(user_id).items():
+        db[name].aggregate([{'$match': {TENANT_KEY: user_id}}, {'$out': target}])
+        counts[target] = db[target].estimated_document_count()
+    ensure_indexes(db, collection_names(user_id))
+    return counts
+
+
+def purge_shared(db, user_id):
+    """Delete one tenant from the shared collections (after switching it to dedicated)"""
+    return {name: db[name].delete_many({TENANT_KEY: user_id}).deleted_count
+            for name in COLLECTIONS.values()}
+
+
+def shard_collections(client, database_name):
+    """Enable sharding and shard the shared collections on SHARD_KEYS (mongos only)"""
+    client.admin.command('enableSharding', database_name)
+    for name, keys in SHARD_KEYS.items():
+        client[database_name][name].create_index(keys, name='shard_key')
+        client.admin.command('shardCollection', f'{database_name}.{name}', key=dict(keys))
+    return list(SHARD_KEYS)
+
+
+def main(argv):
+    load_dotenv()
+    mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+    database_name = os.getenv('DATABASE_NAME', 'expense_tracker_db')
+    default_tenant = os.getenv('DEFAULT_TENANT', 'default')
+
+    commands = {'--assign-default', '--promote', '--purge-shared', '--shard'}
+    if not commands & set(argv):
+        print(__doc__)
+        return 1
+
+    try:
+        client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=5000)
+        client.server_info()
+        db = client[database_name]
+        print("✓ Connected to MongoDB successfully!")
+    except Exception as e:
+        print(f"✗ MongoDB connection failed: {e}")
+        return 1
+
+    try:
+        if '--assign-default' in argv:
+            updated = assign_default_tenant(db, default_tenant)
+            print(f"✓ Assigned {updated} document(s) to tenant '{default_tenant}'")
+        if '--promote' in argv:
+            user_id = validate_tenant(argv[argv.index('--promote') + 1])
+            for target, count in promote_tenant(db, user_id).items():
+                print(f"  ✓ {target}: {count} document(s)")
+            print(f"\nAdd {user_id} to DEDICATED_TENANTS in .env and restart the app, "
+                  f"then run --purge-shared {user_id}")
+        if '--purge-shared' in argv:
+            user_id = validate_tenant(argv[argv.index('--purge-shared') + 1])
+            for name, count in purge_shared(db, user_id).items():
+                print(f"  ✓ {name}: removed {count} document(s)")
+        if '--shard' in argv:
+            for name in shard_collections(client, database_name):
+                print(f"  ✓ {database_name}.{name} sharded")
+        return 0
+    except IndexError:
+        print("✗ Missing tenant id")
+        return 1
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 1
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# The app is a set of top-level modules, not an installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import money
+
+
+@pytest.fixture
+def mongo_storage(monkeypatch):
+    """A prepared MongoStorage on mongomock (which stores amounts as doubles)"""
+    mongomock = pytest.importorskip('mongomock')
+    from storage import create_storage
+
+    monkeypatch.setattr(money, 'DECIMAL128', False)
+    storage = create_storage('mongo', uri=None, database_name='expense_tracker_test',
+                             client=mongomock.MongoClient())
+    storage.prepare('default')
+    return storage
+
+
+@pytest.fixture
+def sqlite_storage(tmp_path):
+    from storage import create_storage
+
+    storage = create_storage('sqlite', path=str(tmp_path / 'expense_tracker.db'))
+    storage.prepare('default')
+    yield storage
+    storage.close()
+
+
+@pytest.fixture(params=['mongo', 'sqlite'])
+def storage(request):
+    return request.getfixturevalue(f'{request.param}_storage')
@@ -0,0 +1,91 @@
+import io
+
+import pytest
+
+from importer import parse_csv, parse_ofx, import_transactions, validate_row, content_hash
+from categories import CATEGORIES
+
+STATEMENT = """date,amount,category,description
+2024-01-05,-12.50,Food,Lunch
+2024-01-05,-12.50,Food,Lunch
+2024-01-06,2500,Salary,Payroll
+2024-01-07,-40,Transport,Fuel
+not a date,-1,Food,Broken
+"""
+
+OFX = """<OFX><CURDEF>USD
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240105120000<TRNAMT>-12.50<NAME>Lunch</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240106<TRNAMT>2500.00<MEMO>Payroll</STMTTRN>
+</OFX>
+"""
+
+
+def run_import(store, text, parser=parse_csv):
+    return import_transactions(parser(io.StringIO(text)), store, batch_size=2)
+
+
+def test_reimport_inserts_nothing(storage):
+    store = storage.tenant('default')
+    first = run_import(store, STATEMENT)
+    second = run_import(store, STATEMENT)
+
+    assert (first['inserted'], first['duplicates'], first['invalid']) == (4, 0, 1)
+    assert (second['inserted'], second['duplicates'], second['invalid']) == (0, 4, 1)
+    assert len(list(store.find_transactions({}))) == 4
+
+
+def test_identical_rows_in_one_file_are_both_kept(storage):
+    store = storage.tenant('default')
+    run_import(store, STATEMENT)
+    lunches = [t for t in store.find_transactions({}) if t['description'] == 'Lunch']
+    assert len(lunches) == 2
+
+
+def test_reimport_is_per_tenant(storage):
+    run_import(storage.tenant('alice'), STATEMENT)
+    summary = run_import(storage.tenant('bob'), STATEMENT)
+    assert summary['inserted'] == 4
+
+
+def test_ofx_reimport_inserts_nothing(storage):
+    store = storage.tenant('default')
+    assert run_import(store, OFX, parse_ofx)['inserted'] == 2
+    assert run_import(store, OFX, parse_ofx)['duplicates'] == 2
+
+
+def test_prepare_without_indexes_warns_that_imports_are_not_deduplicated(capsys):
+    mongomock = pytest.importorskip('mongomock')
+    from storage import create_storage
+
+    storage = create_storage('mongo', uri=None, database_name='expense_tracker_test',
+                             client=mongomock.MongoClient())
+    storage.prepare('default', ensure=False)
+    assert 'no user_id_import_hash index' in capsys.readouterr().out
+
+
+def test_validate_row_signed_amounts():
+    row = {'date': '01/05/2024', 'amount': '-1,234.50', 'category': 'food', 'description': 'x'}
+    transaction = validate_row(row, CATEGORIES)
+    assert transaction['type'] == 'expense'
+    assert str(transaction['amount']) == '1234.50'
+    assert transaction['category'] == 'Food'
+    assert 'currency' not in transaction
+
+
+@pytest.mark.parametrize('row, message', [
+    ({'date': '2024-01-05', 'amount': 'abc'}, 'invalid amount'),
+    ({'date': '2024-01-05', 'amount': '0'}, 'non-zero'),
+    ({'date': '2024-01-05', 'amount': '5', 'type': 'transfer'}, 'invalid type'),
+    ({'date': '2024-01-05', 'amount': '5', 'category': 'Nope'}, 'unknown category'),
+    ({'date': '5th of May', 'amount': '5'}, 'unrecognised date'),
+])
+def test_validate_row_rejects(row, message):
+    with pytest.raises(ValueError, match=message):
+        validate_row(row, CATEGORIES)
+
+
+def test_content_hash_numbers_repeated_rows_and_keys_currency():
+    transaction = validate_row({'date': '2024-01-05', 'amount': '-5', 'category': 'Food'}, CATEGORIES)
+    in_euros = dict(transaction, currency='EUR')
+    assert content_hash(transaction, 0) != content_hash(transaction, 1)
+    assert content_hash(transaction, 0) != content_hash(in_euros, 0)
@@ -0,0 +1,134 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from money import ExchangeRates, parse_amount, quantize, to_decimal, format_money
+
+# Friday 2024-01-05 and Monday 2024-01-08, quoted per EUR like the ECB file
+RATES = {
+    'USD': [(date(2024, 1, 5), '1.10'), (date(2024, 1, 8), '1.20')],
+    'JPY': [(date(2024, 1, 5), '160'), (date(2024, 1, 8), '165')],
+}
+
+
+@pytest.fixture
+def rates():
+    return ExchangeRates('USD', RATES, base='EUR')
+
+
+def test_convert_uses_the_rate_of_the_day(rates):
+    assert rates.convert(Decimal('100'), 'EUR', datetime(2024, 1, 8, 12)) == Decimal('120.00')
+
+
+def test_convert_on_a_weekend_uses_the_latest_earlier_rate(rates):
+    assert rates.convert(Decimal('100'), 'EUR', date(2024, 1, 6)) == Decimal('110.00')
+    assert rates.convert(Decimal('100'), 'EUR', date(2024, 1, 7)) == Decimal('110.00')
+
+
+def test_convert_crosses_through_the_base_currency(rates):
+    # 1000 JPY * 1.10 / 160 = 6.875, rounded half to even
+    assert rates.convert(Decimal('1000'), 'JPY', date(2024, 1, 5)) == Decimal('6.88')
+
+
+def test_convert_reporting_currency_only_rounds(rates):
+    assert rates.convert(Decimal('12.345'), 'USD', date(2023, 1, 1)) == Decimal('12.34')
+
+
+def test_convert_without_rates_for_the_currency_raises(rates):
+    with pytest.raises(ValueError, match='no exchange rates for GBP'):
+        rates.convert(Decimal('1'), 'GBP', date(2024, 1, 5))
+
+
+def test_convert_before_the_first_rate_raises(rates):
+    with pytest.raises(ValueError, match='on or before 2024-01-04'):
+        rates.convert(Decimal('1'), 'EUR', date(2024, 1, 4))
+
+
+def test_factors_are_memoized_per_currency_and_day(rates):
+    rates.convert(Decimal('1'), 'EUR', date(2024, 1, 6))
+    rates.convert(Decimal('2'), 'EUR', datetime(2024, 1, 6, 18))
+    assert list(rates._factors) == [('EUR', date(2024, 1, 6))]
+
+
+def test_convert_transaction_is_idempotent(rates):
+    transaction = {'amount': Decimal('100'), 'currency': 'EUR', 'date': datetime(2024, 1, 6)}
+    rates.convert_transaction(transaction)
+    rates.convert_transaction(transaction)
+    assert transaction == {'amount': Decimal('110.00'), 'original_amount': Decimal('100.00'),
+                           'currency': 'EUR', 'date': datetime(2024, 1, 6)}
+
+
+def test_convert_transaction_defaults_to_the_reporting_currency(rates):
+    transaction = rates.convert_transaction({'amount': 5, 'date': datetime(2024, 1, 6)})
+    assert transaction['currency'] == 'USD'
+    assert transaction['amount'] == transaction['original_amount'] == Decimal('5.00')
+
+
+def test_load_long_and_wide_files(tmp_path):
+    long_form = tmp_path / 'long.csv'
+    long_form.write_text('date,currency,rate\n2024-01-05,USD,1.10\n2024-01-05,JPY,160\n')
+    wide_form = tmp_path / 'wide.csv'
+    wide_form.write_text('Date,USD,JPY,\n2024-01-05,1.10,160,\n2024-01-08,1.20,N/A,\n')
+
+    for path in (long_form, wide_form):
+        rates = ExchangeRates.load(str(path), 'USD')
+        assert rates.currencies == ['USD', 'EUR', 'JPY']
+        assert rates.convert(Decimal('100'), 'EUR', date(2024, 1, 5)) == Decimal('110.00')
+    # N/A is skipped, so Monday's JPY rate is still Friday's
+    assert rates.rate('JPY', date(2024, 1, 8)) == Decimal('160')
+
+
+def test_load_without_a_file_knows_only_the_reporting_currency():
+    rates = ExchangeRates.load(None, 'GBP')
+    assert rates.currencies == ['GBP']
+    assert rates.convert(Decimal('1.005'), 'GBP', date(2024, 1, 1)) == Decimal('1.00')
+
+
+def test_parse_amount_rounds_to_the_currency():
+    assert parse_amount('1,234.565') == Decimal('1234.56')
+    assert parse_amount('$12') == Decimal('12.00')
+    assert parse_amount('-7.5', 'EUR') == Decimal('-7.50')
+
+
+def test_parse_amount_jpy_has_no_decimals():
+    assert parse_amount('¥1,235', 'JPY') == Decimal('1235')
+    assert parse_amount('1234.5', 'JPY') == Decimal('1234')
+    assert parse_amount('1235.5', 'JPY') == Decimal('1236')
+
+
+@pytest.mark.parametrize('text', ['', 'abc', '1.2.3', 'nan', 'inf'])
+def test_parse_amount_rejects_non_numbers(text):
+    with pytest.raises(ValueError):
+        parse_amount(text)
+
+
+def test_quantize_jpy_rounds_half_to_even():
+    assert quantize(Decimal('2.5'), 'JPY') == Decimal('2')
+    assert quantize(Decimal('3.5'), 'JPY') == Decimal('4')
+    assert quantize(0.1 + 0.2, 'USD') == Decimal('0.30')
+
+
+def test_to_decimal_keeps_the_shortest_float_form():
+    assert to_decimal(0.1) == Decimal('0.1')
+    assert to_decimal(None) is None
+
+
+def test_format_money():
+    assert format_money(Decimal('1234.5')) == '$1,234.50'
+    assert format_money(Decimal('1234.5'), 'JPY') == '¥1,234'
+
+
+def test_reconvert_bumps_every_tenants_data_version(storage):
+    storage.rates = ExchangeRates('USD', {'GBP': [(date(2024, 1, 1), Decimal('0.8'))]})
+    alice, bob = storage.tenant('alice'), storage.tenant('bob')
+    alice.add_transaction({'type': 'expense', 'amount': Decimal('8'), 'currency': 'GBP', 'category': 'Bills',
+                           'description': 'Phone', 'date': datetime(2024, 3, 1)})
+    bob.bump_data_version()
+    before = alice.data_version(), bob.data_version()
+
+    storage.rates = ExchangeRates('USD', {'GBP': [(date(2024, 1, 1), Decimal('0.5'))]})
+    assert storage.reconvert() == 1
+    [phone] = alice.find_transactions({})
+    assert to_decimal(phone['amount']) == Decimal('16.00')
+    assert alice.data_version() > before[0] and bob.data_version() > before[1]
@@ -0,0 +1,113 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from money import ExchangeRates
+from recurring import Schedule, RecurringScheduler, new_rule, due_occurrences, occurrence_key
+
+
+@pytest.mark.parametrize('expression, after, expected', [
+    ('@monthly', datetime(2024, 1, 31, 12), datetime(2024, 2, 1)),
+    ('@daily', datetime(2024, 1, 1), datetime(2024, 1, 2)),
+    ('@weekly', datetime(2024, 1, 1), datetime(2024, 1, 7)),            # next Sunday
+    ('@yearly', datetime(2024, 6, 1), datetime(2025, 1, 1)),
+    ('0 9 * * 1-5', datetime(2024, 1, 5, 10), datetime(2024, 1, 8, 9)),  # Friday after 9 -> Monday
+    ('30 8 15 * *', datetime(2024, 1, 15, 8, 30), datetime(2024, 2, 15, 8, 30)),
+    ('0 0 31 * *', datetime(2024, 1, 31), datetime(2024, 3, 31)),       # skips February
+    ('0 0 29 2 *', datetime(2024, 3, 1), datetime(2028, 2, 29)),        # leap days only
+    ('*/15 * * * *', datetime(2024, 1, 1, 10, 7), datetime(2024, 1, 1, 10, 15)),
+    ('0 0 1 jan,jul *', datetime(2024, 2, 1), datetime(2024, 7, 1)),
+    ('0 0 * * sun', datetime(2024, 1, 1), datetime(2024, 1, 7)),
+    ('0 0 * * 7', datetime(2024, 1, 1), datetime(2024, 1, 7)),          # 7 is Sunday too
+])
+def test_next_after(expression, after, expected):
+    assert Schedule(expression).next_after(after) == expected
+
+
+def test_day_of_month_or_weekday_when_both_are_restricted():
+    # As in cron: the 13th or any Friday
+    schedule = Schedule('0 0 13 * 5')
+    assert schedule.next_after(datetime(2024, 1, 1)) == datetime(2024, 1, 5)
+    assert schedule.next_after(datetime(2024, 1, 12)) == datetime(2024, 1, 13)
+
+
+def test_first_from_includes_the_moment_itself():
+    assert Schedule('@monthly').first_from(datetime(2024, 2, 1)) == datetime(2024, 2, 1)
+
+
+@pytest.mark.parametrize('expression', ['', '* * * *', '61 * * * *', '0 0 0 * *', '0 0 * 13 *',
+                                        '0 0 * * 8', '*/0 * * * *', '0 0 30 2 *', '@hourlyish'])
+def test_invalid_schedules_raise(expression):
+    with pytest.raises(ValueError):
+        Schedule(expression)
+
+
+def test_new_rule_starts_at_the_first_occurrence():
+    rule = new_rule({'type': 'expense', 'amount': 10, 'category': 'Bills'}, '0 0 15 * *',
+                    datetime(2024, 1, 20), now=datetime(2024, 1, 1))
+    assert rule['next_due'] == datetime(2024, 2, 15)
+    assert rule['schedule'] == '0 0 15 * *'
+
+
+def test_new_rule_ending_before_its_first_occurrence_is_never_due():
+    rule = new_rule({'type': 'expense', 'amount': 10}, '@monthly', datetime(2024, 1, 2),
+                    until=datetime(2024, 1, 31))
+    assert 'next_due' not in rule
+
+
+def test_new_rule_rejects_an_end_before_the_start():
+    with pytest.raises(ValueError):
+        new_rule({'type': 'expense'}, '@daily', datetime(2024, 2, 1), until=datetime(2024, 1, 1))
+
+
+def test_due_occurrences_catch_up_and_stop_at_until():
+    rule = {'schedule': '@monthly', 'next_due': datetime(2024, 1, 1), 'until': datetime(2024, 3, 15)}
+    occurrences, next_due = due_occurrences(rule, now=datetime(2024, 6, 1))
+    assert occurrences == [datetime(2024, 1, 1), datetime(2024, 2, 1), datetime(2024, 3, 1)]
+    assert next_due is None
+
+
+def test_due_occurrences_are_limited_per_pass():
+    rule = {'schedule': '@daily', 'next_due': datetime(2024, 1, 1)}
+    occurrences, next_due = due_occurrences(rule, now=datetime(2024, 12, 31), limit=10)
+    assert len(occurrences) == 10
+    assert next_due == datetime(2024, 1, 11)
+
+
+def test_occurrence_key_is_stable():
+    assert occurrence_key('abc', datetime(2024, 2, 1, 9, 30)) == 'recurring:abc:202402010930'
+
+
+def gbp_rates():
+    # GBP is only quoted from June; USD is the base, so USD rules never need a rate
+    return ExchangeRates('USD', {'GBP': [(date(2026, 6, 1), Decimal('0.8'))]})
+
+
+def test_new_rule_rejects_a_currency_without_a_rate_on_the_start_date():
+    template = {'type': 'expense', 'amount': Decimal('10'), 'currency': 'GBP', 'category': 'Bills'}
+    with pytest.raises(ValueError, match='no GBP exchange rate'):
+        new_rule(template, '@monthly', datetime(2026, 1, 1), rates=gbp_rates())
+    assert new_rule(template, '@monthly', datetime(2026, 6, 1), rates=gbp_rates())['next_due']
+
+
+def test_a_rule_without_exchange_rates_holds_back_only_itself(storage):
+    storage.rates = gbp_rates()
+    store = storage.tenant('default')
+    store.add_rule(new_rule({'type': 'expense', 'amount': Decimal('8'), 'currency': 'GBP', 'category': 'Bills',
+                             'description': 'Phone'}, '@monthly', datetime(2026, 5, 1)))
+    store.add_rule(new_rule({'type': 'expense', 'amount': Decimal('1'), 'category': 'Food',
+                             'description': 'Coffee'}, '@daily', datetime(2026, 5, 30)))
+    scheduler = RecurringScheduler(storage)
+
+    scheduler.run_once(now=datetime(2026, 6, 2, 12))
+    materialized = sorted((t['date'], t['currency']) for t in store.find_transactions({}))
+    assert materialized == [(datetime(2026, 5, 30), 'USD'), (datetime(2026, 5, 31), 'USD'),
+                       (datetime(2026, 6, 1), 'USD'), (datetime(2026, 6, 2), 'USD')]
+    assert 'no GBP exchange rate' in scheduler.last_error
+
+    # Once the rates cover it, the held rule resumes at the occurrence it stopped at
+    storage.rates = ExchangeRates('USD', {'GBP': [(date(2026, 1, 1), Decimal('0.8'))]})
+    scheduler.run_once(now=datetime(2026, 6, 2, 12))
+    assert sorted(t['date'] for t in store.find_transactions({'currency': 'GBP'})) == [
+        datetime(2026, 5, 1), datetime(2026, 6, 1)]